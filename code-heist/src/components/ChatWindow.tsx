@@ -4,6 +4,7 @@ import UserMessage from "./UserMessage";
 import AIMessage from "./AIMessage";
 import React, { useEffect } from "react";
 import { useGameContext } from "../services/GameContext";
+import { parseEvents } from "../services/helper";
 
 interface Message {
     id: number;
@@ -14,10 +15,12 @@ interface Message {
 
 const ChatWindow = ({
     level,
-    game_key
+    game_key,
+    player_id
 }: {
     level: number;
     game_key: string;
+    player_id: string;
 }) => {
 
     const [messages, setMessages] = React.useState<Message[]>([]);
@@ -52,19 +55,27 @@ const ChatWindow = ({
             method: 'POST',
             headers: {
                 'Content-Type': 'application/json',
+                // Server-Sent Events keep the connection alive with heartbeats while the model is thinking
+                Accept: 'text/event-stream',
             },
-            body: JSON.stringify({ messages: newMessages, level, game_key }),
+            body: JSON.stringify({ messages: newMessages, level, game_key, player_id }),
         }).then(response => {
             const reader  = response.body?.getReader();
             const decoder = new TextDecoder('utf-8');
+            let buffer = "";
 
             reader?.read().then(function processText({ done, value }) {
                 if (done) {
                     inputRef.current?.focus();
                     return;
                 }
-                const token = decoder.decode(value);
-                newAIMessage.message += token;
+                const { events, rest } = parseEvents(buffer + decoder.decode(value, { stream: true }));
+                buffer = rest;
+                for (const { event, data } of events) {
+                    if (event === "token") {
+                        newAIMessage.message += JSON.parse(data).text;
+                    }
+                }
                 setMessages([...newMessages]);
                 reader?.read().then(processText);
             });
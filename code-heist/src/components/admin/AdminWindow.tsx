@@ -1,15 +1,36 @@
 import Game from "@app/models/Game";
+import GameSummary, { GameSummaryPage } from "@app/models/GameSummary";
 import { Box, Button, CircularProgress, Container, Dialog, DialogActions, DialogTitle, Typography, useMediaQuery, useTheme } from "@mui/material";
-import { useCallback, useEffect, useState } from "react";
+import { useCallback, useEffect, useRef, useState } from "react";
 import GameCard from "./GameCard";
-import AdminUpdates from "@app/models/AdminUpdates";
+import AdminUpdates, { AdminReplay, AdminUpdateBatch } from "@app/models/AdminUpdates";
 import { useSnackbar } from "notistack";
-import Player from "@app/models/Player";
+import Leaderboard, { LeaderboardEntry } from "@app/models/Leaderboard";
 
 
 const wsSchema = window.location.protocol === "https:" ? "wss" : "ws";
 const wsUrl = `${wsSchema}://${window.location.host}/`;
+const LEADERBOARD_REFRESH_MILLISECONDS = 500;
 
+// Replace a game summary with an updated copy, leaving the other games as they are
+const updateSummary = (games: GameSummary[], game_key: string, update: (game: GameSummary) => GameSummary) => {
+    const index = games.findIndex((game) => game.join_key === game_key);
+    if (index === -1) {
+        return games;
+    }
+    const newGames = [...games];
+    newGames[index] = update(games[index]);
+    return newGames;
+};
+
+// Replace the details of a game with an updated copy, if they were loaded
+const updateDetails = (details: { [game_key: string]: Game }, game_key: string, update: (game: Game) => Game) => {
+    const game = details[game_key];
+    if (!game) {
+        return details;
+    }
+    return { ...details, [game_key]: update(game) };
+};
 
 const AdminWindow = ({
     accessToken,
@@ -17,7 +38,12 @@ const AdminWindow = ({
     accessToken: string;
 }) => {
 
-    const [games, setGames] = useState<Game[]>([]);
+    // Summaries of the games loaded so far, newest first, and the full details of the games opened
+    const [games, setGames] = useState<GameSummary[]>([]);
+    const [details, setDetails] = useState<{ [game_key: string]: Game }>({});
+    const [leaderboards, setLeaderboards] = useState<{ [game_key: string]: LeaderboardEntry[] }>({});
+    const [nextCursor, setNextCursor] = useState<string | null>(null);
+    const [loadingMore, setLoadingMore] = useState(false);
     const [confirmOpen, setConfirmOpen] = useState(false);
     const [creatingGame, setCreatingGame] = useState(false);
     const [fetching, setFetching] = useState(false);
@@ -25,7 +51,14 @@ const AdminWindow = ({
     const isMobile = useMediaQuery(theme.breakpoints.down("md"));
 
     const { enqueueSnackbar } = useSnackbar();
-    
+
+    // Version and event id of the last update applied to each game, to detect missed updates
+    const lastVersions = useRef<{ [game_key: string]: number }>({});
+    const lastEventIds = useRef<{ [game_key: string]: string }>({});
+    const resumePending = useRef(false);
+    // The games opened so far, whose details and leaderboard are kept up to date
+    const openGames = useRef(new Set<string>());
+    const leaderboardTimers = useRef<{ [game_key: string]: ReturnType<typeof setTimeout> }>({});
 
     const onStartLevel = useCallback((game_key: string, level: string) => {
         fetch('/api/admin/game/start', {
@@ -70,68 +103,139 @@ const AdminWindow = ({
         });
     }, [accessToken, enqueueSnackbar]);
 
+    const fetchGamesPage = useCallback((cursor: string | null) => {
+        const url = new URL("/api/admin/games/summary", window.location.origin);
+        if (cursor) {
+            url.search = new URLSearchParams({ cursor }).toString();
+        }
+        return fetch(url, {
+            headers: {
+                Authorization: `Bearer ${accessToken}`,
+            },
+        }).then((response) => {
+            if (!response.ok) {
+                throw response;
+            }
+            return response.json() as Promise<GameSummaryPage>;
+        });
+    }, [accessToken]);
+
     const refreshGames = useCallback(() => {
         setFetching(true);
-        fetch("/api/admin/games", {
+        lastVersions.current = {};
+        lastEventIds.current = {};
+        resumePending.current = false;
+        fetchGamesPage(null)
+            .then((page) => {
+                setGames(page.games);
+                setNextCursor(page.next_cursor);
+                // The cards are rendered again closed
+                openGames.current.clear();
+                setDetails({});
+                setLeaderboards({});
+            })
+            .catch((error) => {
+                console.log("Failed to fetch:", error);
+            })
+            .finally(() => {
+                setFetching(false);
+            });
+    }, [fetchGamesPage]);
+
+    const loadMoreGames = useCallback(() => {
+        if (!nextCursor) {
+            return;
+        }
+        setLoadingMore(true);
+        fetchGamesPage(nextCursor)
+            .then((page) => {
+                setGames((games) => {
+                    const loaded = new Set(games.map((game) => game.join_key));
+                    return [...games, ...page.games.filter((game) => !loaded.has(game.join_key))];
+                });
+                setNextCursor(page.next_cursor);
+            })
+            .catch((error) => {
+                enqueueSnackbar('Failed to load more games', {
+                    variant: 'error',
+                });
+                console.log("Failed to fetch:", error);
+            })
+            .finally(() => {
+                setLoadingMore(false);
+            });
+    }, [fetchGamesPage, nextCursor, enqueueSnackbar]);
+
+    // Load the levels of a game
+    const loadGameDetails = useCallback((game_key: string) => {
+        fetch(`/api/admin/games/${game_key}`, {
             headers: {
                 Authorization: `Bearer ${accessToken}`,
             },
         })
             .then((response) => {
-                if (response.ok) {
-                    response.json().then((data) => {
-                        data.sort((a: Game, b: Game) => {
-                            if (a.status === 'active' && b.status !== 'active') {
-                                return -1;
-                            }
-                            if (a.status !== 'active' && b.status === 'active') {
-                                return 1;
-                            }
-                            return 0;
-                        });
-                        setGames(data);
-                    });
-                } else {
-                    console.log("Failed to fetch:", response);
+                if (!response.ok) {
+                    throw response;
                 }
+                return response.json() as Promise<Game>;
+            })
+            .then((game) => {
+                setDetails((details) => ({ ...details, [game_key]: game }));
             })
             .catch((error) => {
+                enqueueSnackbar('Failed to load game', {
+                    variant: 'error',
+                });
                 console.log("Failed to fetch:", error);
+            });
+    }, [accessToken, enqueueSnackbar]);
+
+    // Load the ranking of a game from its leaderboard, rather than sorting every player here
+    const loadLeaderboard = useCallback((game_key: string) => {
+        fetch(`/api/admin/games/${game_key}/leaderboard`, {
+            headers: {
+                Authorization: `Bearer ${accessToken}`,
+            },
+        })
+            .then((response) => {
+                if (!response.ok) {
+                    throw response;
+                }
+                return response.json() as Promise<Leaderboard>;
             })
-            .finally(() => {
-                setFetching(false);
+            .then((leaderboard) => {
+                setLeaderboards((leaderboards) => ({ ...leaderboards, [game_key]: leaderboard.top }));
+            })
+            .catch((error) => {
+                console.log("Failed to fetch:", error);
             });
     }, [accessToken]);
 
-    const refreshGamePlayer = useCallback((game_key: string, player_id: string) => {
-        const params = {
-            game_key,
-            player_id,
-        };
-
-        const base_url = "/api/game";
-        const url = new URL(base_url, window.location.origin);
-        url.search = new URLSearchParams(params).toString();
-
-        fetch(url).then(response => {
-            if (response.ok) {
-                response.json().then(data => {
-                    const newPlayerInfo: Player = data.player;
-                    setGames((games) => {
-                        const game = games.find((game) => game.join_key === game_key);
-                        if (!game) {
-                            return games;
-                        }
-
-                        game.players[player_id] = newPlayerInfo;
-                        return [...games];
-                    });
-                });
-            } else {
-                console.log("Failed to fetch:", response);
-            }
-        });
+    // Reload the leaderboard of an opened game once a burst of player updates is over
+    const scheduleLeaderboard = useCallback((game_key: string) => {
+        if (!openGames.current.has(game_key) || leaderboardTimers.current[game_key]) {
+            return;
+        }
+        leaderboardTimers.current[game_key] = setTimeout(() => {
+            delete leaderboardTimers.current[game_key];
+            loadLeaderboard(game_key);
+        }, LEADERBOARD_REFRESH_MILLISECONDS);
+    }, [loadLeaderboard]);
+
+    const openGame = useCallback((game_key: string) => {
+        if (openGames.current.has(game_key)) {
+            return;
+        }
+        openGames.current.add(game_key);
+        loadGameDetails(game_key);
+        loadLeaderboard(game_key);
+    }, [loadGameDetails, loadLeaderboard]);
 
+    useEffect(() => {
+        const timers = leaderboardTimers.current;
+        return () => {
+            Object.values(timers).forEach(clearTimeout);
+        };
     }, []);
 
     useEffect(() => {
@@ -140,33 +244,24 @@ const AdminWindow = ({
 
     const handlePlayerUpdates = useCallback((data: AdminUpdates) => {
         if (data.action === 'join') {
-            if (!data.game_key || !data.player) {
+            if (!data.game_key) {
                 return;
             }
-            setGames((games) => {
-                const newPlayer = data.player;
-                if (!newPlayer) {
-                    return games;
-                }
-                const game = games.find((game) => game.join_key === data.game_key);
-                if (!game) {
-                    return games;
-                }
-
-                if (!(newPlayer.player_id in game.players)) {
-                    game.players[newPlayer.player_id] = newPlayer;
-                }
-
-                return [...games];
-            });
+            // Updates are applied once each, so every join is a new player
+            setGames((games) => updateSummary(games, data.game_key, (game) => ({
+                ...game,
+                player_count: (game.player_count ?? 0) + 1,
+            })));
+            scheduleLeaderboard(data.game_key);
         }
 
         if (data.action === 'level_complete') {
-            if (data.game_key && data.player_id) {
-                refreshGamePlayer(data.game_key, data.player_id);
+            if (!data.game_key) {
+                return;
             }
+            scheduleLeaderboard(data.game_key);
         }
-    }, [refreshGamePlayer]);
+    }, [scheduleLeaderboard]);
 
     const handleGameUpdates = useCallback((data: AdminUpdates) => {
         if (data.action === 'start') {
@@ -177,18 +272,14 @@ const AdminWindow = ({
                 return;
             }
 
-            setGames((games) => {
-                const game = games.find((game) => game.join_key === game_key);
-                if (!game) {
-                    return games;
-                }
-                game.levels[level] = {
-                    started_at,
-                    started: true,
-                };
-
-                return [...games];
-            });
+            setGames((games) => updateSummary(games, game_key, (game) => ({
+                ...game,
+                current_level: level,
+            })));
+            setDetails((details) => updateDetails(details, game_key, (game) => ({
+                ...game,
+                levels: { ...game.levels, [level]: { started_at, started: true } },
+            })));
         }
 
         if (data.action === 'deactivate') {
@@ -197,33 +288,79 @@ const AdminWindow = ({
                 return;
             }
 
-            setGames((games) => {
-                // set the status as inactive
-                const game = games.find((game) => game.join_key === game_key);
-                if (!game) {
-                    return games;
-                }
-                game.status = 'inactive';
-                return [...games];
-            });
+            setGames((games) => updateSummary(games, game_key, (game) => ({
+                ...game,
+                status: 'inactive',
+            })));
+            setDetails((details) => updateDetails(details, game_key, (game) => ({
+                ...game,
+                status: 'inactive',
+            })));
         }
 
     }, []);
 
+    // Apply an update in version order, returning false if updates of its game were missed
+    const handleUpdate = useCallback((data: AdminUpdates) => {
+        if (data.version !== undefined) {
+            const last = lastVersions.current[data.game_key];
+            if (last !== undefined && data.version <= last) {
+                // Already applied, e.g. replayed after a resume
+                return true;
+            }
+            if (last !== undefined && data.version > last + 1) {
+                return false;
+            }
+            lastVersions.current[data.game_key] = data.version;
+        }
+        if (data.event_id) {
+            lastEventIds.current[data.game_key] = data.event_id;
+        }
+        if (data.type === "player_update") {
+            handlePlayerUpdates(data);
+        } else if (data.type === "game_update") {
+            handleGameUpdates(data);
+        }
+        return true;
+    }, [handlePlayerUpdates, handleGameUpdates]);
+
 
     useEffect(() => {
-        const ws = new WebSocket(`${wsUrl}api/ws/admin`);
+        // Bursts of updates arrive coalesced per game in batch messages
+        const ws = new WebSocket(`${wsUrl}api/ws/admin?batch=1`);
 
         ws.onopen = () => {
             console.log("Admin Connected to WS");
         };
 
+        const applyUpdates = (updates: AdminUpdates[]) => {
+            for (const update of updates) {
+                if (!handleUpdate(update)) {
+                    // Ask for every update after the last one applied to this game
+                    const after = lastEventIds.current[update.game_key];
+                    if (!after) {
+                        refreshGames();
+                    } else if (!resumePending.current) {
+                        resumePending.current = true;
+                        ws.send(JSON.stringify({ type: "resume", after }));
+                    }
+                    return;
+                }
+            }
+        };
+
         ws.onmessage = (event) => {
-            const data = JSON.parse(event.data) as AdminUpdates;
-            if (data.type === "player_update") {
-                handlePlayerUpdates(data);
-            } else if (data.type === "game_update") {
-                handleGameUpdates(data);
+            const data = JSON.parse(event.data) as AdminUpdates | AdminUpdateBatch | AdminReplay | { type: "resync" | "pong" };
+            if (data.type === "resync") {
+                // Updates were dropped or are no longer in the event log, fetch every game again
+                refreshGames();
+            } else if (data.type === "replay") {
+                resumePending.current = false;
+                applyUpdates(data.events);
+            } else if (data.type === "batch") {
+                applyUpdates(data.events);
+            } else if (data.type === "player_update" || data.type === "game_update") {
+                applyUpdates([data]);
             }
             console.log("Admin WS Message", data);
         };
@@ -241,7 +378,7 @@ const AdminWindow = ({
                 ws.close();
             }
         };
-    }, [handlePlayerUpdates, handleGameUpdates]);
+    }, [handleUpdate, refreshGames]);
 
 
 
@@ -307,14 +444,33 @@ const AdminWindow = ({
                             my: 3,
                         }}
                     >
-                        {games.map((game) => (
+                        {games.map((summary) => (
                             <GameCard
                                 onDeactivateGame={onDeactivateGame}
                                 onStartLevel={onStartLevel}
-                                key={game.join_key}
-                                game={game}
+                                onOpen={openGame}
+                                key={summary.join_key}
+                                summary={summary}
+                                game={details[summary.join_key]}
+                                leaderboard={leaderboards[summary.join_key]}
                             />
                         ))}
+                        {nextCursor && (
+                            <Box
+                                display={"flex"}
+                                sx={{
+                                    justifyContent: "center",
+                                    mt: 2,
+                                }}
+                            >
+                                <Button
+                                    disabled={loadingMore}
+                                    onClick={loadMoreGames}
+                                >
+                                    Load More
+                                </Button>
+                            </Box>
+                        )}
                     </Box>
                 )}
             </Container>
@@ -1,29 +1,27 @@
 import Game from "@app/models/Game";
-import { calculatePlayerScore, formatISODate, secondsToHourMinuteSecond } from "../../services/helper";
+import GameSummary from "@app/models/GameSummary";
+import { LeaderboardEntry } from "@app/models/Leaderboard";
+import { formatISODate, secondsToHourMinuteSecond } from "../../services/helper";
 import { ExpandMore } from "@mui/icons-material";
-import { Accordion, AccordionActions, AccordionDetails, AccordionSummary, Box, Button, Chip, Dialog, DialogActions, DialogTitle, Paper, Stack, Tab, Table, TableBody, TableCell, TableContainer, TableHead, TableRow, Tabs, Typography, useMediaQuery, useTheme } from "@mui/material";
+import { Accordion, AccordionActions, AccordionDetails, AccordionSummary, Box, Button, Chip, CircularProgress, Dialog, DialogActions, DialogTitle, Paper, Stack, Tab, Table, TableBody, TableCell, TableContainer, TableHead, TableRow, Tabs, Typography, useMediaQuery, useTheme } from "@mui/material";
 import { useState } from "react";
-import Player from "@app/models/Player";
 
 
-const sortPlayers = (players: {[player_id: string]: Player}) => {
-    // sort by Player level and if player level is same then sort by score
-    return Object.values(players).sort((a, b) => {
-        if (a.level === b.level) {
-            return  calculatePlayerScore(a) - calculatePlayerScore(b);
-        }
-        return b.level - a.level;
-    });
-}
-
 const GameCard = ({
+    summary,
     game,
+    leaderboard,
     onStartLevel,
-    onDeactivateGame
+    onDeactivateGame,
+    onOpen
 }: {
-    game: Game,
+    summary: GameSummary,
+    // The levels and the top players, loaded when the card is first opened
+    game?: Game,
+    leaderboard?: LeaderboardEntry[],
     onStartLevel: (game_key: string, level: string) => void,
-    onDeactivateGame: (game_key: string) => void
+    onDeactivateGame: (game_key: string) => void,
+    onOpen: (game_key: string) => void
 }) => {
     const [showDeactivateConfirmModal, setShowDeactivateConfirmModal] = useState(false);
     const theme = useTheme();
@@ -32,7 +30,13 @@ const GameCard = ({
     const [tab, setTab] = useState(0);
     return (
         <>
-            <Accordion>
+            <Accordion
+                onChange={(_e, expanded) => {
+                    if (expanded) {
+                        onOpen(summary.join_key);
+                    }
+                }}
+            >
                 <AccordionSummary expandIcon={<ExpandMore />}>
                     <Box
                         display={"flex"}
@@ -42,125 +46,143 @@ const GameCard = ({
                         }}
                     >
                         <Typography variant="h6" color="initial">
-                            {game.join_key}
+                            {summary.join_key}
                         </Typography>
                         <Chip
                             size="small"
-                            label={game.status.toLocaleUpperCase()}
+                            label={summary.status.toLocaleUpperCase()}
                             color={
-                                game.status === "active" ? "success" : undefined
+                                summary.status === "active" ? "success" : undefined
                             }
                         />
+                        {summary.player_count !== null && (
+                            <Typography variant="body2" color="text.secondary">
+                                {summary.player_count} players
+                            </Typography>
+                        )}
+                        {summary.current_level && (
+                            <Typography variant="body2" color="text.secondary">
+                                Level {summary.current_level}
+                            </Typography>
+                        )}
                     </Box>
                 </AccordionSummary>
                 <AccordionDetails>
-                    <Stack spacing={2}>
-                        <Box>{formatISODate(game.created_at)}</Box>
-                        <Tabs
-                            value={tab}
-                            onChange={(_e, value: number) => {
-                                setTab(value);
+                    {!game && (
+                        <Box
+                            display={"flex"}
+                            sx={{
+                                justifyContent: "center",
                             }}
                         >
-                            <Tab label="Players"></Tab>
-                            <Tab
-                                label="Levels"
-                                id={`game-tab-${game.join_key}-1`}
-                            ></Tab>
-                        </Tabs>
-                        <Box hidden={tab !== 0}>
-                            <Typography variant="h6">Players</Typography>
-                            <TableContainer component={Paper}>
-                                <Table>
-                                    <TableHead>
-                                        <TableRow>
-                                            <TableCell>#</TableCell>
-                                            <TableCell>Name</TableCell>
-                                            <TableCell align="right">
-                                                Level
-                                            </TableCell>
-                                            <TableCell align="right">
-                                                Score
-                                            </TableCell>
-                                        </TableRow>
-                                    </TableHead>
-                                    <TableBody>
-                                        {Object.entries(
-                                            sortPlayers(game.players)
-                                        ).map(([player_id, player], index) => (
-                                            <TableRow key={player_id}>
-                                                <TableCell>{index + 1}</TableCell>
-                                                <TableCell>
-                                                    {player.name}
-                                                </TableCell>
+                            <CircularProgress />
+                        </Box>
+                    )}
+                    {game && (
+                        <Stack spacing={2}>
+                            <Box>{formatISODate(summary.created_at)}</Box>
+                            <Tabs
+                                value={tab}
+                                onChange={(_e, value: number) => {
+                                    setTab(value);
+                                }}
+                            >
+                                <Tab label="Players"></Tab>
+                                <Tab
+                                    label="Levels"
+                                    id={`game-tab-${summary.join_key}-1`}
+                                ></Tab>
+                            </Tabs>
+                            <Box hidden={tab !== 0}>
+                                <Typography variant="h6">Players</Typography>
+                                <TableContainer component={Paper}>
+                                    <Table>
+                                        <TableHead>
+                                            <TableRow>
+                                                <TableCell>#</TableCell>
+                                                <TableCell>Name</TableCell>
                                                 <TableCell align="right">
-                                                    {player.level}
+                                                    Level
                                                 </TableCell>
                                                 <TableCell align="right">
-                                                    {secondsToHourMinuteSecond(
-                                                        calculatePlayerScore(
-                                                            player
-                                                        )
-                                                    )}
+                                                    Score
                                                 </TableCell>
                                             </TableRow>
-                                        ))}
-                                    </TableBody>
-                                </Table>
-                            </TableContainer>
-                        </Box>
-                        <Box hidden={tab !== 1}>
-                            <Typography variant="h6">Levels</Typography>
-                            <TableContainer component={Paper}>
-                                <Table>
-                                    <TableHead>
-                                        <TableRow>
-                                            <TableCell>Level</TableCell>
-                                            <TableCell align="right">
-                                                Started At
-                                            </TableCell>
-                                            <TableCell align="right">
-                                                Action
-                                            </TableCell>
-                                        </TableRow>
-                                    </TableHead>
-                                    <TableBody>
-                                        {Object.entries(game.levels).map(
-                                            ([level, info]) => (
-                                                <TableRow key={level}>
+                                        </TableHead>
+                                        <TableBody>
+                                            {leaderboard?.map((entry) => (
+                                                <TableRow key={entry.player_id}>
+                                                    <TableCell>{entry.rank}</TableCell>
                                                     <TableCell>
-                                                        {level}
+                                                        {entry.name}
                                                     </TableCell>
                                                     <TableCell align="right">
-                                                        {formatISODate(
-                                                            info.started_at
-                                                        )}
+                                                        {entry.level}
                                                     </TableCell>
                                                     <TableCell align="right">
-                                                        {!info.started && (
-                                                            <Button
-                                                                onClick={() => {
-                                                                    onStartLevel(
-                                                                        game.join_key,
-                                                                        level
-                                                                    );
-                                                                }}
-                                                            >
-                                                                Start
-                                                            </Button>
+                                                        {secondsToHourMinuteSecond(
+                                                            entry.total_time
                                                         )}
                                                     </TableCell>
                                                 </TableRow>
-                                            )
-                                        )}
-                                    </TableBody>
-                                </Table>
-                            </TableContainer>
-                        </Box>
-                    </Stack>
+                                            ))}
+                                        </TableBody>
+                                    </Table>
+                                </TableContainer>
+                            </Box>
+                            <Box hidden={tab !== 1}>
+                                <Typography variant="h6">Levels</Typography>
+                                <TableContainer component={Paper}>
+                                    <Table>
+                                        <TableHead>
+                                            <TableRow>
+                                                <TableCell>Level</TableCell>
+                                                <TableCell align="right">
+                                                    Started At
+                                                </TableCell>
+                                                <TableCell align="right">
+                                                    Action
+                                                </TableCell>
+                                            </TableRow>
+                                        </TableHead>
+                                        <TableBody>
+                                            {Object.entries(game.levels).map(
+                                                ([level, info]) => (
+                                                    <TableRow key={level}>
+                                                        <TableCell>
+                                                            {level}
+                                                        </TableCell>
+                                                        <TableCell align="right">
+                                                            {formatISODate(
+                                                                info.started_at
+                                                            )}
+                                                        </TableCell>
+                                                        <TableCell align="right">
+                                                            {!info.started && (
+                                                                <Button
+                                                                    onClick={() => {
+                                                                        onStartLevel(
+                                                                            summary.join_key,
+                                                                            level
+                                                                        );
+                                                                    }}
+                                                                >
+                                                                    Start
+                                                                </Button>
+                                                            )}
+                                                        </TableCell>
+                                                    </TableRow>
+                                                )
+                                            )}
+                                        </TableBody>
+                                    </Table>
+                                </TableContainer>
+                            </Box>
+                        </Stack>
+                    )}
                 </AccordionDetails>
                 <AccordionActions>
-                    {game.status === "active" && (
+                    {summary.status === "active" && (
                         <Button
                             color="error"
                             size="small"
@@ -198,7 +220,7 @@ const GameCard = ({
                         color="error"
                         variant="contained"
                         onClick={() => {
-                            onDeactivateGame(game.join_key);
+                            onDeactivateGame(summary.join_key);
                             setShowDeactivateConfirmModal(false);
                         }}
                     >
@@ -8,6 +8,20 @@ interface AdminUpdates {
     game_key: string;
     level?: string,
     started_at?: string,
+    score?: number,
+    version?: number,
+    event_id?: string,
+}
+
+export interface AdminUpdateBatch {
+    type: 'batch';
+    game_key: string;
+    events: AdminUpdates[];
+}
+
+export interface AdminReplay {
+    type: 'replay';
+    events: AdminUpdates[];
 }
 
 export default AdminUpdates;
\ No newline at end of file
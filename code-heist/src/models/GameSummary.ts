@@ -0,0 +1,14 @@
+interface GameSummary {
+    join_key: string;
+    status: string;
+    created_at: string;
+    player_count: number | null;
+    current_level: string | null;
+}
+
+export interface GameSummaryPage {
+    games: GameSummary[];
+    next_cursor: string | null;
+}
+
+export default GameSummary;
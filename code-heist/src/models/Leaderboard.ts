@@ -0,0 +1,15 @@
+export interface LeaderboardEntry {
+    rank: number;
+    player_id: string;
+    name: string | null;
+    level: number;
+    total_time: number;
+}
+
+interface Leaderboard {
+    game_key: string;
+    top: LeaderboardEntry[];
+    player: LeaderboardEntry | null;
+}
+
+export default Leaderboard;
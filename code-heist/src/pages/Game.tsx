@@ -42,6 +42,10 @@ function Game() {
 
     const { handleLevelComplete } = useGameContext();
 
+    // Version of the game state shown, updates must be applied one version after the other
+    const versionRef = React.useRef<number | null>(null);
+    const syncPending = React.useRef(false);
+
     const onWin = () => {
         console.log('Win');
         refreshPlayerAndGame();
@@ -134,12 +138,10 @@ function Game() {
                     return game;
                 } 
 
-                const newGame = { ...game };
-                newGame.levels[level] = {
-                    started_at,
-                    started: true,
+                return {
+                    ...game,
+                    levels: { ...game.levels, [level]: { started_at, started: true } },
                 };
-                return newGame;
             });
         }
 
@@ -180,15 +182,65 @@ function Game() {
                 console.log("Connected to server");
             }
 
+            // Ask for the updates after the version shown, or for the whole game if there is none
+            const requestSync = () => {
+                if (syncPending.current) {
+                    return;
+                }
+                syncPending.current = true;
+                ws.send(JSON.stringify({
+                    type: "sync",
+                    game_id: ids.game_id,
+                    player_id: ids.player_id,
+                    version: versionRef.current,
+                }));
+            }
+
+            // Apply an update of this game, returning false if updates before it were missed
+            const applyUpdate = (data: AdminUpdates) => {
+                if (data.game_key !== ids.game_id || versionRef.current === null || data.version === undefined) {
+                    return true;
+                }
+                if (data.version <= versionRef.current) {
+                    return true;
+                }
+                if (data.version > versionRef.current + 1) {
+                    return false;
+                }
+                versionRef.current = data.version;
+                if (data.type === 'game_update') {
+                    handleGameUpdates(data);
+                }
+                return true;
+            }
+
             ws.onmessage = (message) => {
                 const data = JSON.parse(message.data);
                 console.log('Message received: ', data);
-                if (data.type === 'connect') {
+                if (data.type === 'connect' || data.type === 'snapshot') {
                     setPlayer(data.player);
                     setGame(data.game);
+                    versionRef.current = data.version;
+                    syncPending.current = false;
                 }
-                if (data.type === 'game_update') {
-                    handleGameUpdates(data);
+                if (data.type === 'sync') {
+                    // Nothing was missed
+                    syncPending.current = false;
+                }
+                if (data.type === 'replay') {
+                    syncPending.current = false;
+                    if (!(data.events as AdminUpdates[]).every(applyUpdate)) {
+                        requestSync();
+                    }
+                }
+                if (data.type === 'resync') {
+                    // Updates were dropped because this client fell behind
+                    requestSync();
+                }
+                if (data.type === 'game_update' || data.type === 'player_update') {
+                    if (!applyUpdate(data)) {
+                        requestSync();
+                    }
                 }
                 setLoading(false);
                 setGameLoadError('');
@@ -254,7 +306,7 @@ function Game() {
             {player && game && !gameLoadError && (
                 <Box className="main-layout">
                     <ActionBar onWin={onWin} player={player} game={game} />
-                    <ChatWindow level={player.level} game_key={game.join_key} />
+                    <ChatWindow level={player.level} game_key={game.join_key} player_id={player.player_id} />
                 </Box>
             )}
             {loading && !gameLoadError && (
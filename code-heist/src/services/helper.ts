@@ -15,4 +15,23 @@ export const formatISODate = (isoDate: string) => {
     if (!isoDate) return "";
     const date = new Date(isoDate);
     return date.toLocaleString();
-};
\ No newline at end of file
+};
+// Split Server-Sent Events off the text received so far, returning the events and the incomplete rest
+export const parseEvents = (text: string) => {
+    const frames = text.split("\n\n");
+    const rest = frames.pop() ?? "";
+    const events = frames.map((frame) => {
+        let event = "message";
+        const data: string[] = [];
+        for (const line of frame.split("\n")) {
+            if (line.startsWith("event:")) {
+                event = line.slice(6).trim();
+            } else if (line.startsWith("data:")) {
+                data.push(line.slice(5).trimStart());
+            }
+            // Other lines, such as ": heartbeat" comments, are ignored
+        }
+        return { event, data: data.join("\n") };
+    }).filter((event) => event.data);
+    return { events, rest };
+};
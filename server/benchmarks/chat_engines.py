@@ -0,0 +1,120 @@
+"""
+Benchmark the CPU time each chat engine spends per streamed token.
+
+The OpenAI API is replaced by an in-process HTTP transport that replays a canned stream of completion chunks, so
+only the client side is measured: parsing the stream, the machinery of the engine and yielding the tokens. The
+import time of each engine is measured in a fresh interpreter.
+
+Run it from the server directory:
+
+    python -m benchmarks.chat_engines --tokens 2000 --runs 5
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+import httpx
+
+os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+
+# pylint: disable=wrong-import-position
+from lib.chat import ENGINES
+
+ENGINE_IMPORTS = {
+    "langchain": "import langchain.callbacks, langchain_core.messages, langchain_openai",
+    "openai": "import openai",
+}
+MESSAGES = [
+    {"role": "system", "content": "You are a benchmark."},
+    {"role": "user", "content": "Hello"},
+]
+
+
+def completion_stream(tokens: int):
+    """Build the body of a streamed chat completion of a number of tokens."""
+    chunk = {
+        "id": "chatcmpl-benchmark",
+        "object": "chat.completion.chunk",
+        "created": 0,
+        "model": "gpt-3.5-turbo",
+        "choices": [{"index": 0, "delta": {}, "finish_reason": None}],
+    }
+    events = []
+    for index in range(tokens):
+        chunk["choices"][0]["delta"] = {"content": f"token{index} "}
+        events.append(f"data: {json.dumps(chunk)}\n\n")
+    chunk["choices"][0].update(delta={}, finish_reason="stop")
+    events.append(f"data: {json.dumps(chunk)}\n\n")
+    events.append("data: [DONE]\n\n")
+    return "".join(events).encode()
+
+
+def replay_client(body: bytes):
+    """Get an HTTP client answering every request with the same streamed completion."""
+    return httpx.AsyncClient(
+        transport=httpx.MockTransport(
+            lambda _: httpx.Response(
+                200, headers={"content-type": "text/event-stream"}, content=body
+            )
+        )
+    )
+
+
+async def measure(engine: str, body: bytes, tokens: int):
+    """Stream one completion with an engine and return the CPU seconds it took."""
+    async with replay_client(body) as http_client:
+        count = 0
+        started_at = time.process_time()
+        async for _ in ENGINES[engine](
+            MESSAGES, "gpt-3.5-turbo", 0.6, http_client=http_client
+        ):
+            count += 1
+        seconds = time.process_time() - started_at
+    if count != tokens:
+        raise RuntimeError(f"{engine} streamed {count} tokens instead of {tokens}")
+    return seconds
+
+
+def import_seconds(engine: str):
+    """Measure the import time of an engine in a fresh interpreter."""
+    code = (
+        "import time; started_at = time.perf_counter(); "
+        f"{ENGINE_IMPORTS[engine]}; print(time.perf_counter() - started_at)"
+    )
+    output = subprocess.run(
+        [sys.executable, "-c", code], check=True, capture_output=True, text=True
+    ).stdout
+    return float(output)
+
+
+async def run(tokens: int, runs: int):
+    """Benchmark every engine and print the results."""
+    body = completion_stream(tokens)
+    print(f"{'engine':<10} {'cpu us/token':>14} {'min us/token':>14} {'import s':>10}")
+    for engine in ENGINES:
+        # The first run pays for imports and client creation
+        await measure(engine, body, tokens)
+        samples = [await measure(engine, body, tokens) for _ in range(runs)]
+        print(
+            f"{engine:<10} {statistics.median(samples) / tokens * 1e6:>14.1f} "
+            f"{min(samples) / tokens * 1e6:>14.1f} {import_seconds(engine):>10.2f}"
+        )
+
+
+def main():
+    """Parse the arguments and run the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--tokens", type=int, default=2000)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+    asyncio.run(run(args.tokens, args.runs))
+
+
+if __name__ == "__main__":
+    main()
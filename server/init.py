@@ -5,18 +5,15 @@ from dotenv import load_dotenv
 logging_config = {
     "version": 1,
     "disable_existing_loggers": False,
-    "formatters": {
-        "default": {
-            "()": "uvicorn.logging.DefaultFormatter",
-            "fmt": "%(levelprefix)s %(asctime)s %(message)s",
-            "use_colors": True,
-        },
+    "filters": {
+        "trace_id": {"()": "lib.tracing.TraceIdFilter"},
+        "sampling": {"()": "lib.logs.SamplingFilter"},
     },
     "handlers": {
+        # Queues the records for a background thread writing them to stdout
         "default": {
-            "formatter": "default",
-            "class": "logging.StreamHandler",
-            "stream": "ext://sys.stdout",
+            "()": "lib.logs.queue_handler",
+            "filters": ["trace_id", "sampling"],
         },
     },
     "root": {
@@ -34,8 +31,9 @@ logging_config = {
     },
 }
 
-dictConfig(logging_config)
+# Loaded first, the logging filters read their settings from the environment
 load_dotenv()
+dictConfig(logging_config)
 
 def get_logger(name: str):
     """Get logger.
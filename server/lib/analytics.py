@@ -0,0 +1,161 @@
+"""
+This module maintains per-level analytics in Redis as players guess codes.
+
+Each guess updates a hash for its game and a global hash: the number of attempts and completions of each level, the
+total solve time and a log-bucketed sketch of the solve times. The answers leaking the code of a level are counted
+in the same hashes. The sketch keeps one counter per bucket, each bucket spanning a constant ratio of times, so
+quantiles are estimated within a fixed relative error (2%) from a few dozen counters per level, however many players
+have solved it. Reading the analytics is a single HGETALL whose size depends on the number of levels only.
+"""
+
+import math
+from collections import defaultdict
+from typing import Dict, Optional
+
+from redis import Redis
+
+from .expiry import GAME_KEY_TTL_SECONDS
+
+GLOBAL_LEVEL_STATS_KEY = "level_stats:global"
+
+# Relative error of the estimated quantiles
+RELATIVE_ACCURACY = 0.02
+GAMMA = (1 + RELATIVE_ACCURACY) / (1 - RELATIVE_ACCURACY)
+LOG_GAMMA = math.log(GAMMA)
+# Solve times below this are counted in the lowest bucket
+MIN_SOLVE_SECONDS = 0.1
+
+QUANTILES = (0.5, 0.9, 0.99)
+
+
+def level_stats_key(join_key: str):
+    """Get the Redis key of the hash holding the level analytics of a game."""
+    return f"level_stats:{join_key}"
+
+
+def bucket_index(seconds: float):
+    """Get the index of the sketch bucket counting a solve time."""
+    return math.ceil(math.log(max(seconds, MIN_SOLVE_SECONDS)) / LOG_GAMMA)
+
+
+def bucket_value(index: int):
+    """Get the solve time representing a sketch bucket, within the relative accuracy of every time it counts."""
+    return 2 * GAMMA**index / (GAMMA + 1)
+
+
+def record_attempt(rds_client: Redis, join_key: str, level: int):
+    """
+    Count a guess at a level.
+
+    Args:
+        rds_client (Redis): The Redis client.
+        join_key (str): The join key of the game.
+        level (int): The level guessed.
+    """
+    pipe = rds_client.pipeline(transaction=False)
+    for key in (level_stats_key(join_key), GLOBAL_LEVEL_STATS_KEY):
+        pipe.hincrby(key, f"{level}:attempts", 1)
+    pipe.expire(level_stats_key(join_key), GAME_KEY_TTL_SECONDS)
+    pipe.execute()
+
+
+def record_completion(rds_client: Redis, join_key: str, level: int, seconds: float):
+    """
+    Count a level completion and add its solve time to the sketch.
+
+    Args:
+        rds_client (Redis): The Redis client.
+        join_key (str): The join key of the game.
+        level (int): The level completed.
+        seconds (float): The time taken to solve the level.
+    """
+    bucket = bucket_index(seconds)
+    pipe = rds_client.pipeline(transaction=False)
+    for key in (level_stats_key(join_key), GLOBAL_LEVEL_STATS_KEY):
+        pipe.hincrby(key, f"{level}:completions", 1)
+        pipe.hincrbyfloat(key, f"{level}:time", seconds)
+        pipe.hincrby(key, f"{level}:bucket:{bucket}", 1)
+    pipe.expire(level_stats_key(join_key), GAME_KEY_TTL_SECONDS)
+    pipe.execute()
+
+
+def record_leak(rds_client: Redis, join_key: str, level: int):
+    """
+    Count an answer that leaked the code of a level.
+
+    Args:
+        rds_client (Redis): The Redis client.
+        join_key (str): The join key of the game.
+        level (int): The level whose code leaked.
+    """
+    pipe = rds_client.pipeline(transaction=False)
+    for key in (level_stats_key(join_key), GLOBAL_LEVEL_STATS_KEY):
+        pipe.hincrby(key, f"{level}:leaks", 1)
+    pipe.expire(level_stats_key(join_key), GAME_KEY_TTL_SECONDS)
+    pipe.execute()
+
+
+def estimate_quantile(buckets: Dict[int, int], total: int, quantile: float):
+    """
+    Estimate a quantile of the solve times counted in a sketch.
+
+    Args:
+        buckets (dict): The count of each bucket index.
+        total (int): The total count of the buckets.
+        quantile (float): The quantile, between 0 and 1.
+
+    Returns:
+        float: The estimated solve time in seconds, or None if the sketch is empty.
+    """
+    if total == 0:
+        return None
+    rank = quantile * (total - 1)
+    seen = 0
+    for index in sorted(buckets):
+        seen += buckets[index]
+        if seen > rank:
+            return bucket_value(index)
+    return bucket_value(max(buckets))
+
+
+def get_level_stats(rds_client: Redis, join_key: Optional[str] = None):
+    """
+    Get the attempts, completions, leaks and solve time quantiles of each level.
+
+    Args:
+        rds_client (Redis): The Redis client.
+        join_key (str, optional): The join key of a game, or None for the stats of every game. Defaults to None.
+
+    Returns:
+        dict: The stats of each level that has been attempted or has leaked, keyed by level.
+    """
+    key = level_stats_key(join_key) if join_key else GLOBAL_LEVEL_STATS_KEY
+    counters = defaultdict(
+        lambda: {"attempts": 0, "completions": 0, "leaks": 0, "time": 0.0, "buckets": {}}
+    )
+    for field, value in rds_client.hgetall(key).items():
+        level, name, *bucket = field.decode().split(":")
+        if name == "bucket":
+            counters[level]["buckets"][int(bucket[0])] = int(value)
+        elif name == "time":
+            counters[level]["time"] = float(value)
+        else:
+            counters[level][name] = int(value)
+
+    stats = {}
+    for level in sorted(counters, key=int):
+        counter = counters[level]
+        completions = counter["completions"]
+        stats[level] = {
+            "attempts": counter["attempts"],
+            "completions": completions,
+            "leaks": counter["leaks"],
+            "mean_seconds": counter["time"] / completions if completions else None,
+            **{
+                f"p{round(quantile * 100)}_seconds": estimate_quantile(
+                    counter["buckets"], completions, quantile
+                )
+                for quantile in QUANTILES
+            },
+        }
+    return stats
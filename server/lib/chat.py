@@ -0,0 +1,299 @@
+"""
+This module streams chat completions from the model.
+
+Two engines produce the same stream of tokens from the same OpenAI-style messages. The "langchain" engine runs
+the request through LangChain's ChatOpenAI, where every token goes through the callback manager and the queue of
+an AsyncIteratorCallbackHandler. The "openai" engine reads the async streaming iterator of the OpenAI SDK directly,
+which costs less per token and does not import LangChain at all. CHAT_ENGINE selects the engine, LangChain is
+only imported when its engine is used.
+
+stream_resilient_completion retries a request that fails before its first token, with jittered exponential
+backoff, up to LLM_MAX_ATTEMPTS times, and gives up on a model that takes longer than LLM_FIRST_TOKEN_TIMEOUT_SECONDS
+to send its first token. Each model has a circuit breaker, and while the breaker of a model is open
+its requests go straight to FALLBACK_MODEL_NAME instead, so time to first token stays bounded while a model is
+failing. Errors after the first token are not retried, as the tokens have already been sent.
+"""
+
+import asyncio
+import logging
+import os
+import random
+import threading
+from collections import Counter
+from typing import AsyncIterator, Dict, List, Optional
+
+import httpx
+
+from .circuit_breaker import CircuitBreaker
+
+log = logging.getLogger(__name__)
+
+DEFAULT_MODEL_NAME = "gpt-3.5-turbo"
+DEFAULT_TEMPERATURE = 0.6
+
+CHAT_ENGINE = os.getenv("CHAT_ENGINE", "langchain")
+FALLBACK_MODEL_NAME = os.getenv("FALLBACK_MODEL_NAME", DEFAULT_MODEL_NAME)
+LLM_MAX_ATTEMPTS = int(os.getenv("LLM_MAX_ATTEMPTS", "3"))
+LLM_RETRY_BASE_SECONDS = float(os.getenv("LLM_RETRY_BASE_SECONDS", "0.25"))
+LLM_RETRY_MAX_SECONDS = float(os.getenv("LLM_RETRY_MAX_SECONDS", "2"))
+LLM_FIRST_TOKEN_TIMEOUT_SECONDS = float(
+    os.getenv("LLM_FIRST_TOKEN_TIMEOUT_SECONDS", "10")
+)
+
+_openai_client = None
+_openai_client_lock = threading.Lock()
+
+
+def get_openai_client():
+    """
+    Get the async OpenAI client, creating it on first use.
+
+    Returns:
+        openai.AsyncOpenAI: The client, configured from the OPENAI_* environment variables.
+    """
+    global _openai_client  # pylint: disable=global-statement
+    if _openai_client is None:
+        with _openai_client_lock:
+            if _openai_client is None:
+                from openai import AsyncOpenAI  # pylint: disable=import-outside-toplevel
+
+                # Retries are made by stream_resilient_completion
+                _openai_client = AsyncOpenAI(max_retries=0)
+    return _openai_client
+
+
+async def stream_openai(
+    messages: List[Dict[str, str]],
+    model: str,
+    temperature: float,
+    http_client: Optional[httpx.AsyncClient] = None,
+) -> AsyncIterator[str]:
+    """
+    Stream a chat completion with the OpenAI SDK.
+
+    Args:
+        messages (list): The messages of the chat, as OpenAI messages.
+        model (str): The name of the model.
+        temperature (float): The sampling temperature.
+        http_client (httpx.AsyncClient, optional): The HTTP client to send the request with.
+
+    Yields:
+        str: The tokens of the completion.
+    """
+    client = get_openai_client()
+    if http_client is not None:
+        client = client.with_options(http_client=http_client)
+    stream = await client.chat.completions.create(
+        model=model, messages=messages, temperature=temperature, stream=True
+    )
+    try:
+        async for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+    finally:
+        await stream.close()
+
+
+async def stream_langchain(
+    messages: List[Dict[str, str]],
+    model: str,
+    temperature: float,
+    http_client: Optional[httpx.AsyncClient] = None,
+) -> AsyncIterator[str]:
+    """
+    Stream a chat completion with LangChain.
+
+    Args:
+        messages (list): The messages of the chat, as OpenAI messages.
+        model (str): The name of the model.
+        temperature (float): The sampling temperature.
+        http_client (httpx.AsyncClient, optional): The HTTP client to send the request with.
+
+    Yields:
+        str: The tokens of the completion.
+    """
+    # pylint: disable=import-outside-toplevel
+    from langchain.callbacks import AsyncIteratorCallbackHandler
+    from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+    from langchain_openai import ChatOpenAI
+
+    message_types = {
+        "system": SystemMessage,
+        "user": HumanMessage,
+        "assistant": AIMessage,
+    }
+    callback = AsyncIteratorCallbackHandler()
+    chat_model = ChatOpenAI(
+        streaming=True,
+        model=model,
+        callbacks=[callback],
+        temperature=temperature,
+        max_retries=0,
+        http_async_client=http_client,
+    )
+    task = asyncio.create_task(
+        chat_model.agenerate(
+            messages=[
+                [
+                    message_types[message["role"]](content=message["content"])
+                    for message in messages
+                ]
+            ]
+        )
+    )
+    try:
+        async for token in callback.aiter():
+            yield token
+        await task
+    finally:
+        callback.done.set()
+        task.cancel()
+
+
+ENGINES = {"langchain": stream_langchain, "openai": stream_openai}
+
+
+def stream_completion(
+    messages: List[Dict[str, str]],
+    model: str = DEFAULT_MODEL_NAME,
+    temperature: float = DEFAULT_TEMPERATURE,
+    engine: str = CHAT_ENGINE,
+) -> AsyncIterator[str]:
+    """
+    Stream a chat completion with an engine.
+
+    Args:
+        messages (list): The messages of the chat, as OpenAI messages.
+        model (str, optional): The name of the model. Defaults to DEFAULT_MODEL_NAME.
+        temperature (float, optional): The sampling temperature. Defaults to DEFAULT_TEMPERATURE.
+        engine (str, optional): The name of the engine. Defaults to CHAT_ENGINE.
+
+    Returns:
+        AsyncIterator[str]: The tokens of the completion.
+
+    Raises:
+        ValueError: If the engine does not exist.
+    """
+    if engine not in ENGINES:
+        raise ValueError(f"Unknown chat engine {engine}")
+    return ENGINES[engine](messages, model, temperature)
+
+
+class LLMUnavailable(Exception):
+    """Raised when no model could start a completion."""
+
+
+breakers: Dict[str, CircuitBreaker] = {}
+llm_counters = Counter()
+
+
+def get_breaker(model: str):
+    """Get the circuit breaker of a model."""
+    breaker = breakers.get(model)
+    if breaker is None:
+        breaker = breakers.setdefault(model, CircuitBreaker(model))
+    return breaker
+
+
+def is_retryable(exc: Exception):
+    """Check if an error starting a completion is transient and worth retrying."""
+    # pylint: disable=import-outside-toplevel
+    from openai import APIConnectionError, APIStatusError
+
+    if isinstance(exc, (asyncio.TimeoutError, APIConnectionError, httpx.TransportError)):
+        return True
+    if isinstance(exc, APIStatusError):
+        return exc.status_code in (408, 409, 429) or exc.status_code >= 500
+    return False
+
+
+def backoff_seconds(attempt: int):
+    """Get a random delay before a retry, with an exponentially growing bound (full jitter)."""
+    return random.uniform(
+        0, min(LLM_RETRY_MAX_SECONDS, LLM_RETRY_BASE_SECONDS * 2**attempt)
+    )
+
+
+async def stream_resilient_completion(
+    messages: List[Dict[str, str]],
+    model: str = DEFAULT_MODEL_NAME,
+    temperature: float = DEFAULT_TEMPERATURE,
+    engine: str = CHAT_ENGINE,
+    fallback_model: str = FALLBACK_MODEL_NAME,
+) -> AsyncIterator[str]:
+    """
+    Stream a chat completion, retrying and falling back to another model until a first token is received.
+
+    Args:
+        messages (list): The messages of the chat, as OpenAI messages.
+        model (str, optional): The name of the model. Defaults to DEFAULT_MODEL_NAME.
+        temperature (float, optional): The sampling temperature. Defaults to DEFAULT_TEMPERATURE.
+        engine (str, optional): The name of the engine. Defaults to CHAT_ENGINE.
+        fallback_model (str, optional): The model used when the model fails. Defaults to FALLBACK_MODEL_NAME.
+
+    Yields:
+        str: The tokens of the completion.
+
+    Raises:
+        LLMUnavailable: If every model failed or had its circuit breaker open.
+        openai.APIError: If a model rejected the request with a non-transient error.
+    """
+    models = [model] if fallback_model in (None, model) else [model, fallback_model]
+    last_error = None
+    for candidate in models:
+        breaker = get_breaker(candidate)
+        for attempt in range(LLM_MAX_ATTEMPTS):
+            if not breaker.allow():
+                break
+            if attempt:
+                llm_counters[f"{candidate}:retries"] += 1
+            stream = stream_completion(messages, candidate, temperature, engine)
+            try:
+                first_token = await asyncio.wait_for(
+                    anext(stream, None), LLM_FIRST_TOKEN_TIMEOUT_SECONDS
+                )
+            except Exception as exc:  # pylint: disable=broad-except
+                await stream.aclose()
+                if not is_retryable(exc):
+                    # The model answered, but the request was at fault: neither a success nor a failure
+                    breaker.release()
+                    raise
+                breaker.record_failure()
+                llm_counters[f"{candidate}:failures"] += 1
+                last_error = exc
+                log.warning(
+                    "Completion with %s failed (attempt %d): %r", candidate, attempt + 1, exc
+                )
+                # A model too slow to answer is not retried, the fallback gets the remaining time instead
+                if isinstance(exc, asyncio.TimeoutError):
+                    break
+                if attempt + 1 < LLM_MAX_ATTEMPTS:
+                    await asyncio.sleep(backoff_seconds(attempt))
+                continue
+
+            breaker.record_success()
+            if candidate != model:
+                llm_counters[f"{model}:fallbacks"] += 1
+            try:
+                if first_token is not None:
+                    yield first_token
+                    async for token in stream:
+                        yield token
+            finally:
+                await stream.aclose()
+            return
+
+    raise LLMUnavailable(f"No model could complete the chat: {last_error!r}")
+
+
+def get_llm_stats():
+    """Get the state of the circuit breaker and the call counters of every model used by this worker."""
+    stats = {}
+    for model, breaker in breakers.items():
+        stats[model] = {
+            **breaker.stats(),
+            "retries": llm_counters[f"{model}:retries"],
+            "failures": llm_counters[f"{model}:failures"],
+            "fallbacks": llm_counters[f"{model}:fallbacks"],
+        }
+    return {"fallback_model": FALLBACK_MODEL_NAME, "models": stats}
@@ -0,0 +1,105 @@
+"""
+This module implements a circuit breaker guarding calls to a failing dependency.
+
+The breaker counts consecutive failures. Once BREAKER_FAILURE_THRESHOLD calls in a row have failed it opens, and
+calls are refused without being attempted for BREAKER_OPEN_SECONDS, so callers fail fast or fall back instead of
+queueing behind a dependency that is down. Once that time has passed the breaker is half-open: a single trial call
+is let through, closing the breaker if it succeeds and opening it again if it fails. A call that tells nothing about
+the health of the dependency, such as a request it rejects as invalid, only frees the trial for another call. The
+state is kept per process.
+"""
+
+import os
+import threading
+import time
+
+BREAKER_FAILURE_THRESHOLD = int(os.getenv("BREAKER_FAILURE_THRESHOLD", "5"))
+BREAKER_OPEN_SECONDS = float(os.getenv("BREAKER_OPEN_SECONDS", "30"))
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """The state of the calls to one dependency."""
+
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: int = BREAKER_FAILURE_THRESHOLD,
+        open_seconds: float = BREAKER_OPEN_SECONDS,
+    ):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.open_seconds = open_seconds
+        self.consecutive_failures = 0
+        self.opened_at = None
+        # A trial call that never reports back (e.g. cancelled) is given up on after open_seconds
+        self.trial_started_at = None
+        self.times_opened = 0
+        self.rejected = 0
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        """Get the state of the breaker: closed, open or half_open."""
+        if self.opened_at is None:
+            return CLOSED
+        if time.monotonic() - self.opened_at < self.open_seconds:
+            return OPEN
+        return HALF_OPEN
+
+    def allow(self):
+        """
+        Check if a call may be attempted, reserving the trial call when the breaker is half-open.
+
+        Returns:
+            bool: True if the call may be attempted.
+        """
+        with self._lock:
+            state = self.state
+            if state == CLOSED:
+                return True
+            now = time.monotonic()
+            if state == HALF_OPEN and (
+                self.trial_started_at is None
+                or now - self.trial_started_at >= self.open_seconds
+            ):
+                self.trial_started_at = now
+                return True
+            self.rejected += 1
+            return False
+
+    def record_success(self):
+        """Record a successful call, closing the breaker."""
+        with self._lock:
+            self.consecutive_failures = 0
+            self.opened_at = None
+            self.trial_started_at = None
+
+    def release(self):
+        """Release the trial call of a half-open breaker without recording a success or a failure."""
+        with self._lock:
+            self.trial_started_at = None
+
+    def record_failure(self):
+        """Record a failed call, opening the breaker past the failure threshold or after a failed trial call."""
+        with self._lock:
+            self.consecutive_failures += 1
+            if self.trial_started_at is not None or (
+                self.opened_at is None
+                and self.consecutive_failures >= self.failure_threshold
+            ):
+                self.opened_at = time.monotonic()
+                self.times_opened += 1
+            self.trial_started_at = None
+
+    def stats(self):
+        """Get the state and counters of the breaker."""
+        return {
+            "state": self.state,
+            "consecutive_failures": self.consecutive_failures,
+            "times_opened": self.times_opened,
+            "rejected": self.rejected,
+        }
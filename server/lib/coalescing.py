@@ -0,0 +1,113 @@
+"""
+This module coalesces bursts of game updates into batches for the admin dashboard.
+
+When a level starts, hundreds of players join and complete levels within seconds, and each update used to be sent
+to every admin as its own message, re-rendering the dashboard every time. Admins connecting with batch=1 instead
+get the updates of each game in batch messages: the first update of a game opens a window of
+ADMIN_COALESCE_MILLISECONDS, and every update of that game published before the window closes is sent with it in a
+single message, in the order published. No update waits longer than the window, and a batch is sent early once it
+holds COALESCE_MAX_EVENTS updates, so the message rate per admin is bounded by the number of active games, not by the
+number of players. The batch is encoded once from the encoded updates and shared by every admin.
+"""
+
+import asyncio
+import os
+from typing import Callable, Dict, List
+
+from .serialization import EncodedPayload, dumps
+
+# Set to 0 to send every update on its own, even to admins asking for batches
+ADMIN_COALESCE_MILLISECONDS = int(os.getenv("ADMIN_COALESCE_MILLISECONDS", "150"))
+COALESCE_MAX_EVENTS = 500
+
+
+def batch_payload(game_key: str, events: List[bytes]):
+    """
+    Build the batch message of the updates of a game from their JSON encodings, without decoding them.
+
+    Args:
+        game_key (str): The join key of the game.
+        events (list): The JSON encoded updates, in order.
+
+    Returns:
+        EncodedPayload: The batch message.
+    """
+    return EncodedPayload(
+        json_bytes=b'{"type":"batch","game_key":'
+        + dumps(game_key)
+        + b',"events":['
+        + b",".join(events)
+        + b"]}"
+    )
+
+
+class EventCoalescer:
+    """The updates of each game waiting for their window to close."""
+
+    def __init__(
+        self,
+        deliver: Callable[[EncodedPayload], None],
+        window_seconds: float = ADMIN_COALESCE_MILLISECONDS / 1000,
+        max_events: int = COALESCE_MAX_EVENTS,
+    ):
+        self.window_seconds = window_seconds
+        self.max_events = max_events
+        self.events = 0
+        self.batches = 0
+        self.largest_batch = 0
+        self._deliver = deliver
+        self._pending: Dict[str, List[bytes]] = {}
+        self._timers: Dict[str, asyncio.TimerHandle] = {}
+
+    @property
+    def enabled(self):
+        """Whether updates are batched at all."""
+        return self.window_seconds > 0
+
+    def add(self, game_key: str, event: bytes):
+        """
+        Add an update to the batch of its game, opening the window of the game if it is the first.
+
+        Must be called from the event loop.
+
+        Args:
+            game_key (str): The join key of the game.
+            event (bytes): The JSON encoded update.
+        """
+        self.events += 1
+        pending = self._pending.get(game_key)
+        if pending is None:
+            pending = self._pending[game_key] = []
+            self._timers[game_key] = asyncio.get_running_loop().call_later(
+                self.window_seconds, self.flush, game_key
+            )
+        pending.append(event)
+        if len(pending) >= self.max_events:
+            self.flush(game_key)
+
+    def flush(self, game_key: str):
+        """Send the batch of a game now, closing its window."""
+        timer = self._timers.pop(game_key, None)
+        if timer is not None:
+            timer.cancel()
+        events = self._pending.pop(game_key, None)
+        if not events:
+            return
+        self.batches += 1
+        self.largest_batch = max(self.largest_batch, len(events))
+        self._deliver(batch_payload(game_key, events))
+
+    def flush_all(self):
+        """Send the batches of every game now."""
+        for game_key in list(self._pending):
+            self.flush(game_key)
+
+    def stats(self):
+        """Get the number of updates and batches coalesced, and the updates waiting."""
+        return {
+            "window_seconds": self.window_seconds,
+            "events": self.events,
+            "batches": self.batches,
+            "largest_batch": self.largest_batch,
+            "pending": sum(len(events) for events in self._pending.values()),
+        }
@@ -0,0 +1,264 @@
+"""
+This module publishes game state updates to a durable, replayable event log.
+
+Every game has a monotonically increasing version stored in Redis. Each update published for a game is a
+compact delta (player joined, level completed, level started, ...) tagged with the version it produces, so
+that clients holding a snapshot at version N can apply deltas N+1, N+2, ... in order and detect a gap when
+a version is skipped. Clients only need a full snapshot on first connect or after detecting a gap.
+
+Updates are appended to two capped Redis Streams. The global stream holds the updates of every game and is read by
+every worker, which delivers each update to the sockets it holds and can replay the updates after a given entry
+id to a reconnecting admin. The stream of each game holds the updates of that game with the version as entry id,
+so a reconnecting player can ask for every update after the version it has instead of a full snapshot.
+"""
+
+import os
+import time
+from typing import Dict, List
+
+from redis import Redis
+
+from .expiry import GAME_KEY_TTL_SECONDS
+from .serialization import dumps, loads
+
+GAME_EVENTS_STREAM = "game_events"
+GAME_EVENTS_CONSUMERS_KEY = "game_events:consumers"
+
+# Approximate number of updates kept in the global stream and in the stream of each game
+GAME_EVENTS_MAXLEN = int(os.getenv("GAME_EVENTS_MAXLEN", "10000"))
+GAME_STREAM_MAXLEN = int(os.getenv("GAME_STREAM_MAXLEN", "1000"))
+MAX_REPLAY_EVENTS = 1000
+# Consumers that have not reported for this long are dropped from the stats
+CONSUMER_STATS_TTL_SECONDS = 60
+
+# Reserves the next version of a game and appends the update tagged with it to both streams in one step, so the
+# updates of a game are appended in version order however many publishers race. The update is passed encoded
+# without its version, which is added as its last field.
+PUBLISH_SCRIPT = """
+local version = redis.call('INCR', KEYS[1])
+redis.call('EXPIRE', KEYS[1], ARGV[2])
+local data = string.sub(ARGV[1], 1, -2) .. ',"version":' .. version .. '}'
+redis.call('XADD', KEYS[2], 'MAXLEN', '~', ARGV[3], version .. '-0', 'data', data)
+redis.call('EXPIRE', KEYS[2], ARGV[2])
+redis.call('XADD', KEYS[3], 'MAXLEN', '~', ARGV[4], '*', 'data', data)
+return version
+"""
+
+
+def game_version_key(join_key: str):
+    """Get the Redis key holding the state version of a game."""
+    return f"game_version:{join_key}"
+
+
+def game_events_key(join_key: str):
+    """Get the Redis key of the stream holding the updates of a game."""
+    return f"game_events:{join_key}"
+
+
+def get_game_version(rds_client: Redis, join_key: str):
+    """
+    Get the current state version of a game.
+
+    Args:
+        rds_client (Redis): The Redis client.
+        join_key (str): The join key of the game.
+
+    Returns:
+        int: The current version, 0 if no update has been published yet.
+    """
+    version = rds_client.get(game_version_key(join_key))
+    return int(version) if version else 0
+
+
+def publish_event(rds_client: Redis, message: dict):
+    """
+    Tag a game update with the next version of its game and publish it.
+
+    Args:
+        rds_client (Redis): The Redis client.
+        message (dict): The update to publish. Must contain the game_key of the game.
+
+    Returns:
+        int: The version produced by the update.
+    """
+    return publish_events(rds_client, [message])[0]
+
+
+def publish_events(rds_client: Redis, messages: List[dict]):
+    """
+    Tag updates of several games with their next versions and publish them.
+
+    Every game gets a single update, and the updates are published with one pipeline, so updating many games
+    costs one round trip to Redis instead of one per game.
+
+    Args:
+        rds_client (Redis): The Redis client.
+        messages (list): The updates to publish, one per game. Each must contain the game_key of its game.
+
+    Returns:
+        list: The versions produced by the updates.
+    """
+    if not messages:
+        return []
+
+    publish = rds_client.register_script(PUBLISH_SCRIPT)
+    pipe = rds_client.pipeline()
+    for message in messages:
+        message.pop("version", None)
+        publish(
+            keys=[
+                game_version_key(message["game_key"]),
+                game_events_key(message["game_key"]),
+                GAME_EVENTS_STREAM,
+            ],
+            args=[dumps(message), GAME_KEY_TTL_SECONDS, GAME_STREAM_MAXLEN, GAME_EVENTS_MAXLEN],
+            client=pipe,
+        )
+    versions = pipe.execute()
+    for message, version in zip(messages, versions):
+        message["version"] = version
+    return versions
+
+
+def read_game_events(rds_client: Redis, join_key: str, after_version: int):
+    """
+    Read the updates of a game published after a version.
+
+    Args:
+        rds_client (Redis): The Redis client.
+        join_key (str): The join key of the game.
+        after_version (int): The last version the reader has applied.
+
+    Returns:
+        list: The updates in version order, or None if some of them are no longer in the stream.
+    """
+    current_version = get_game_version(rds_client, join_key)
+    if current_version - after_version > MAX_REPLAY_EVENTS:
+        return None
+    if current_version <= after_version:
+        return []
+
+    entries = rds_client.xrange(
+        game_events_key(join_key), min=f"{after_version + 1}-0", max=f"{current_version}-0"
+    )
+    # Versions are consecutive, so any trimmed or expired update leaves a hole
+    if len(entries) != current_version - after_version:
+        return None
+    return [loads(fields[b"data"]) for _, fields in entries]
+
+
+def read_events(rds_client: Redis, after_id: str):
+    """
+    Read the updates of every game appended to the global stream after an entry id.
+
+    Args:
+        rds_client (Redis): The Redis client.
+        after_id (str): The id of the last entry the reader has applied.
+
+    Returns:
+        list: The updates in order, each tagged with its event_id, or None if some of them are no longer in the
+            stream or there are more than MAX_REPLAY_EVENTS.
+    """
+    first = rds_client.xrange(GAME_EVENTS_STREAM, count=1)
+    if first and stream_id_key(first[0][0].decode()) > stream_id_key(after_id):
+        return None
+
+    entries = rds_client.xrange(
+        GAME_EVENTS_STREAM, min=f"({after_id}", count=MAX_REPLAY_EVENTS + 1
+    )
+    if len(entries) > MAX_REPLAY_EVENTS:
+        return None
+    return [
+        {**loads(fields[b"data"]), "event_id": entry_id.decode()}
+        for entry_id, fields in entries
+    ]
+
+
+def tag_event_id(data: bytes, event_id: str):
+    """Add the event_id of a stream entry to the JSON object of its update, without decoding it."""
+    return b'{"event_id":"' + event_id.encode() + b'",' + data[1:]
+
+
+def stream_id_key(entry_id: str):
+    """Get a sort key of a stream entry id."""
+    milliseconds, _, sequence = entry_id.partition("-")
+    return int(milliseconds), int(sequence or 0)
+
+
+def stream_lag_milliseconds(entry_id: str):
+    """Get the time since a stream entry was appended, in milliseconds."""
+    return max(int(time.time() * 1000) - stream_id_key(entry_id)[0], 0)
+
+
+def record_consumer_stats(rds_client: Redis, worker_id: str, stats: Dict[str, object]):
+    """
+    Record how far a worker has read the global stream.
+
+    Args:
+        rds_client (Redis): The Redis client.
+        worker_id (str): The ID of the worker.
+        stats (dict): The last entry id read by the worker, the number of entries read and the lag of the last one.
+    """
+    rds_client.hset(
+        GAME_EVENTS_CONSUMERS_KEY, worker_id, dumps({**stats, "reported_at": time.time()})
+    )
+
+
+def get_event_stats(rds_client: Redis):
+    """
+    Get the length of the event streams and how far behind each worker reading the global stream is.
+
+    Consumers that have stopped reporting are pruned.
+
+    Args:
+        rds_client (Redis): The Redis client.
+
+    Returns:
+        dict: The length and last entry id of the global stream, and the stats of each consumer.
+    """
+    pipe = rds_client.pipeline()
+    pipe.xlen(GAME_EVENTS_STREAM)
+    pipe.xrevrange(GAME_EVENTS_STREAM, count=1)
+    pipe.hgetall(GAME_EVENTS_CONSUMERS_KEY)
+    length, last, reports = pipe.execute()
+    last_id = last[0][0].decode() if last else None
+
+    consumers = {}
+    stale = []
+    for worker_id, report in reports.items():
+        stats = loads(report)
+        if time.time() - stats["reported_at"] > CONSUMER_STATS_TTL_SECONDS:
+            stale.append(worker_id)
+            continue
+        consumers[worker_id.decode()] = stats
+    if stale:
+        rds_client.hdel(GAME_EVENTS_CONSUMERS_KEY, *stale)
+
+    for stats in consumers.values():
+        if not stats.get("last_id") or not last_id:
+            stats["behind"] = 0
+            continue
+        behind = rds_client.xrange(
+            GAME_EVENTS_STREAM, min=f"({stats['last_id']}", count=MAX_REPLAY_EVENTS
+        )
+        stats["behind"] = len(behind)
+
+    return {"length": length, "last_id": last_id, "consumers": consumers}
+
+
+def get_game_event_stats(rds_client: Redis, join_key: str):
+    """
+    Get the length of the stream of a game and its current version.
+
+    Args:
+        rds_client (Redis): The Redis client.
+        join_key (str): The join key of the game.
+
+    Returns:
+        dict: The length of the stream and the version of the game.
+    """
+    pipe = rds_client.pipeline()
+    pipe.xlen(game_events_key(join_key))
+    pipe.get(game_version_key(join_key))
+    length, version = pipe.execute()
+    return {"length": length, "version": int(version) if version else 0}
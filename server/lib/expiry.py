@@ -0,0 +1,10 @@
+"""
+This module configures how long per-game data is kept in Redis.
+
+Every per-game key is written with this TTL and the TTL is refreshed on each write, so keys of games that are still
+played never expire while keys of abandoned games are eventually evicted even if the sweeper never archives them.
+"""
+
+import os
+
+GAME_KEY_TTL_SECONDS = int(os.getenv("GAME_KEY_TTL_SECONDS", str(3 * 24 * 60 * 60)))
@@ -0,0 +1,208 @@
+"""
+This module exports the results of games as CSV or newline-delimited JSON, one player row at a time.
+
+Games are read from Firestore EXPORT_PAGE_SIZE documents at a time, following a cursor, and only the fields the
+rows are made of are transferred: the level codes are never read. Each page is turned into rows and written out
+before the next one is requested, so the memory used by an export depends on the page size, not on the number of
+games and players exported.
+
+Run it from the server directory to export to a file instead of through the admin API:
+
+    python -m lib.export --format csv --status active > results.csv
+"""
+
+import argparse
+import csv
+import io
+import sys
+from typing import Iterable, Iterator, List, Optional
+
+from dotenv import load_dotenv
+from .firebase_helper import get_db
+from .game_controller import games_collection, games_query
+from .level import get_levels
+from .serialization import dumps
+
+EXPORT_PAGE_SIZE = 50
+# The fields read from each game, the level codes are left out
+EXPORT_FIELDS = ["join_key", "status", "created_at", "players"]
+PLAYER_COLUMNS = [
+    "join_key",
+    "game_status",
+    "game_created_at",
+    "player_id",
+    "name",
+    "player_status",
+    "joined_at",
+    "level",
+    "levels_completed",
+    "total_seconds",
+]
+
+CSV_MEDIA_TYPE = "text/csv; charset=utf-8"
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+EXPORT_FORMATS = {"csv": CSV_MEDIA_TYPE, "ndjson": NDJSON_MEDIA_TYPE}
+
+
+class InvalidExportFormat(Exception):
+    """Exception raised when an export format is not one of EXPORT_FORMATS."""
+
+
+def iter_games(
+    join_keys: Optional[List[str]] = None,
+    status: Optional[str] = None,
+    created_after: Optional[str] = None,
+    created_before: Optional[str] = None,
+    page_size: int = EXPORT_PAGE_SIZE,
+) -> Iterator[dict]:
+    """
+    Read the games to export one page at a time, newest first.
+
+    Args:
+        join_keys (list, optional): Only export these games. The filters are ignored when given.
+        status (str, optional): Only export games with this status.
+        created_after (str, optional): Only export games created at or after this ISO timestamp.
+        created_before (str, optional): Only export games created before this ISO timestamp.
+        page_size (int, optional): The number of games read at a time. Defaults to EXPORT_PAGE_SIZE.
+
+    Yields:
+        dict: The exported fields of each game.
+    """
+    if join_keys:
+        for start in range(0, len(join_keys), page_size):
+            refs = [
+                games_collection().document(join_key)
+                for join_key in join_keys[start : start + page_size]
+            ]
+            for game in get_db().get_all(refs, field_paths=EXPORT_FIELDS):
+                if game.exists:
+                    yield {**game.to_dict(), "join_key": game.id}
+        return
+
+    query = games_query(status, created_after, created_before)
+    query = query.select(EXPORT_FIELDS).limit(page_size)
+
+    last = None
+    while True:
+        page = query.start_after(last) if last is not None else query
+        count = 0
+        for game in page.stream():
+            count += 1
+            last = game
+            yield {**game.to_dict(), "join_key": game.id}
+        if count < page_size:
+            return
+
+
+def player_rows(games: Iterable[dict], levels: List[str]) -> Iterator[dict]:
+    """
+    Turn games into one row per player, the players of a game ranked by level then by total time.
+
+    Args:
+        games (iterable): The games, as yielded by iter_games.
+        levels (list): The levels given a column with the seconds each player took to complete them.
+
+    Yields:
+        dict: The row of each player.
+    """
+    for game in games:
+        players = game.get("players") or {}
+        ranked = sorted(
+            players.items(),
+            key=lambda item: (
+                -int(item[1].get("level", 1)),
+                sum((item[1].get("score") or {}).values()),
+            ),
+        )
+        for player_id, player in ranked:
+            score = player.get("score") or {}
+            row = {
+                "join_key": game["join_key"],
+                "game_status": game.get("status"),
+                "game_created_at": game.get("created_at"),
+                "player_id": player_id,
+                "name": player.get("name"),
+                "player_status": player.get("status"),
+                "joined_at": player.get("created_at"),
+                "level": player.get("level"),
+                "levels_completed": len(score),
+                "total_seconds": sum(score.values()),
+            }
+            # The score of a level is stored on reaching it, keyed by the level reached
+            for level in levels:
+                row[f"level_{level}_seconds"] = score.get(str(int(level) + 1))
+            yield row
+
+
+def export_columns(levels: List[str]):
+    """Get the columns of the exported rows."""
+    return PLAYER_COLUMNS + [f"level_{level}_seconds" for level in levels]
+
+
+def stream_csv(rows: Iterable[dict], columns: List[str]) -> Iterator[bytes]:
+    """Stream rows as CSV lines, starting with the header."""
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, columns, extrasaction="ignore")
+    writer.writeheader()
+    for row in rows:
+        writer.writerow(row)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+
+def stream_ndjson(rows: Iterable[dict]) -> Iterator[bytes]:
+    """Stream rows as newline-delimited JSON."""
+    for row in rows:
+        yield dumps(row) + b"\n"
+
+
+def stream_export(export_format: str, **filters) -> Iterator[bytes]:
+    """
+    Stream the results of games.
+
+    Args:
+        export_format (str): csv or ndjson.
+        **filters: The games to export, as taken by iter_games.
+
+    Returns:
+        iterator: The bytes of the export.
+
+    Raises:
+        InvalidExportFormat: If the format is not one of EXPORT_FORMATS.
+    """
+    if export_format not in EXPORT_FORMATS:
+        raise InvalidExportFormat(export_format)
+    levels = [level.level for level in get_levels()]
+    rows = player_rows(iter_games(**filters), levels)
+    if export_format == "csv":
+        return stream_csv(rows, export_columns(levels))
+    return stream_ndjson(rows)
+
+
+def main():
+    """Parse the arguments and write the export to stdout."""
+    parser = argparse.ArgumentParser(description="Export the results of games.")
+    parser.add_argument("--format", choices=sorted(EXPORT_FORMATS), default="csv")
+    parser.add_argument(
+        "--game", action="append", dest="join_keys", help="Join key, repeatable"
+    )
+    parser.add_argument("--status")
+    parser.add_argument("--created-after", help="ISO timestamp")
+    parser.add_argument("--created-before", help="ISO timestamp")
+    args = parser.parse_args()
+    load_dotenv()
+    for chunk in stream_export(
+        args.format,
+        join_keys=args.join_keys,
+        status=args.status,
+        created_after=args.created_after,
+        created_before=args.created_before,
+    ):
+        sys.stdout.buffer.write(chunk)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,16 +1,17 @@
 """
 This module provides functionality for setting up and initializing Firebase Firestore using credentials either from a
 local file or from an S3 bucket. It checks for the existence of the Firebase SDK configuration file locally; if not
-found, it attempts to download the file from a specified S3 bucket. Once the credentials are obtained, it initializes
-the Firebase Admin SDK and Firestore client for further operations.
+found, it attempts to download the file from a specified S3 bucket and keeps the downloaded copy for later starts.
+Initialization is lazy: nothing happens at import time, the Firebase Admin SDK and Firestore client are created on the
+first call to get_db and reused afterwards.
 """
 
 import os
 import logging
+import threading
 import firebase_admin
 from firebase_admin import credentials
 from firebase_admin import firestore
-import boto3
 
 # Current file path
 file_path = os.path.abspath(__file__)
@@ -19,21 +20,55 @@ file_loc = os.path.join(os.path.dirname(file_path), f"../{filename}")
 
 log = logging.getLogger(__name__)
 
-# Check if file exists if not
-if os.path.exists(file_loc):
-    cred = credentials.Certificate(file_loc)
-    log.info("Using local %s", filename)
-else:
+_db = None
+_db_lock = threading.Lock()
+
+
+def load_credentials():
+    """
+    Load the Firebase credentials, downloading them from S3 if there is no local copy.
+
+    Returns:
+        credentials.Certificate: The Firebase credentials.
+
+    Raises:
+        FileNotFoundError: If there is no local copy and PRIVATE_S3 is not set.
+    """
+    # Check if file exists if not
+    if os.path.exists(file_loc):
+        log.info("Using local %s", filename)
+        return credentials.Certificate(file_loc)
+
     # Check if s3_bucket exists
     bucket_name = os.getenv("PRIVATE_S3")
     if not bucket_name:
         raise FileNotFoundError(f"{filename} not found and PRIVATE_S3 not set")
+
+    # boto3 is slow to import and only needed when there is no local copy
+    import boto3  # pylint: disable=import-outside-toplevel
+
     s3_url = f"s3://{bucket_name}/{filename}"
     s3 = boto3.client("s3")
     s3.download_file(bucket_name, filename, file_loc)
-    cred = credentials.Certificate(file_loc)
     log.info("Using %s", s3_url)
+    return credentials.Certificate(file_loc)
+
 
-firebase_admin.initialize_app(cred)
+def get_db():
+    """
+    Get the Firestore client, initializing Firebase on first use.
 
-db = firestore.client()
+    Returns:
+        firestore.Client: The Firestore client.
+    """
+    global _db  # pylint: disable=global-statement
+    if _db is None:
+        with _db_lock:
+            if _db is None:
+                # A previous attempt may have initialized the app before failing to create the client
+                try:
+                    app = firebase_admin.get_app()
+                except ValueError:
+                    app = firebase_admin.initialize_app(load_credentials())
+                _db = firestore.client(app)
+    return _db
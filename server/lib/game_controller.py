@@ -5,26 +5,41 @@ The game controller module provides functions for managing game data and operati
 such as adding players, updating player levels, starting games, and retrieving game information.
 """
 
-import random
 from datetime import datetime, UTC
 import uuid
 import logging
 import json
+from typing import Callable, List
 
+from firebase_admin import firestore
+from google.api_core.exceptions import Conflict
 from redis import Redis
-from .level import LEVELS, generate_code_based_on_level_type
+from .expiry import GAME_KEY_TTL_SECONDS
+from .join_keys import (
+    claim_join_key,
+    claim_join_keys,
+    fill_join_key_pool,
+    release_join_keys,
+)
+from .level import generate_code_based_on_level_type, get_levels
+from .singleflight import SingleFlight, load_once
+from .tracing import traced
 
-from .firebase_helper import db
+from .firebase_helper import get_db
 
 
 log = logging.getLogger(__name__)
 
-GAMES_COLLECTION = db.collection("games")
 
+def games_collection():
+    """Get the Firestore collection holding the games."""
+    return get_db().collection("games")
 
+
+@traced
 def get_player_info(join_key: str, player_id: str, active_only: bool = False):
     """Get player info from a game."""
-    game = GAMES_COLLECTION.document(join_key).get()
+    game = games_collection().document(join_key).get()
     if not game.exists:
         return None
     game_data = game.to_dict()
@@ -39,14 +54,128 @@ def get_player_info(join_key: str, player_id: str, active_only: bool = False):
     return player
 
 
+@traced
 def get_all_games():
     """Get all games."""
-    games = GAMES_COLLECTION.stream()
+    games = games_collection().stream()
     all_games = [game.to_dict() for game in games]
 
     return all_games
 
 
+GAME_SUMMARY_FIELDS = ["join_key", "status", "created_at", "player_count", "current_level"]
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+
+def summarize_game(game_data: dict):
+    """
+    Get the summary of a game from its document.
+
+    The summary fields of games created before they existed are None until the sweeper backfills them.
+    """
+    return {field: game_data.get(field) for field in GAME_SUMMARY_FIELDS}
+
+
+class InvalidCursor(Exception):
+    """Exception raised when a pagination cursor does not match any game."""
+
+
+@traced
+def get_game(join_key: str):
+    """
+    Get the full document of a game.
+
+    Args:
+        join_key (str): The join key of the game.
+
+    Returns:
+        dict: The game document.
+
+    Raises:
+        GameNotFound: If the game with the given join key does not exist.
+    """
+    game = games_collection().document(join_key).get()
+    if not game.exists:
+        raise GameNotFound
+    return game.to_dict()
+
+
+def games_query(
+    status: str | None = None,
+    created_after: str | None = None,
+    created_before: str | None = None,
+):
+    """
+    Build the query of the games matching the filters, newest first.
+
+    Filtering by status needs the composite index declared in firestore.indexes.json.
+
+    Args:
+        status (str, optional): Only match games with this status.
+        created_after (str, optional): Only match games created at or after this ISO timestamp.
+        created_before (str, optional): Only match games created before this ISO timestamp.
+
+    Returns:
+        firestore.Query: The query.
+    """
+    query = games_collection()
+    if status:
+        query = query.where(filter=firestore.FieldFilter("status", "==", status))
+    if created_after:
+        query = query.where(
+            filter=firestore.FieldFilter("created_at", ">=", created_after)
+        )
+    if created_before:
+        query = query.where(
+            filter=firestore.FieldFilter("created_at", "<", created_before)
+        )
+    return query.order_by("created_at", direction=firestore.Query.DESCENDING)
+
+
+@traced
+def list_games(
+    limit: int = DEFAULT_PAGE_SIZE,
+    cursor: str | None = None,
+    status: str | None = None,
+    created_after: str | None = None,
+    created_before: str | None = None,
+):
+    """
+    List game summaries, newest first, one page at a time.
+
+    Only the summary fields are read from Firestore, the players and level codes are never transferred.
+
+    Args:
+        limit (int, optional): The maximum number of games to return. Defaults to DEFAULT_PAGE_SIZE.
+        cursor (str, optional): The next_cursor returned with the previous page.
+        status (str, optional): Only list games with this status.
+        created_after (str, optional): Only list games created at or after this ISO timestamp.
+        created_before (str, optional): Only list games created before this ISO timestamp.
+
+    Returns:
+        dict: A dictionary containing the game summaries and the cursor of the next page, None on the last page.
+
+    Raises:
+        InvalidCursor: If the cursor does not match any game.
+    """
+    limit = min(max(int(limit), 1), MAX_PAGE_SIZE)
+    query = games_query(status, created_after, created_before)
+    query = query.select(GAME_SUMMARY_FIELDS).limit(limit + 1)
+    if cursor:
+        cursor_game = games_collection().document(cursor).get()
+        if not cursor_game.exists:
+            raise InvalidCursor
+        query = query.start_after(cursor_game)
+
+    games = list(query.stream())
+    next_cursor = games[limit - 1].id if len(games) > limit else None
+    return {
+        "games": [summarize_game(game.to_dict()) for game in games[:limit]],
+        "next_cursor": next_cursor,
+    }
+
+
 class GameNotFound(Exception):
     """Exception raised when a game is not found."""
 
@@ -59,6 +188,7 @@ class PlayerAlreadyExists(Exception):
     """Exception raised when a player already exists."""
 
 
+@traced
 def add_player_through_join_key(join_key: str, name: str, active_only: bool = False):
     """
     Add a player to a game using the join key.
@@ -75,22 +205,7 @@ def add_player_through_join_key(join_key: str, name: str, active_only: bool = Fa
         GameNotFound: If the game with the given join key does not exist.
         PlayerAlreadyExists: If a player with the same name already exists in the game.
     """
-    # check if game exists
-    game = GAMES_COLLECTION.document(join_key).get()
-    if not game.exists:
-        raise GameNotFound
-
-    # check if player already exists
-    game_data = game.to_dict()
-    if active_only and game_data["status"] != "active":
-        raise GameNotFound
-
-    players = game_data["players"]
-    for player_id, player in players.items():
-        if player["name"] == name:
-            raise PlayerAlreadyExists
-
-    # add player
+    doc_ref = games_collection().document(join_key)
     player_id = uuid.uuid4().hex
     player_data = {
         "name": name,
@@ -99,25 +214,60 @@ def add_player_through_join_key(join_key: str, name: str, active_only: bool = Fa
         "status": "active",  # active, banned
         "score": {},
     }
-    players[player_id] = player_data
-    GAMES_COLLECTION.document(join_key).update({"players": players})
+
+    # Read and write in one transaction so that concurrent joins handled by
+    # other workers can neither be overwritten nor take the same name
+    @firestore.transactional
+    def add_player(transaction):
+        # check if game exists
+        game = doc_ref.get(transaction=transaction)
+        if not game.exists:
+            raise GameNotFound
+
+        # check if player already exists
+        game_data = game.to_dict()
+        if active_only and game_data["status"] != "active":
+            raise GameNotFound
+
+        for player in game_data["players"].values():
+            if player["name"] == name:
+                raise PlayerAlreadyExists
+
+        # add player
+        transaction.update(
+            doc_ref,
+            {
+                player_field(player_id): player_data,
+                "player_count": len(game_data["players"]) + 1,
+                "last_activity_at": player_data["created_at"],
+            },
+        )
+
+    add_player(get_db().transaction())
     return join_key, player_id
 
 
-def generate_4_digit_code():
+def player_field(player_id: str, *path: str):
     """
-    Generate a random 4-digit code.
+    Get the Firestore field path of a player, or of a field of a player.
 
-    Returns:
-        str: The generated 4-digit code.
+    Writing single fields instead of the whole players map keeps concurrent
+    updates to different players from overwriting each other.
     """
-    return str(random.randint(1000, 9999))
+    return firestore.FieldPath("players", player_id, *path).to_api_repr()
 
 
 class FailedToGenerateUniqueJoinKey(Exception):
     """Exception raised when a unique join key could not be generated."""
 
 
+MAX_JOIN_KEY_CLAIMS = 5
+MAX_BULK_GAMES = 100
+# Firestore rejects batches of more than 500 writes
+FIRESTORE_BATCH_LIMIT = 500
+
+
+@traced
 def get_game_info(join_key: str):
     """
     Get information about a game.
@@ -131,7 +281,9 @@ def get_game_info(join_key: str):
     Raises:
         GameNotFound: If the game with the given join key does not exist.
     """
-    games = GAMES_COLLECTION.document(join_key).get()
+    games = games_collection().document(join_key).get()
+    if not games.exists:
+        raise GameNotFound
     games_dict = games.to_dict()
     info = {
         "join_key": join_key,
@@ -150,38 +302,66 @@ def get_game_info(join_key: str):
     return info
 
 
+@traced
 def update_player_level(join_key: str, player_id: str, level: int, score: int):
     """
     Update the level and score of a player in a game.
 
+    The update is applied in a transaction and only if the player has not
+    already reached the level, so a guess submitted twice (possibly to two
+    different workers) completes the level once.
+
     Args:
         join_key (str): The join key of the game.
         player_id (str): The ID of the player.
         level (int): The new level of the player.
         score (int): The score achieved by the player.
 
+    Returns:
+        bool: True if the player was moved to the level, False if they had already reached it.
+
     Raises:
         GameNotFound: If the game with the given join key does not exist.
         PlayerNotFound: If the player with the given ID does not exist in the game.
     """
-    game = GAMES_COLLECTION.document(join_key).get()
-    if not game.exists:
-        raise GameNotFound
+    doc_ref = games_collection().document(join_key)
 
-    game_data = game.to_dict()
-    players = game_data["players"]
-    if player_id not in players:
-        raise PlayerNotFound
+    @firestore.transactional
+    def update_level(transaction):
+        game = doc_ref.get(transaction=transaction)
+        if not game.exists:
+            raise GameNotFound
+
+        game_data = game.to_dict()
+        players = game_data["players"]
+        if player_id not in players:
+            raise PlayerNotFound
+
+        if int(players[player_id]["level"]) >= int(level):
+            return False
 
-    players[player_id]["level"] = level
-    players[player_id]["score"][str(level)] = score
-    GAMES_COLLECTION.document(join_key).update({"players": players})
+        transaction.update(
+            doc_ref,
+            {
+                player_field(player_id, "level"): level,
+                player_field(player_id, "score", str(level)): score,
+                "last_activity_at": datetime.now(UTC).isoformat(),
+            },
+        )
+        return True
 
+    return update_level(get_db().transaction())
 
+
+@traced
 def create_new_game(rds_client: Redis):
     """
     Create a new game.
 
+    The join key is claimed from the pool of free join keys. The document is
+    created with a create (not a set), so a key that is somehow still in use
+    is detected by the write itself and another key is claimed.
+
     Args:
         rds_client (Redis): The Redis client.
 
@@ -189,42 +369,157 @@ def create_new_game(rds_client: Redis):
         str: The join key of the newly created game.
 
     Raises:
-        FailedToGenerateUniqueJoinKey: If a unique join key could not be generated after multiple retries.
-    """
-    join_key = generate_4_digit_code()
-    retry = 0
-    while check_if_document_exists(join_key):
-        join_key = generate_4_digit_code()
-        retry += 1
-        if retry > 10:
+        FailedToGenerateUniqueJoinKey: If the pool of free join keys is exhausted.
+    """
+    for _ in range(MAX_JOIN_KEY_CLAIMS):
+        join_key = claim_join_key(rds_client)
+        if join_key is None and fill_join_key_pool(
+            rds_client, list_join_keys, wait=True
+        ):
+            join_key = claim_join_key(rds_client)
+        if join_key is None:
             raise FailedToGenerateUniqueJoinKey
 
+        game_data = new_game_data(join_key)
+        try:
+            games_collection().document(join_key).create(game_data)
+        except Conflict:
+            log.warning("Join key %s from the pool is already in use", join_key)
+            continue
+
+        rds_client.set(
+            join_key, json.dumps(game_data["levels"]), ex=GAME_KEY_TTL_SECONDS
+        )
+        return join_key
+
+    raise FailedToGenerateUniqueJoinKey
+
+
+@traced
+def create_new_games(rds_client: Redis, count: int):
+    """
+    Create several new games at once.
+
+    The join keys are claimed from the pool with a single SPOP, the documents
+    are created with batched commits and the level codes are cached with a
+    single pipeline.
+
+    Args:
+        rds_client (Redis): The Redis client.
+        count (int): The number of games to create.
+
+    Returns:
+        list: The join keys of the newly created games.
+
+    Raises:
+        ValueError: If count is not between 1 and MAX_BULK_GAMES.
+        FailedToGenerateUniqueJoinKey: If the pool of free join keys is exhausted.
+    """
+    if not 1 <= count <= MAX_BULK_GAMES:
+        raise ValueError(f"Count must be between 1 and {MAX_BULK_GAMES}")
+
+    join_keys = claim_join_keys(rds_client, count)
+    if len(join_keys) < count and fill_join_key_pool(
+        rds_client, list_join_keys, wait=True
+    ):
+        join_keys += claim_join_keys(rds_client, count - len(join_keys))
+    if len(join_keys) < count:
+        release_join_keys(rds_client, join_keys)
+        raise FailedToGenerateUniqueJoinKey
+
+    games = {join_key: new_game_data(join_key) for join_key in join_keys}
+    created = []
+    for chunk in chunked(join_keys, FIRESTORE_BATCH_LIMIT):
+        batch = get_db().batch()
+        for join_key in chunk:
+            batch.create(games_collection().document(join_key), games[join_key])
+        try:
+            batch.commit()
+            created += chunk
+            continue
+        except Conflict:
+            log.warning("Join keys from the pool are already in use, creating games one by one")
+
+        # A batch is all or nothing, so find the keys in use by creating the games one at a time
+        for join_key in chunk:
+            try:
+                games_collection().document(join_key).create(games[join_key])
+            except Conflict:
+                log.warning("Join key %s from the pool is already in use", join_key)
+                continue
+            created.append(join_key)
+
+    pipe = rds_client.pipeline()
+    for join_key in created:
+        pipe.set(
+            join_key, json.dumps(games[join_key]["levels"]), ex=GAME_KEY_TTL_SECONDS
+        )
+    pipe.execute()
+
+    # Replace the games whose join keys turned out to be in use
+    while len(created) < count:
+        created.append(create_new_game(rds_client))
+    return created
+
+
+def new_game_data(join_key: str):
+    """
+    Build the document of a new game with fresh level codes.
+
+    Args:
+        join_key (str): The join key of the game.
+
+    Returns:
+        dict: The game document.
+    """
     created_at = datetime.now(UTC).isoformat()
-    game_data = {
+    return {
         "join_key": join_key,
         "players": {},
         "status": "active",
         "created_at": created_at,
+        "last_activity_at": created_at,
+        "player_count": 0,
+        "current_level": None,
         "levels": {
-            level["level"]: {
-                "code": generate_code_based_on_level_type(level["level_type"]),
+            level.level: {
+                "code": generate_code_based_on_level_type(level.level_type),
                 "started_at": None,
                 "started": False,
             }
-            for level in LEVELS
+            for level in get_levels()
         },
     }
 
-    GAMES_COLLECTION.document(join_key).set(game_data)
-    rds_client.set(join_key, json.dumps(game_data["levels"]))
 
-    return join_key
+@traced
+def list_join_keys():
+    """
+    List the join keys of every game without reading the game documents.
+
+    Returns:
+        list: The join keys.
+    """
+    return [doc_ref.id for doc_ref in games_collection().list_documents()]
+
 
+level_cache_flight = SingleFlight()
 
+
+def level_cache_lock_key(join_key: str):
+    """Get the Redis key of the lock held while the levels of a game are loaded into the cache."""
+    return f"level_cache_lock:{join_key}"
+
+
+@traced
 def get_level_code(join_key: str, level: str, rds_client: Redis):
     """
     Get the code for a specific level in a game.
 
+    The levels of the game are cached in Redis. On a cache miss, a single
+    caller per process and a single process per game read them from
+    Firestore, while the other callers wait for the cache to be filled.
+
     Args:
         join_key (str): The join key of the game.
         level (str): The level for which to get the code.
@@ -238,21 +533,88 @@ def get_level_code(join_key: str, level: str, rds_client: Redis):
         ValueError: If the specified level is not found in the game.
     """
     # check if exists in redis
-    level_code = rds_client.get(join_key)
-    if level_code:
-        return json.loads(level_code)[level]["code"]
-    # if not then fetch from firestore and update the redis cache
-    game = GAMES_COLLECTION.document(join_key).get()
-    if not game.exists:
-        raise GameNotFound
-    game_data = game.to_dict()
-    levels = game_data["levels"]
+    cached_levels = rds_client.get(join_key)
+    if not cached_levels:
+        # if not then fetch from firestore and update the redis cache
+        cached_levels = level_cache_flight.do(
+            join_key,
+            lambda: load_once(
+                rds_client,
+                join_key,
+                level_cache_lock_key(join_key),
+                lambda: json.dumps(load_levels(join_key)),
+                GAME_KEY_TTL_SECONDS,
+            ),
+        )
+    levels = json.loads(cached_levels)
     if level not in levels:
         raise ValueError("Level not found")
-    rds_client.set(join_key, json.dumps(levels))
     return levels[level]["code"]
 
 
+@traced
+def load_levels(join_key: str):
+    """
+    Read the levels of a game from Firestore.
+
+    Args:
+        join_key (str): The join key of the game.
+
+    Returns:
+        dict: The levels of the game.
+
+    Raises:
+        GameNotFound: If the game with the given join key does not exist.
+    """
+    game = games_collection().document(join_key).get()
+    if not game.exists:
+        raise GameNotFound
+    return game.to_dict()["levels"]
+
+
+LEVEL_CACHE_WARM_LOCK_KEY = "level_cache:warming"
+LEVEL_CACHE_WARM_INTERVAL_SECONDS = 60
+# The number of games whose levels are written to Redis per pipeline round trip
+LEVEL_CACHE_WARM_PIPELINE_SIZE = 500
+
+
+@traced
+def warm_level_cache(rds_client: Redis):
+    """
+    Load the levels of every active game into the Redis cache, skipping the games already cached.
+
+    Workers starting together warm the cache once, the others skip it.
+
+    Args:
+        rds_client (Redis): The Redis client.
+
+    Returns:
+        int: The number of active games, or None if another worker warmed the cache recently.
+    """
+    if not rds_client.set(
+        LEVEL_CACHE_WARM_LOCK_KEY, 1, nx=True, ex=LEVEL_CACHE_WARM_INTERVAL_SECONDS
+    ):
+        return None
+
+    games = (
+        games_collection()
+        .where(filter=firestore.FieldFilter("status", "==", "active"))
+        .select(["levels"])
+        .stream()
+    )
+    pipe = rds_client.pipeline(transaction=False)
+    count = 0
+    for count, game in enumerate(games, start=1):
+        levels = game.to_dict().get("levels")
+        if levels:
+            pipe.set(game.id, json.dumps(levels), ex=GAME_KEY_TTL_SECONDS, nx=True)
+        if count % LEVEL_CACHE_WARM_PIPELINE_SIZE == 0:
+            pipe.execute()
+    pipe.execute()
+    return count
+
+
+@traced
 def start_game(game_key: str, level: str):
     """
     Start a game at a specific level.
@@ -268,7 +630,7 @@ def start_game(game_key: str, level: str):
         GameNotFound: If the game with the given join key does not exist.
         ValueError: If the specified level is not found in the game.
     """
-    game = GAMES_COLLECTION.document(game_key).get()
+    game = games_collection().document(game_key).get()
     if not game.exists:
         raise GameNotFound
 
@@ -280,10 +642,13 @@ def start_game(game_key: str, level: str):
     started_at = datetime.now(UTC).isoformat()
     levels[level]["started_at"] = started_at
     levels[level]["started"] = True
-    GAMES_COLLECTION.document(game_key).update({"levels": levels})
+    games_collection().document(game_key).update(
+        {"levels": levels, "current_level": level, "last_activity_at": started_at}
+    )
     return started_at
 
 
+@traced
 def delete_game(game_key: str):
     """
     Delete a game.
@@ -291,10 +656,11 @@ def delete_game(game_key: str):
     Args:
         game_key (str): The join key of the game.
     """
-    doc_ref = GAMES_COLLECTION.document(game_key)
+    doc_ref = games_collection().document(game_key)
     doc_ref.delete()
 
 
+@traced
 def deactivate_game(game_key: str):
     """
     Deactivate a game.
@@ -305,11 +671,126 @@ def deactivate_game(game_key: str):
     Returns:
         bool: True if the game was successfully deactivated, False otherwise.
     """
-    doc_ref = GAMES_COLLECTION.document(game_key)
-    doc_ref.update({"status": "deactive"})
+    doc_ref = games_collection().document(game_key)
+    doc_ref.update(
+        {"status": "deactive", "last_activity_at": datetime.now(UTC).isoformat()}
+    )
     return True
 
 
+@traced
+def start_games(game_keys: List[str], level: str):
+    """
+    Start the same level in several games at once.
+
+    Args:
+        game_keys (list): The join keys of the games.
+        level (str): The level to start.
+
+    Returns:
+        dict: A dictionary containing the timestamp when the level was started, the join keys of the games it was
+            started in and the join keys of the games that do not exist.
+
+    Raises:
+        ValueError: If the specified level does not exist.
+    """
+    if level not in get_levels():
+        raise ValueError("Level not found")
+
+    started_at = datetime.now(UTC).isoformat()
+    fields = {
+        level_field(level, "started_at"): started_at,
+        level_field(level, "started"): True,
+        "current_level": level,
+        "last_activity_at": started_at,
+    }
+    started, not_found = write_games_in_batches(
+        game_keys, lambda batch, doc_ref: batch.update(doc_ref, fields)
+    )
+    return {"started_at": started_at, "game_keys": started, "not_found": not_found}
+
+
+@traced
+def deactivate_games(game_keys: List[str]):
+    """
+    Deactivate several games at once.
+
+    Args:
+        game_keys (list): The join keys of the games.
+
+    Returns:
+        dict: A dictionary containing the join keys of the deactivated games and of the games that do not exist.
+    """
+    fields = {"status": "deactive", "last_activity_at": datetime.now(UTC).isoformat()}
+    deactivated, not_found = write_games_in_batches(
+        game_keys, lambda batch, doc_ref: batch.update(doc_ref, fields)
+    )
+    return {"game_keys": deactivated, "not_found": not_found}
+
+
+@traced
+def delete_games(game_keys: List[str]):
+    """
+    Delete several games at once.
+
+    Args:
+        game_keys (list): The join keys of the games.
+
+    Returns:
+        dict: A dictionary containing the join keys of the deleted games and of the games that do not exist.
+    """
+    deleted, not_found = write_games_in_batches(
+        game_keys, lambda batch, doc_ref: batch.delete(doc_ref)
+    )
+    return {"game_keys": deleted, "not_found": not_found}
+
+
+def write_games_in_batches(
+    game_keys: List[str], write: Callable[[firestore.WriteBatch, object], object]
+):
+    """
+    Apply a write to every existing game, committing up to FIRESTORE_BATCH_LIMIT games per batch.
+
+    Each chunk of games costs one read of their status and one commit, however many games it holds.
+
+    Args:
+        game_keys (list): The join keys of the games.
+        write (callable): Adds the write of a game to a batch, called with the batch and the game document
+            reference.
+
+    Returns:
+        tuple: A tuple containing the join keys of the games written and of the games that do not exist.
+    """
+    written, not_found = [], []
+    for chunk in chunked(list(dict.fromkeys(game_keys)), FIRESTORE_BATCH_LIMIT):
+        doc_refs = [games_collection().document(game_key) for game_key in chunk]
+        existing = {
+            game.id
+            for game in get_db().get_all(doc_refs, field_paths=["status"])
+            if game.exists
+        }
+        batch = get_db().batch()
+        for doc_ref in doc_refs:
+            if doc_ref.id not in existing:
+                not_found.append(doc_ref.id)
+                continue
+            write(batch, doc_ref)
+            written.append(doc_ref.id)
+        if existing:
+            batch.commit()
+    return written, not_found
+
+
+def chunked(items: list, size: int):
+    """Split a list into consecutive chunks of at most size items."""
+    return [items[start : start + size] for start in range(0, len(items), size)]
+
+
+def level_field(level: str, *path: str):
+    """Get the Firestore field path of a level of a game, or of a field nested in it."""
+    return firestore.FieldPath("levels", level, *path).to_api_repr()
+
+
 def check_if_document_exists(join_key: str):
     """
     Check if a game document exists in the database.
@@ -320,5 +801,5 @@ def check_if_document_exists(join_key: str):
     Returns:
         bool: True if the game document exists, False otherwise.
     """
-    game_ref = GAMES_COLLECTION.document(join_key).get()
+    game_ref = games_collection().document(join_key).get()
     return game_ref.exists
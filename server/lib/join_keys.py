@@ -0,0 +1,205 @@
+"""
+This module manages the pool of free join keys.
+
+Every join key of the configured length that is not used by a game lives in a Redis set. Creating a game claims a
+key with a single SPOP, and deleting or archiving a game puts its key back, so game creation costs the same no
+matter how many games exist. The pool is filled once, from the keys not used by existing games, and its size is
+reported so that exhaustion shows up in metrics before creation starts failing.
+"""
+
+import logging
+import os
+import time
+from typing import Callable, Iterable
+
+from redis import Redis
+
+log = logging.getLogger(__name__)
+
+# The pool holds every free key, so keep the length small (6 digits is under 1M keys)
+JOIN_KEY_LENGTH = int(os.getenv("JOIN_KEY_LENGTH", "4"))
+# Warn when fewer than this fraction of the join keys are free
+JOIN_KEY_POOL_LOW_WATERMARK = float(os.getenv("JOIN_KEY_POOL_LOW_WATERMARK", "0.1"))
+
+POOL_FILL_CHUNK_SIZE = 10_000
+POOL_FILL_TIMEOUT_SECONDS = 60
+
+
+def join_key_pool_key(length: int = JOIN_KEY_LENGTH):
+    """Get the Redis key of the set of free join keys of a length."""
+    return f"join_key_pool:{length}"
+
+
+def join_key_pool_ready_key(length: int = JOIN_KEY_LENGTH):
+    """Get the Redis key marking the pool of join keys of a length as filled."""
+    return f"join_key_pool:{length}:ready"
+
+
+def join_key_capacity(length: int = JOIN_KEY_LENGTH):
+    """Get the number of join keys of a length, which never start with a zero."""
+    return 9 * 10 ** (length - 1)
+
+
+def all_join_keys(length: int = JOIN_KEY_LENGTH):
+    """Iterate over every join key of a length."""
+    return (str(key) for key in range(10 ** (length - 1), 10**length))
+
+
+def fill_join_key_pool(
+    rds_client: Redis,
+    used_keys: Callable[[], Iterable[str]],
+    length: int = JOIN_KEY_LENGTH,
+    wait: bool = False,
+):
+    """
+    Fill the pool of free join keys unless it is already filled.
+
+    Args:
+        rds_client (Redis): The Redis client.
+        used_keys (callable): Returns the join keys used by existing games.
+        length (int, optional): The length of the join keys. Defaults to JOIN_KEY_LENGTH.
+        wait (bool, optional): If True and another worker is filling the pool, wait until it is done.
+            Defaults to False.
+
+    Returns:
+        bool: True if the pool was filled by this call or, when waiting, by another worker.
+    """
+    if rds_client.exists(join_key_pool_ready_key(length)):
+        return False
+
+    # Only one worker fills the pool, the others keep using what is there
+    lock_key = f"{join_key_pool_key(length)}:lock"
+    if not rds_client.set(lock_key, 1, nx=True, ex=POOL_FILL_TIMEOUT_SECONDS):
+        if not wait:
+            return False
+        deadline = time.monotonic() + POOL_FILL_TIMEOUT_SECONDS
+        while rds_client.exists(lock_key) and time.monotonic() < deadline:
+            time.sleep(0.1)
+        return bool(rds_client.exists(join_key_pool_ready_key(length)))
+    try:
+        used = set(used_keys())
+        pipe = rds_client.pipeline(transaction=False)
+        pipe.delete(join_key_pool_key(length))
+        chunk = []
+        for key in all_join_keys(length):
+            if key in used:
+                continue
+            chunk.append(key)
+            if len(chunk) == POOL_FILL_CHUNK_SIZE:
+                pipe.sadd(join_key_pool_key(length), *chunk)
+                chunk = []
+        if chunk:
+            pipe.sadd(join_key_pool_key(length), *chunk)
+        pipe.set(join_key_pool_ready_key(length), 1)
+        pipe.execute()
+    finally:
+        rds_client.delete(lock_key)
+
+    log.info("Filled pool of %d-digit join keys, %d in use", length, len(used))
+    return True
+
+
+def claim_join_key(rds_client: Redis, length: int = JOIN_KEY_LENGTH):
+    """
+    Atomically take a free join key out of the pool.
+
+    Args:
+        rds_client (Redis): The Redis client.
+        length (int, optional): The length of the join key. Defaults to JOIN_KEY_LENGTH.
+
+    Returns:
+        str: The join key, or None if the pool is empty.
+    """
+    pipe = rds_client.pipeline()
+    pipe.spop(join_key_pool_key(length))
+    pipe.scard(join_key_pool_key(length))
+    join_key, available = pipe.execute()
+    if available < join_key_capacity(length) * JOIN_KEY_POOL_LOW_WATERMARK:
+        log.warning("Only %d %d-digit join keys left", available, length)
+    return join_key.decode() if join_key else None
+
+
+def claim_join_keys(rds_client: Redis, count: int, length: int = JOIN_KEY_LENGTH):
+    """
+    Atomically take several free join keys out of the pool.
+
+    Args:
+        rds_client (Redis): The Redis client.
+        count (int): The number of join keys to take.
+        length (int, optional): The length of the join keys. Defaults to JOIN_KEY_LENGTH.
+
+    Returns:
+        list: The join keys, fewer than count if the pool runs out.
+    """
+    pipe = rds_client.pipeline()
+    pipe.spop(join_key_pool_key(length), count)
+    pipe.scard(join_key_pool_key(length))
+    join_keys, available = pipe.execute()
+    if available < join_key_capacity(length) * JOIN_KEY_POOL_LOW_WATERMARK:
+        log.warning("Only %d %d-digit join keys left", available, length)
+    return [join_key.decode() for join_key in join_keys or []]
+
+
+def release_join_key(rds_client: Redis, join_key: str):
+    """
+    Put the join key of a deleted or archived game back into the pool.
+
+    Args:
+        rds_client (Redis): The Redis client.
+        join_key (str): The join key to release.
+    """
+    release_join_keys(rds_client, [join_key])
+
+
+def release_join_keys(rds_client: Redis, join_keys: Iterable[str]):
+    """
+    Put the join keys of deleted or archived games back into the pool.
+
+    Keys that could not have come from a pool are ignored, as are keys whose pool is not filled yet (the fill
+    will find them free anyway).
+
+    Args:
+        rds_client (Redis): The Redis client.
+        join_keys (iterable): The join keys to release.
+    """
+    by_length = {}
+    for join_key in join_keys:
+        if join_key.isdigit() and not join_key.startswith("0"):
+            by_length.setdefault(len(join_key), []).append(join_key)
+    if not by_length:
+        return
+
+    lengths = list(by_length)
+    pipe = rds_client.pipeline()
+    for length in lengths:
+        pipe.exists(join_key_pool_ready_key(length))
+    ready = pipe.execute()
+    for length, is_ready in zip(lengths, ready):
+        if is_ready:
+            pipe.sadd(join_key_pool_key(length), *by_length[length])
+    pipe.execute()
+
+
+def get_join_key_pool_stats(rds_client: Redis, length: int = JOIN_KEY_LENGTH):
+    """
+    Get the fill level of the pool of join keys.
+
+    Args:
+        rds_client (Redis): The Redis client.
+        length (int, optional): The length of the join keys. Defaults to JOIN_KEY_LENGTH.
+
+    Returns:
+        dict: The number of free join keys, the number of possible join keys and whether the pool is running low.
+    """
+    pipe = rds_client.pipeline()
+    pipe.scard(join_key_pool_key(length))
+    pipe.exists(join_key_pool_ready_key(length))
+    available, ready = pipe.execute()
+    capacity = join_key_capacity(length)
+    return {
+        "length": length,
+        "ready": bool(ready),
+        "available": available,
+        "capacity": capacity,
+        "low": available < capacity * JOIN_KEY_POOL_LOW_WATERMARK,
+    }
@@ -0,0 +1,212 @@
+"""
+This module maintains a per-game leaderboard in Redis.
+
+Each game has a sorted set of player ids and a hash of player names. The sorted set score packs the level a
+player has reached and their cumulative solve time into a single number, so that a higher level always ranks
+first and, within the same level, a lower cumulative time ranks first. Reading the top K players is then a
+single ZREVRANGE (O(log N + K)) and a player's own rank is a single ZREVRANK (O(log N)).
+
+Players are added as they join and complete levels, which only yields every player of a game once its leaderboard
+has been built from the game document. A marker key records that it has, so the leaderboards of games started
+before they existed, or lost from Redis, are rebuilt on first read.
+"""
+
+from typing import Dict, List, Optional
+
+from redis import Redis
+
+from .expiry import GAME_KEY_TTL_SECONDS
+
+# Milliseconds reserved per level in the packed score (roughly 115 days of cumulative solve time).
+LEVEL_WEIGHT_MS = 10**10
+
+DEFAULT_TOP_K = 10
+MAX_TOP_K = 100
+
+
+def leaderboard_key(join_key: str):
+    """Get the Redis key of the sorted set holding the leaderboard of a game."""
+    return f"leaderboard:{join_key}"
+
+
+def leaderboard_names_key(join_key: str):
+    """Get the Redis key of the hash holding the player names of a game leaderboard."""
+    return f"leaderboard:{join_key}:names"
+
+
+def leaderboard_complete_key(join_key: str):
+    """Get the Redis key marking the leaderboard of a game as built from every player of the game."""
+    return f"leaderboard:{join_key}:complete"
+
+
+def encode_score(level: int, total_time: float):
+    """
+    Pack a level and a cumulative solve time into a sorted set score.
+
+    Args:
+        level (int): The level the player has reached.
+        total_time (float): The cumulative solve time of the player in seconds.
+
+    Returns:
+        int: The packed score, higher is better.
+    """
+    total_ms = min(max(int(round(total_time * 1000)), 0), LEVEL_WEIGHT_MS - 1)
+    return int(level) * LEVEL_WEIGHT_MS - total_ms
+
+
+def decode_score(score: float):
+    """
+    Unpack a sorted set score into a level and a cumulative solve time.
+
+    Args:
+        score (float): The packed score.
+
+    Returns:
+        tuple: A tuple containing the level and the cumulative solve time in seconds.
+    """
+    score = int(score)
+    level = -(-score // LEVEL_WEIGHT_MS)
+    total_ms = level * LEVEL_WEIGHT_MS - score
+    return level, total_ms / 1000
+
+
+def record_player(
+    rds_client: Redis,
+    join_key: str,
+    player_id: str,
+    name: str,
+    level: int,
+    total_time: float,
+):
+    """
+    Insert or update a player on the leaderboard of a game.
+
+    Args:
+        rds_client (Redis): The Redis client.
+        join_key (str): The join key of the game.
+        player_id (str): The ID of the player.
+        name (str): The name of the player.
+        level (int): The level the player has reached.
+        total_time (float): The cumulative solve time of the player in seconds.
+    """
+    pipe = rds_client.pipeline()
+    pipe.zadd(leaderboard_key(join_key), {player_id: encode_score(level, total_time)})
+    pipe.hset(leaderboard_names_key(join_key), player_id, name)
+    pipe.expire(leaderboard_key(join_key), GAME_KEY_TTL_SECONDS)
+    pipe.expire(leaderboard_names_key(join_key), GAME_KEY_TTL_SECONDS)
+    pipe.execute()
+
+
+def rebuild_leaderboard(rds_client: Redis, join_key: str, players: Dict[str, dict]):
+    """
+    Rebuild the leaderboard of a game from its players.
+
+    The players are read before the leaderboard is written, so a player recorded meanwhile may be ahead of them.
+    Packed scores only go up as players complete levels, so they are merged into the leaderboard keeping the
+    higher score of each player instead of replacing it.
+
+    Args:
+        rds_client (Redis): The Redis client.
+        join_key (str): The join key of the game.
+        players (dict): The players of the game keyed by player ID.
+    """
+    pipe = rds_client.pipeline()
+    pipe.set(leaderboard_complete_key(join_key), 1, ex=GAME_KEY_TTL_SECONDS)
+    if players:
+        pipe.zadd(
+            leaderboard_key(join_key),
+            {
+                player_id: encode_score(
+                    player["level"], sum(player.get("score", {}).values())
+                )
+                for player_id, player in players.items()
+            },
+            gt=True,
+        )
+        pipe.hset(
+            leaderboard_names_key(join_key),
+            mapping={player_id: player["name"] for player_id, player in players.items()},
+        )
+        pipe.expire(leaderboard_key(join_key), GAME_KEY_TTL_SECONDS)
+        pipe.expire(leaderboard_names_key(join_key), GAME_KEY_TTL_SECONDS)
+    pipe.execute()
+
+
+def leaderboard_is_complete(rds_client: Redis, join_key: str):
+    """Check if the leaderboard of a game has been built from every player of the game."""
+    return bool(rds_client.exists(leaderboard_complete_key(join_key)))
+
+
+def clear_leaderboard(rds_client: Redis, join_key: str):
+    """Remove the leaderboard of a game from Redis."""
+    rds_client.delete(
+        leaderboard_key(join_key),
+        leaderboard_names_key(join_key),
+        leaderboard_complete_key(join_key),
+    )
+
+
+def get_top_players(rds_client: Redis, join_key: str, k: int = DEFAULT_TOP_K):
+    """
+    Get the top K players of a game.
+
+    Args:
+        rds_client (Redis): The Redis client.
+        join_key (str): The join key of the game.
+        k (int, optional): The number of players to return. Defaults to DEFAULT_TOP_K.
+
+    Returns:
+        list: A list of leaderboard entries ordered by rank.
+    """
+    k = min(max(int(k), 1), MAX_TOP_K)
+    entries = rds_client.zrevrange(leaderboard_key(join_key), 0, k - 1, withscores=True)
+    if not entries:
+        return []
+
+    player_ids = [player_id.decode() for player_id, _ in entries]
+    names = rds_client.hmget(leaderboard_names_key(join_key), player_ids)
+    top: List[dict] = []
+    for rank, ((_, score), player_id, name) in enumerate(
+        zip(entries, player_ids, names), start=1
+    ):
+        level, total_time = decode_score(score)
+        top.append(
+            {
+                "rank": rank,
+                "player_id": player_id,
+                "name": name.decode() if name else None,
+                "level": level,
+                "total_time": total_time,
+            }
+        )
+    return top
+
+
+def get_player_rank(rds_client: Redis, join_key: str, player_id: str) -> Optional[dict]:
+    """
+    Get the rank of a player on the leaderboard of a game.
+
+    Args:
+        rds_client (Redis): The Redis client.
+        join_key (str): The join key of the game.
+        player_id (str): The ID of the player.
+
+    Returns:
+        dict: The leaderboard entry of the player, or None if the player is not on the leaderboard.
+    """
+    pipe = rds_client.pipeline()
+    pipe.zrevrank(leaderboard_key(join_key), player_id)
+    pipe.zscore(leaderboard_key(join_key), player_id)
+    pipe.hget(leaderboard_names_key(join_key), player_id)
+    rank, score, name = pipe.execute()
+    if rank is None or score is None:
+        return None
+
+    level, total_time = decode_score(score)
+    return {
+        "rank": rank + 1,
+        "player_id": player_id,
+        "name": name.decode() if name else None,
+        "level": level,
+        "total_time": total_time,
+    }
@@ -0,0 +1,121 @@
+"""
+This module detects a level code leaking in the stream of tokens of an answer, as the tokens arrive.
+
+The answer is matched against the code on its letters and digits only, ignoring case, so the code is found however
+the model writes it: "ioyth", "I O Y T H", "I-O-Y-T-H" or "[IOYTH]". A match must start and end on a word boundary
+of the answer, so a word code found inside a longer word ("cat" in "category") is not a leak. Matching runs a
+Knuth-Morris-Pratt automaton one character at a time, never going back over the answer, so the work per token is
+proportional to its length whatever the length of the answer. Once the code has leaked, the rest of the answer is
+of no use to the player, and with LEAK_EARLY_STOP the stream is stopped instead of paying for its remaining tokens.
+"""
+
+import os
+from typing import List
+
+LEAK_EARLY_STOP = os.getenv("LEAK_EARLY_STOP", "true").lower() in ("1", "true", "yes")
+
+
+def normalize_code(code: str):
+    """Normalize a code to the upper case letters and digits it is matched on."""
+    return "".join(char for char in code.upper() if char.isalnum())
+
+
+def failure_table(pattern: str) -> List[int]:
+    """
+    Build the Knuth-Morris-Pratt failure table of a pattern.
+
+    Args:
+        pattern (str): The pattern.
+
+    Returns:
+        list: For each prefix of the pattern, the length of its longest proper prefix that is also a suffix.
+    """
+    table = [0] * len(pattern)
+    length = 0
+    for index in range(1, len(pattern)):
+        while length and pattern[index] != pattern[length]:
+            length = table[length - 1]
+        if pattern[index] == pattern[length]:
+            length += 1
+        table[index] = length
+    return table
+
+
+class LeakDetector:
+    """The state of the search for a code in the answer streamed so far."""
+
+    __slots__ = (
+        "pattern",
+        "table",
+        "matched",
+        "leaked",
+        "_word_starts",
+        "_position",
+        "_after_separator",
+        "_pending",
+    )
+
+    def __init__(self, code: str):
+        self.pattern = normalize_code(code)
+        self.table = failure_table(self.pattern)
+        # Length of the prefix of the pattern matched by the end of the answer
+        self.matched = 0
+        self.leaked = False
+        # Whether each of the last len(pattern) letters and digits started a word, indexed by position modulo
+        # len(pattern)
+        self._word_starts = [False] * len(self.pattern)
+        self._position = 0
+        self._after_separator = True
+        # A full match waiting for the next character to tell if it ends on a word boundary
+        self._pending = False
+
+    def feed(self, token: str):
+        """
+        Search the next token of the answer.
+
+        Args:
+            token (str): The token.
+
+        Returns:
+            bool: True once the code has leaked.
+        """
+        if self.leaked or not self.pattern:
+            return self.leaked
+        for char in token:
+            if not char.isalnum():
+                self._after_separator = True
+                if self._pending:
+                    self.leaked = True
+                    return True
+                continue
+
+            self._pending = False
+            char = char.upper()
+            self._word_starts[self._position % len(self.pattern)] = self._after_separator
+            self._after_separator = False
+            self._position += 1
+
+            matched = self.matched
+            if matched == len(self.pattern):
+                matched = self.table[matched - 1]
+            while matched and char != self.pattern[matched]:
+                matched = self.table[matched - 1]
+            if char == self.pattern[matched]:
+                matched += 1
+            self.matched = matched
+
+            # The slot of the first character of the match, written len(pattern) characters ago
+            if matched == len(self.pattern) and self._word_starts[self._position % len(self.pattern)]:
+                self._pending = True
+        return False
+
+    def finish(self):
+        """
+        End the answer, which ends a match at its very end on a word boundary.
+
+        Returns:
+            bool: True if the code has leaked.
+        """
+        if self._pending:
+            self.leaked = True
+        return self.leaked
@@ -0,0 +1,358 @@
+"""
+This module bounds the growth of the hot stores by archiving finished games.
+
+A sweeper periodically looks for games that were deactivated a while ago or that have been idle past a threshold.
+Each of them is compressed into a compact record in the games archive collection, then removed from the games
+collection and from Redis. Only one worker sweeps at a time, and the report of the last sweep, including the memory
+reclaimed, is kept in Redis so any worker can serve it.
+"""
+
+import logging
+import os
+import time
+import zlib
+from datetime import datetime, timedelta, UTC
+from typing import List
+
+from firebase_admin import firestore
+from google.api_core.exceptions import FailedPrecondition
+from redis import Redis
+
+from .analytics import level_stats_key
+from .events import game_events_key, game_version_key, publish_event
+from .firebase_helper import get_db
+from .game_controller import games_collection
+from .join_keys import release_join_key
+from .leaderboard import (
+    leaderboard_complete_key,
+    leaderboard_key,
+    leaderboard_names_key,
+)
+from .serialization import dumps, loads
+
+log = logging.getLogger(__name__)
+
+SWEEP_INTERVAL_SECONDS = int(os.getenv("SWEEP_INTERVAL_SECONDS", "300"))
+GAME_IDLE_SECONDS = int(os.getenv("GAME_IDLE_SECONDS", str(2 * 24 * 60 * 60)))
+GAME_DEACTIVATED_GRACE_SECONDS = int(os.getenv("GAME_DEACTIVATED_GRACE_SECONDS", "3600"))
+SWEEP_BATCH_SIZE = int(os.getenv("SWEEP_BATCH_SIZE", "100"))
+
+SWEEPER_LOCK_KEY = "sweeper:lock"
+SWEEPER_REPORT_KEY = "sweeper:last_report"
+SWEEPER_TOTALS_KEY = "sweeper:totals"
+BACKFILL_CURSOR_KEY = "sweeper:backfill_cursor"
+BACKFILL_DONE_KEY = "sweeper:backfill_done"
+
+
+def archive_collection():
+    """Get the Firestore collection holding the archived games."""
+    return get_db().collection("games_archive")
+
+
+def game_redis_keys(join_key: str):
+    """
+    Get every Redis key holding data of a game.
+
+    Args:
+        join_key (str): The join key of the game.
+
+    Returns:
+        list: The Redis keys of the game.
+    """
+    return [
+        join_key,
+        game_version_key(join_key),
+        game_events_key(join_key),
+        leaderboard_key(join_key),
+        leaderboard_names_key(join_key),
+        leaderboard_complete_key(join_key),
+        level_stats_key(join_key),
+    ]
+
+
+def purge_game_keys(rds_client: Redis, join_key: str):
+    """
+    Remove every Redis key of a game.
+
+    Args:
+        rds_client (Redis): The Redis client.
+        join_key (str): The join key of the game.
+
+    Returns:
+        int: The number of bytes of Redis memory the keys were using.
+    """
+    return purge_games_keys(rds_client, [join_key])
+
+
+def purge_games_keys(rds_client: Redis, join_keys: List[str]):
+    """
+    Remove every Redis key of several games in one round trip.
+
+    Args:
+        rds_client (Redis): The Redis client.
+        join_keys (list): The join keys of the games.
+
+    Returns:
+        int: The number of bytes of Redis memory the keys were using.
+    """
+    keys = [key for join_key in join_keys for key in game_redis_keys(join_key)]
+    if not keys:
+        return 0
+
+    pipe = rds_client.pipeline()
+    for key in keys:
+        pipe.memory_usage(key)
+    pipe.delete(*keys)
+    *usages, _ = pipe.execute()
+    return sum(usage or 0 for usage in usages)
+
+
+def find_games_to_archive(now: datetime, limit: int = SWEEP_BATCH_SIZE):
+    """
+    Find the games that should be archived, those inactive the longest first.
+
+    Both queries filter and order on last_activity_at, which needs the composite indexes declared in
+    firestore.indexes.json.
+
+    Args:
+        now (datetime): The current time.
+        limit (int, optional): The maximum number of games to return. Defaults to SWEEP_BATCH_SIZE.
+
+    Returns:
+        list: The join keys of the games to archive.
+    """
+    idle_cutoff = (now - timedelta(seconds=GAME_IDLE_SECONDS)).isoformat()
+    deactivated_cutoff = (now - timedelta(seconds=GAME_DEACTIVATED_GRACE_SECONDS)).isoformat()
+
+    join_keys = []
+    for status, cutoff in (("deactive", deactivated_cutoff), ("active", idle_cutoff)):
+        if len(join_keys) >= limit:
+            break
+        games = (
+            games_collection()
+            .where(filter=firestore.FieldFilter("status", "==", status))
+            .where(filter=firestore.FieldFilter("last_activity_at", "<", cutoff))
+            .order_by("last_activity_at")
+            .select(["last_activity_at"])
+            .limit(limit - len(join_keys))
+            .stream()
+        )
+        join_keys.extend(game.id for game in games)
+    return join_keys
+
+
+def backfill_fields(game_data: dict):
+    """
+    Get the fields missing from a game created before they were recorded.
+
+    Args:
+        game_data (dict): The game document.
+
+    Returns:
+        dict: The missing fields and their values, empty if the game has them all.
+    """
+    fields = {}
+    started = [
+        (level["started_at"], key)
+        for key, level in (game_data.get("levels") or {}).items()
+        if level.get("started") and level.get("started_at")
+    ]
+    if not game_data.get("last_activity_at"):
+        fields["last_activity_at"] = max([game_data["created_at"], *(started_at for started_at, _ in started)])
+    if "player_count" not in game_data:
+        fields["player_count"] = len(game_data.get("players") or {})
+        fields["current_level"] = max(started)[1] if started else None
+    return fields
+
+
+def backfill_games(rds_client: Redis, limit: int = SWEEP_BATCH_SIZE):
+    """
+    Store the fields missing from the next page of games created before they were recorded.
+
+    The games are walked in the order of their join keys, a page per sweep, from the cursor kept in Redis, until
+    every game has been visited. Games without last_activity_at are never matched by find_games_to_archive, and
+    those without player_count have no player count or current level in their summary. Only the games missing
+    player_count are read with their players.
+
+    Args:
+        rds_client (Redis): The Redis client.
+        limit (int, optional): The number of games to visit. Defaults to SWEEP_BATCH_SIZE.
+
+    Returns:
+        int: The number of games updated.
+    """
+    if rds_client.exists(BACKFILL_DONE_KEY):
+        return 0
+
+    document_id = firestore.FieldPath.document_id()
+    query = games_collection().order_by(document_id).select(["last_activity_at", "player_count"])
+    cursor = rds_client.get(BACKFILL_CURSOR_KEY)
+    if cursor:
+        query = query.start_after({document_id: cursor.decode()})
+    games = list(query.limit(limit).stream())
+
+    batch = get_db().batch()
+    updated = 0
+    for game in games:
+        summary = game.to_dict()
+        if summary.get("last_activity_at") and "player_count" in summary:
+            continue
+        game_data = game.reference.get().to_dict()
+        if game_data is None:
+            continue
+        fields = backfill_fields(game_data)
+        if fields:
+            batch.update(game.reference, fields)
+            updated += 1
+    if updated:
+        batch.commit()
+
+    if len(games) < limit:
+        rds_client.set(BACKFILL_DONE_KEY, 1)
+    else:
+        rds_client.set(BACKFILL_CURSOR_KEY, games[-1].id)
+    return updated
+
+
+def archive_game(rds_client: Redis, join_key: str, now: datetime):
+    """
+    Archive a game into a compressed record and remove it from Firestore and Redis.
+
+    The record is written and the game deleted in one batch, on the condition that the game was not updated since it
+    was read, so a write landing meanwhile is never lost: the game is left for a later sweep instead.
+
+    Args:
+        rds_client (Redis): The Redis client.
+        join_key (str): The join key of the game.
+        now (datetime): The current time.
+
+    Returns:
+        dict: The sizes of the archived game, or None if the game no longer exists or was updated meanwhile.
+    """
+    doc_ref = games_collection().document(join_key)
+    game = doc_ref.get()
+    if not game.exists:
+        return None
+
+    game_data = game.to_dict()
+    raw = dumps(game_data)
+    compressed = zlib.compress(raw, 9)
+    batch = get_db().batch()
+    batch.set(
+        archive_collection().document(f"{join_key}_{int(now.timestamp())}"),
+        {
+            "join_key": join_key,
+            "status": game_data["status"],
+            "created_at": game_data["created_at"],
+            "archived_at": now.isoformat(),
+            "player_count": len(game_data["players"]),
+            "size": len(raw),
+            "data": compressed,
+        },
+    )
+    batch.delete(doc_ref, option=get_db().write_option(last_update_time=game.update_time))
+    try:
+        batch.commit()
+    except FailedPrecondition:
+        log.info("Game %s was updated while being archived, leaving it for the next sweep", join_key)
+        return None
+
+    publish_event(
+        rds_client,
+        {"type": "game_update", "action": "delete", "game_key": join_key, "archived": True},
+    )
+    redis_bytes = purge_game_keys(rds_client, join_key)
+    release_join_key(rds_client, join_key)
+    return {
+        "firestore_bytes": len(raw),
+        "archive_bytes": len(compressed),
+        "redis_bytes": redis_bytes,
+    }
+
+
+def load_archived_game(archive_id: str):
+    """
+    Load an archived game.
+
+    Args:
+        archive_id (str): The ID of the archive record.
+
+    Returns:
+        dict: The game document as it was when archived, or None if the record does not exist.
+    """
+    record = archive_collection().document(archive_id).get()
+    if not record.exists:
+        return None
+    return loads(zlib.decompress(record.to_dict()["data"]))
+
+
+def sweep(rds_client: Redis, force: bool = False):
+    """
+    Archive every game that is due, unless another worker swept during the current interval.
+
+    Args:
+        rds_client (Redis): The Redis client.
+        force (bool, optional): If True, sweep even if another worker swept recently. Defaults to False.
+
+    Returns:
+        dict: The report of the sweep, or None if the sweep was skipped.
+    """
+    acquired = rds_client.set(SWEEPER_LOCK_KEY, 1, nx=True, ex=SWEEP_INTERVAL_SECONDS)
+    if not acquired and not force:
+        return None
+
+    started_at = time.perf_counter()
+    now = datetime.now(UTC)
+    report = {
+        "swept_at": now.isoformat(),
+        "archived": [],
+        "firestore_bytes": 0,
+        "archive_bytes": 0,
+        "redis_bytes": 0,
+    }
+    try:
+        report["backfilled"] = backfill_games(rds_client)
+        for join_key in find_games_to_archive(now):
+            sizes = archive_game(rds_client, join_key, now)
+            if sizes is None:
+                continue
+            report["archived"].append(join_key)
+            for field, size in sizes.items():
+                report[field] += size
+    finally:
+        report["seconds"] = time.perf_counter() - started_at
+        pipe = rds_client.pipeline()
+        pipe.set(SWEEPER_REPORT_KEY, dumps(report))
+        pipe.hincrby(SWEEPER_TOTALS_KEY, "games", len(report["archived"]))
+        for field in ("firestore_bytes", "archive_bytes", "redis_bytes"):
+            pipe.hincrby(SWEEPER_TOTALS_KEY, field, report[field])
+        pipe.execute()
+
+    if report["archived"]:
+        log.info(
+            "Archived %d games, reclaimed %d bytes of Redis and %d bytes of Firestore",
+            len(report["archived"]),
+            report["redis_bytes"],
+            report["firestore_bytes"] - report["archive_bytes"],
+        )
+    return report
+
+
+def get_sweeper_report(rds_client: Redis):
+    """
+    Get the report of the last sweep and the totals of every sweep.
+
+    Args:
+        rds_client (Redis): The Redis client.
+
+    Returns:
+        dict: A dictionary containing the last report and the totals.
+    """
+    pipe = rds_client.pipeline()
+    pipe.get(SWEEPER_REPORT_KEY)
+    pipe.hgetall(SWEEPER_TOTALS_KEY)
+    last_report, totals = pipe.execute()
+    return {
+        "last_report": loads(last_report) if last_report else None,
+        "totals": {field.decode(): int(value) for field, value in totals.items()},
+    }
@@ -0,0 +1,167 @@
+"""
+This module writes the logs from a background thread, as JSON lines.
+
+Log records are put on a bounded in-memory queue by the thread that logs them and written to stdout by a listener
+thread, so a slow stdout (a container log driver applying backpressure) never blocks the event loop. If the queue
+fills up, records below WARNING are dropped and counted rather than waiting for it to drain. Records of
+high-frequency loggers can be sampled with LOG_SAMPLE_RATES, e.g. "uvicorn.access=0.1,httpx=0.1" keeps one in ten
+records below WARNING of those loggers and of their children. Set LOG_FORMAT=text for colored logs when running
+locally.
+"""
+
+import atexit
+import copy
+import logging
+import os
+import queue
+import random
+import sys
+from datetime import datetime, UTC
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, Optional
+
+import orjson
+
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json")
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+LOG_SAMPLE_RATES = os.getenv("LOG_SAMPLE_RATES", "uvicorn.access=0.1,httpx=0.1")
+TEXT_FORMAT = "%(levelprefix)s %(asctime)s [%(trace_id)s] %(message)s"
+
+
+class JsonFormatter(logging.Formatter):
+    """Format log records as single-line JSON objects."""
+
+    def format(self, record: logging.LogRecord):
+        entry = {
+            "time": datetime.fromtimestamp(record.created, UTC).isoformat(
+                timespec="milliseconds"
+            ),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "trace_id": getattr(record, "trace_id", None),
+        }
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        if record.stack_info:
+            entry["stack"] = record.stack_info
+        return orjson.dumps(entry, default=str).decode()
+
+
+class SamplingFilter(logging.Filter):
+    """Keep a fraction of the records below WARNING of some loggers and of their children."""
+
+    def __init__(self, rates: Optional[Dict[str, float]] = None):
+        super().__init__()
+        self.rates = parse_sample_rates(LOG_SAMPLE_RATES) if rates is None else rates
+        # The rate of every logger name seen, resolved once from the closest configured ancestor
+        self._resolved: Dict[str, float] = {}
+
+    def rate(self, name: str):
+        """Get the sample rate of a logger."""
+        rate = self._resolved.get(name)
+        if rate is None:
+            rate = 1.0
+            prefix = name
+            while prefix:
+                if prefix in self.rates:
+                    rate = self.rates[prefix]
+                    break
+                prefix = prefix.rpartition(".")[0]
+            self._resolved[name] = rate
+        return rate
+
+    def filter(self, record: logging.LogRecord):
+        if record.levelno >= logging.WARNING or not self.rates:
+            return True
+        rate = self.rate(record.name)
+        return rate >= 1 or random.random() < rate
+
+
+def parse_sample_rates(value: str):
+    """
+    Parse sample rates given as comma separated logger=rate pairs.
+
+    Args:
+        value (str): The sample rates, e.g. "uvicorn.access=0.1,httpx=0".
+
+    Returns:
+        dict: The sample rate of each logger.
+    """
+    rates = {}
+    for pair in value.split(","):
+        name, _, rate = pair.partition("=")
+        if name.strip() and rate.strip():
+            rates[name.strip()] = min(max(float(rate), 0.0), 1.0)
+    return rates
+
+
+class DroppingQueueHandler(QueueHandler):
+    """A queue handler that drops records instead of blocking when the queue is full."""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord):
+        # Merge the arguments now, as they may change once the call returns, but leave the rest of the formatting to
+        # the listener thread
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def output_formatter():
+    """Get the formatter of the log output, JSON or colored text depending on LOG_FORMAT."""
+    if LOG_FORMAT == "text":
+        # pylint: disable=import-outside-toplevel
+        from uvicorn.logging import DefaultFormatter
+
+        return DefaultFormatter(TEXT_FORMAT)
+    return JsonFormatter()
+
+
+queue_handler_instance: Optional[DroppingQueueHandler] = None
+
+
+def queue_handler():
+    """
+    Get the handler queueing records for the stdout listener thread, starting the listener on first use.
+
+    The same handler is returned on every call, so that every logger configured with it shares the listener.
+
+    Returns:
+        DroppingQueueHandler: The handler.
+    """
+    global queue_handler_instance  # pylint: disable=global-statement
+    if queue_handler_instance is None:
+        log_queue = queue.Queue(LOG_QUEUE_SIZE)
+        output = logging.StreamHandler(sys.stdout)
+        output.setFormatter(output_formatter())
+        listener = QueueListener(log_queue, output, respect_handler_level=True)
+        listener.start()
+        atexit.register(listener.stop)
+        queue_handler_instance = DroppingQueueHandler(log_queue)
+    return queue_handler_instance
+
+
+def get_log_stats():
+    """Get the number of records queued and dropped by the log handler."""
+    if queue_handler_instance is None:
+        return {"queued": 0, "dropped": 0}
+    return {
+        "queued": queue_handler_instance.queue.qsize(),
+        "dropped": queue_handler_instance.dropped,
+    }
@@ -0,0 +1,240 @@
+"""
+This module caches the answers to the opening messages players send to each level.
+
+Nearly every player opens a level with a greeting ("Hi", "Who are you?"), which the level prompts answer with a
+scripted introduction that does not depend on the password. When the only message of a chat is one of these openers,
+its answer is served from a small pool of variants cached in Redis, keyed on the level prompt, the model and the
+normalized opener, and shared by every game. Only levels with cache_openers set in their file are cached: a level
+that gives hints about the code could share them with other games. The pool of each opener is filled on first use,
+by the first OPENER_CACHE_VARIANTS chats streamed live, or ahead of time when a level is started. Cached answers are
+replayed with the pacing of a live stream, and an answer mentioning the password of the game it was generated for is
+never cached.
+"""
+
+import asyncio
+import hashlib
+import logging
+import os
+import random
+import re
+from collections import Counter
+from typing import AsyncIterator, Callable, Dict, List
+
+from redis.asyncio import Redis
+
+log = logging.getLogger(__name__)
+
+# Set to 0 to disable the cache
+OPENER_CACHE_VARIANTS = int(os.getenv("OPENER_CACHE_VARIANTS", "3"))
+OPENER_CACHE_TTL_SECONDS = int(os.getenv("OPENER_CACHE_TTL_SECONDS", str(24 * 60 * 60)))
+# A fill that does not complete within this time frees its reservation
+FILL_RESERVATION_SECONDS = 60
+# Pacing of replayed answers, close to the pace of a streamed completion
+REPLAY_FIRST_TOKEN_SECONDS = 0.3
+REPLAY_TOKEN_SECONDS = 0.02
+PREGENERATE_CONCURRENCY = 4
+
+# Normalized openers whose answers are scripted by the level prompts and safe to share between games
+CACHEABLE_OPENERS = frozenset(
+    {
+        "hi",
+        "hello",
+        "hey",
+        "hi there",
+        "hello there",
+        "who are you",
+        "who are you can you please tell me about yourself",
+        "tell me about yourself",
+        "what is this game",
+        "what is the objective of the game",
+    }
+)
+
+# Openers whose pools are filled when a level starts
+PREGENERATED_OPENERS = ("hi", "hello", "who are you")
+
+opener_cache_counters = Counter()
+
+
+def normalize_opener(text: str):
+    """Normalize a message to lower case words, ignoring punctuation and spacing."""
+    return " ".join(re.findall(r"[a-z0-9']+", text.lower())).replace("'", "")
+
+
+def cacheable_opener(messages: List[Dict[str, str]]):
+    """
+    Get the normalized opener of a chat, if its answer can be cached.
+
+    Args:
+        messages (list): The messages of the chat, as OpenAI messages, without the system message.
+
+    Returns:
+        str: The normalized opener, or None if the chat is not a single cacheable opener.
+    """
+    if OPENER_CACHE_VARIANTS <= 0:
+        return None
+    if len(messages) != 1 or messages[0].get("role") != "user":
+        return None
+    opener = normalize_opener(messages[0].get("content", ""))
+    return opener if opener in CACHEABLE_OPENERS else None
+
+
+def opener_cache_key(level: str, system_template: str, model: str, opener: str):
+    """
+    Get the Redis key of the list caching the answers to an opener.
+
+    The prompt and the model are part of the key, so answers are not served once the level changes.
+    """
+    digest = hashlib.sha256(
+        "\0".join((system_template, model, opener)).encode()
+    ).hexdigest()[:16]
+    return f"opener_cache:{level}:{digest}"
+
+
+def mentions_code(text: str, code: str):
+    """Check if a text mentions a code, ignoring case, spacing and punctuation."""
+    alphanumeric = re.sub(r"[^A-Z0-9]", "", text.upper())
+    return re.sub(r"[^A-Z0-9]", "", code.upper()) in alphanumeric
+
+
+async def reserve_fill(rds_client: Redis, cache_key: str):
+    """Reserve one of the live chats filling the pool of an opener, False if they are all reserved."""
+    pipe = rds_client.pipeline()
+    pipe.incr(f"{cache_key}:fills")
+    pipe.expire(f"{cache_key}:fills", FILL_RESERVATION_SECONDS, nx=True)
+    fills, _ = await pipe.execute()
+    return fills <= OPENER_CACHE_VARIANTS
+
+
+async def release_fill(rds_client: Redis, cache_key: str):
+    """Release the reservation of a live chat that failed to fill the pool of an opener."""
+    await rds_client.decr(f"{cache_key}:fills")
+
+
+async def store_variant(rds_client: Redis, cache_key: str, answer: str, code: str):
+    """
+    Add an answer to the pool of an opener, unless it mentions the code.
+
+    Returns:
+        bool: True if the answer was cached.
+    """
+    if not answer.strip() or mentions_code(answer, code):
+        opener_cache_counters["rejected"] += 1
+        return False
+    pipe = rds_client.pipeline()
+    pipe.rpush(cache_key, answer)
+    pipe.ltrim(cache_key, 0, OPENER_CACHE_VARIANTS - 1)
+    pipe.expire(cache_key, OPENER_CACHE_TTL_SECONDS)
+    await pipe.execute()
+    opener_cache_counters["stored"] += 1
+    return True
+
+
+async def replay(answer: str):
+    """Stream a cached answer word by word, at the pace of a live completion."""
+    await asyncio.sleep(REPLAY_FIRST_TOKEN_SECONDS)
+    for token in re.findall(r"\s*\S+", answer):
+        yield token
+        await asyncio.sleep(REPLAY_TOKEN_SECONDS)
+
+
+async def stream_cached_opener(
+    rds_client: Redis,
+    cache_key: str,
+    code: str,
+    generate: Callable[[], AsyncIterator[str]],
+) -> AsyncIterator[str]:
+    """
+    Stream the answer to an opener from its pool of cached variants, or live while the pool is being filled.
+
+    Args:
+        rds_client (Redis): The async Redis client.
+        cache_key (str): The key of the pool of the opener.
+        code (str): The code of the level in the game of the player, never cached.
+        generate (callable): Streams a live answer to the opener.
+
+    Yields:
+        str: The tokens of the answer.
+    """
+    variants = await rds_client.lrange(cache_key, 0, -1)
+    if len(variants) < OPENER_CACHE_VARIANTS and await reserve_fill(rds_client, cache_key):
+        opener_cache_counters["fills"] += 1
+        tokens = []
+        completed = False
+        try:
+            async for token in generate():
+                tokens.append(token)
+                yield token
+            completed = True
+        finally:
+            # A failed or abandoned answer leaves its reservation to another chat
+            if not completed:
+                await release_fill(rds_client, cache_key)
+        await store_variant(rds_client, cache_key, "".join(tokens), code)
+        return
+
+    if not variants:
+        # The pool is being filled by other chats
+        opener_cache_counters["misses"] += 1
+        async for token in generate():
+            yield token
+        return
+
+    opener_cache_counters["hits"] += 1
+    async for token in replay(random.choice(variants).decode()):
+        yield token
+
+
+async def pregenerate_openers(
+    rds_client: Redis,
+    cache_keys: Dict[str, str],
+    code: str,
+    generate: Callable[[str], AsyncIterator[str]],
+):
+    """
+    Fill the pools of openers of a level ahead of the players.
+
+    Args:
+        rds_client (Redis): The async Redis client.
+        cache_keys (dict): The cache key of each opener.
+        code (str): The code of the level in the game the answers are generated for.
+        generate (callable): Streams a live answer to an opener.
+
+    Returns:
+        int: The number of answers generated.
+    """
+    semaphore = asyncio.Semaphore(PREGENERATE_CONCURRENCY)
+
+    async def fill(opener: str, cache_key: str):
+        async with semaphore:
+            if not await reserve_fill(rds_client, cache_key):
+                return False
+            answer = None
+            try:
+                answer = "".join([token async for token in generate(opener)])
+            finally:
+                if answer is None:
+                    await release_fill(rds_client, cache_key)
+            return await store_variant(rds_client, cache_key, answer, code)
+
+    jobs = []
+    for opener, cache_key in cache_keys.items():
+        cached = await rds_client.llen(cache_key)
+        jobs.extend(
+            fill(opener, cache_key) for _ in range(OPENER_CACHE_VARIANTS - cached)
+        )
+    results = await asyncio.gather(*jobs, return_exceptions=True)
+    for result in results:
+        if isinstance(result, Exception):
+            log.warning("Error pregenerating an opener: %s", result)
+    return sum(result is True for result in results)
+
+
+def get_opener_cache_stats():
+    """Get the hits, misses, fills and rejected answers of the opener cache of this worker."""
+    stats = dict(opener_cache_counters)
+    lookups = stats.get("hits", 0) + stats.get("misses", 0) + stats.get("fills", 0)
+    return {
+        **stats,
+        "hit_ratio": stats.get("hits", 0) / lookups if lookups else None,
+    }
@@ -0,0 +1,177 @@
+"""
+This module writes the outgoing messages of each WebSocket from its own task.
+
+Broadcasting used to await the send to every client before the next update, so one slow client delayed every
+other client. Each connection now has a writer with a bounded queue: broadcasting only appends to the queues, and
+each writer drains its own queue at the pace of its client. When the queue of a slow client is full, its queued
+updates are replaced by a single resync message telling it to fetch the current state (they are all superseded by
+that state), or the client is disconnected, depending on WS_OVERFLOW_POLICY. A client that stops reading
+altogether is disconnected once a single send has been blocked for WS_SEND_TIMEOUT_SECONDS. Each writer keeps
+metrics on how long messages wait in its queue.
+"""
+
+import asyncio
+import logging
+import os
+import time
+from collections import deque
+from typing import Awaitable, Callable, Deque, Tuple
+
+from fastapi import WebSocket
+
+from .serialization import EncodedPayload
+
+log = logging.getLogger(__name__)
+
+WS_SEND_QUEUE_SIZE = int(os.getenv("WS_SEND_QUEUE_SIZE", "256"))
+WS_SEND_TIMEOUT_SECONDS = float(os.getenv("WS_SEND_TIMEOUT_SECONDS", "10"))
+# resync: replace the queued updates with a resync message, disconnect: close the connection
+WS_OVERFLOW_POLICY = os.getenv("WS_OVERFLOW_POLICY", "resync")
+
+# Close code asking the client to reconnect later
+TRY_AGAIN_LATER = 1013
+
+RESYNC_PAYLOAD = EncodedPayload({"type": "resync", "reason": "overflow"})
+
+
+class ConnectionWriter:
+    """The writer task and bounded outgoing queue of a WebSocket."""
+
+    def __init__(
+        self,
+        websocket: WebSocket,
+        send: Callable[[WebSocket, EncodedPayload], Awaitable[None]],
+        max_queue: int = WS_SEND_QUEUE_SIZE,
+        overflow_policy: str = WS_OVERFLOW_POLICY,
+    ):
+        self.websocket = websocket
+        self.max_queue = max_queue
+        self.overflow_policy = overflow_policy
+        self.connected_at = time.time()
+        self.closed = False
+        self.sent = 0
+        self.dropped = 0
+        self.overflows = 0
+        self.last_lag = 0.0
+        self.max_lag = 0.0
+        self._send = send
+        # Entries are (queued at, payload, droppable), only broadcast updates are droppable
+        self._queue: Deque[Tuple[float, EncodedPayload, bool]] = deque()
+        self._ready = asyncio.Event()
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._task = asyncio.create_task(self._run())
+
+    def put(self, payload: EncodedPayload, droppable: bool = False):
+        """
+        Queue a payload for the client without waiting for it to be sent.
+
+        Args:
+            payload (EncodedPayload): The payload to send.
+            droppable (bool, optional): If True, the payload is a broadcast update that can be replaced by a
+                resync message when the client falls behind. Defaults to False.
+
+        Returns:
+            bool: False if the client has been disconnected.
+        """
+        if self.closed:
+            return False
+        if len(self._queue) >= self.max_queue:
+            self.overflows += 1
+            if self.overflow_policy == "disconnect":
+                log.warning("Disconnecting slow client, %d messages queued", len(self._queue))
+                self._abort(TRY_AGAIN_LATER)
+                return False
+            self._replace_updates_with_resync()
+        self._queue.append((time.monotonic(), payload, droppable))
+        self._idle.clear()
+        self._ready.set()
+        return True
+
+    def _replace_updates_with_resync(self):
+        kept = deque(
+            entry
+            for entry in self._queue
+            if not entry[2] and entry[1] is not RESYNC_PAYLOAD
+        )
+        self.dropped += sum(1 for entry in self._queue if entry[2])
+        kept.append((time.monotonic(), RESYNC_PAYLOAD, False))
+        self._queue = kept
+
+    async def _run(self):
+        while True:
+            if not self._queue:
+                self._ready.clear()
+                self._idle.set()
+                await self._ready.wait()
+                continue
+
+            queued_at, payload, _ = self._queue.popleft()
+            try:
+                await asyncio.wait_for(
+                    self._send(self.websocket, payload), WS_SEND_TIMEOUT_SECONDS
+                )
+            except asyncio.TimeoutError:
+                log.warning("Disconnecting client that stopped reading")
+                self._idle.set()
+                self._abort(TRY_AGAIN_LATER)
+                return
+            except Exception as exc:  # pylint: disable=broad-except
+                log.info("Stopped writing to client: %s", exc)
+                self.closed = True
+                self._idle.set()
+                return
+
+            self.sent += 1
+            self.last_lag = time.monotonic() - queued_at
+            self.max_lag = max(self.max_lag, self.last_lag)
+
+    async def close(self, code: int = 1000, flush: bool = False):
+        """
+        Stop the writer and close the WebSocket.
+
+        Args:
+            code (int, optional): The close code. Defaults to 1000.
+            flush (bool, optional): If True, send the queued messages first. Defaults to False.
+        """
+        if self.closed:
+            return
+        if flush:
+            try:
+                await asyncio.wait_for(self._idle.wait(), WS_SEND_TIMEOUT_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+        self.stop()
+        await self._close_websocket(code)
+
+    def stop(self):
+        """Stop the writer, e.g. once its WebSocket is closed."""
+        self.closed = True
+        self._queue.clear()
+        if self._task is not asyncio.current_task():
+            self._task.cancel()
+
+    def _abort(self, code: int):
+        self.stop()
+        asyncio.create_task(self._close_websocket(code))
+
+    async def _close_websocket(self, code: int):
+        try:
+            await asyncio.wait_for(self.websocket.close(code), 1)
+        except Exception:  # pylint: disable=broad-except
+            pass
+
+    def stats(self):
+        """Get the metrics of the writer."""
+        return {
+            "connected_at": self.connected_at,
+            "queued": len(self._queue),
+            "oldest_queued_seconds": (
+                time.monotonic() - self._queue[0][0] if self._queue else 0.0
+            ),
+            "sent": self.sent,
+            "dropped": self.dropped,
+            "overflows": self.overflows,
+            "last_lag_seconds": self.last_lag,
+            "max_lag_seconds": self.max_lag,
+        }
@@ -0,0 +1,135 @@
+"""
+This module tracks which worker process holds which WebSocket connection.
+
+When the server runs with several worker processes or several nodes behind a load balancer, each worker only
+knows about its own sockets. Every worker therefore records its connected players and admins in Redis under a
+key that expires unless the worker keeps sending heartbeats, so a crashed worker disappears from the presence
+view on its own. Workers also share a control channel, used to tell other workers that a player has
+reconnected elsewhere and that their stale socket for that player should be closed.
+"""
+
+import os
+import socket
+import time
+from typing import Dict
+
+from redis import Redis
+
+from .serialization import dumps
+
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+PRESENCE_TTL_SECONDS = int(os.getenv("PRESENCE_TTL_SECONDS", "30"))
+PRESENCE_HEARTBEAT_SECONDS = PRESENCE_TTL_SECONDS / 3
+
+WORKERS_KEY = "presence:workers"
+WORKER_CONTROL_CHANNEL = "worker_control"
+
+
+def worker_key(worker_id: str):
+    """Get the Redis key of the hash describing a worker."""
+    return f"presence:worker:{worker_id}"
+
+
+def worker_players_key(worker_id: str):
+    """Get the Redis key of the hash mapping the players connected to a worker to their games."""
+    return f"presence:worker:{worker_id}:players"
+
+
+def heartbeat(rds_client: Redis, players: Dict[str, str], admins: int):
+    """
+    Refresh the presence of this worker.
+
+    Args:
+        rds_client (Redis): The Redis client.
+        players (dict): The players connected to this worker, mapped to their join keys.
+        admins (int): The number of admins connected to this worker.
+    """
+    pipe = rds_client.pipeline()
+    pipe.sadd(WORKERS_KEY, WORKER_ID)
+    pipe.hset(
+        worker_key(WORKER_ID),
+        mapping={"admins": admins, "players": len(players), "heartbeat_at": time.time()},
+    )
+    pipe.expire(worker_key(WORKER_ID), PRESENCE_TTL_SECONDS)
+    pipe.delete(worker_players_key(WORKER_ID))
+    if players:
+        pipe.hset(worker_players_key(WORKER_ID), mapping=players)
+        pipe.expire(worker_players_key(WORKER_ID), PRESENCE_TTL_SECONDS)
+    pipe.execute()
+
+
+def player_connected(rds_client: Redis, player_id: str, join_key: str):
+    """
+    Record that a player is connected to this worker.
+
+    Other workers are notified so they can drop any socket they still hold for the player.
+
+    Args:
+        rds_client (Redis): The Redis client.
+        player_id (str): The ID of the player.
+        join_key (str): The join key of the game of the player.
+    """
+    pipe = rds_client.pipeline()
+    pipe.hset(worker_players_key(WORKER_ID), player_id, join_key)
+    pipe.expire(worker_players_key(WORKER_ID), PRESENCE_TTL_SECONDS)
+    pipe.publish(
+        WORKER_CONTROL_CHANNEL,
+        dumps({"type": "takeover", "player_id": player_id, "worker_id": WORKER_ID}),
+    )
+    pipe.execute()
+
+
+def player_disconnected(rds_client: Redis, player_id: str):
+    """Record that a player is no longer connected to this worker."""
+    rds_client.hdel(worker_players_key(WORKER_ID), player_id)
+
+
+def clear_worker(rds_client: Redis):
+    """Remove the presence of this worker, e.g. on shutdown."""
+    pipe = rds_client.pipeline()
+    pipe.srem(WORKERS_KEY, WORKER_ID)
+    pipe.delete(worker_key(WORKER_ID), worker_players_key(WORKER_ID))
+    pipe.execute()
+
+
+def get_presence(rds_client: Redis):
+    """
+    Get the connections held by every live worker.
+
+    Workers whose presence expired are pruned from the set of workers.
+
+    Args:
+        rds_client (Redis): The Redis client.
+
+    Returns:
+        dict: The live workers with their connection counts, and the connected players of each game mapped
+        to the worker holding their socket.
+    """
+    worker_ids = [worker_id.decode() for worker_id in rds_client.smembers(WORKERS_KEY)]
+    pipe = rds_client.pipeline()
+    for worker_id in worker_ids:
+        pipe.hgetall(worker_key(worker_id))
+        pipe.hgetall(worker_players_key(worker_id))
+    results = pipe.execute()
+
+    workers = {}
+    games: Dict[str, Dict[str, str]] = {}
+    expired = []
+    for index, worker_id in enumerate(worker_ids):
+        info, players = results[2 * index], results[2 * index + 1]
+        if not info:
+            expired.append(worker_id)
+            continue
+        workers[worker_id] = {
+            "admins": int(info.get(b"admins", 0)),
+            "players": int(info.get(b"players", 0)),
+            "heartbeat_at": float(info.get(b"heartbeat_at", 0)),
+        }
+        for player_id, join_key in players.items():
+            games.setdefault(join_key.decode(), {})[player_id.decode()] = worker_id
+
+    if expired:
+        rds_client.srem(WORKERS_KEY, *expired)
+
+    return {"workers": workers, "games": games}
@@ -0,0 +1,75 @@
+"""
+This module profiles the live process by sampling the stacks of its threads.
+
+A background thread reads the current frame of every other thread at a fixed interval with sys._current_frames and
+counts each distinct stack. The counts are returned in the folded format (one "frame;frame;frame count" line per
+stack, root first) read by flamegraph.pl, speedscope and most other flame graph tools. Sampling does not need any
+instrumentation, so it can be run on a live worker while latency is high without restarting it.
+"""
+
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+MAX_PROFILE_SECONDS = 60
+DEFAULT_INTERVAL_SECONDS = 0.005
+# Frames kept per stack, from the innermost
+MAX_STACK_DEPTH = 128
+
+
+class ProfilerBusy(Exception):
+    """Raised when a profile is already being taken."""
+
+
+profile_lock = threading.Lock()
+
+
+def frame_label(frame):
+    """Get the label of a stack frame, its function and file."""
+    code = frame.f_code
+    return f"{code.co_qualname} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def sample_stacks(seconds: float, interval: float = DEFAULT_INTERVAL_SECONDS):
+    """
+    Sample the stacks of every thread of the process.
+
+    Args:
+        seconds (float): How long to sample for, at most MAX_PROFILE_SECONDS.
+        interval (float, optional): The time between samples in seconds. Defaults to DEFAULT_INTERVAL_SECONDS.
+
+    Returns:
+        Counter: The number of samples of each folded stack.
+
+    Raises:
+        ProfilerBusy: If a profile is already being taken.
+    """
+    if not profile_lock.acquire(blocking=False):
+        raise ProfilerBusy("A profile is already being taken")
+
+    try:
+        own_thread = threading.get_ident()
+        deadline = time.monotonic() + min(seconds, MAX_PROFILE_SECONDS)
+        stacks = Counter()
+        while time.monotonic() < deadline:
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():  # pylint: disable=protected-access
+                if thread_id == own_thread:
+                    continue
+                labels = []
+                while frame is not None and len(labels) < MAX_STACK_DEPTH:
+                    labels.append(frame_label(frame))
+                    frame = frame.f_back
+                labels.append(names.get(thread_id, str(thread_id)))
+                stacks[";".join(reversed(labels))] += 1
+            time.sleep(interval)
+        return stacks
+    finally:
+        profile_lock.release()
+
+
+def format_folded(stacks: Counter):
+    """Format sampled stacks in the folded format of flame graph tools."""
+    return "".join(f"{stack} {count}\n" for stack, count in stacks.most_common())
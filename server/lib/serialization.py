@@ -0,0 +1,92 @@
+"""
+This module serializes payloads sent over pub/sub and WebSockets.
+
+Payloads are encoded with orjson, or with msgpack for clients that negotiate it. An EncodedPayload caches
+each encoding the first time it is requested, so an event fanned out to many sockets is serialized once
+per encoding instead of once per recipient.
+"""
+
+from typing import Any, Optional
+
+import msgpack
+import orjson
+
+JSON = "json"
+MSGPACK = "msgpack"
+ENCODINGS = (JSON, MSGPACK)
+
+
+def dumps(data: Any) -> bytes:
+    """Serialize data to JSON bytes."""
+    return orjson.dumps(data)
+
+
+def loads(data: bytes | str) -> Any:
+    """Deserialize JSON bytes or text."""
+    return orjson.loads(data)
+
+
+def negotiate_encoding(requested: Optional[str]):
+    """
+    Pick the encoding to use for a client.
+
+    Args:
+        requested (str): The encoding requested by the client, if any.
+
+    Returns:
+        str: The requested encoding if supported, JSON otherwise.
+    """
+    return requested if requested in ENCODINGS else JSON
+
+
+def decode_client_message(data: bytes | str, encoding: str):
+    """
+    Deserialize a message received from a client.
+
+    Text frames are always JSON. Binary frames use the encoding negotiated by the client.
+    """
+    if isinstance(data, bytes) and encoding == MSGPACK:
+        return msgpack.unpackb(data)
+    return orjson.loads(data)
+
+
+class EncodedPayload:
+    """A payload serialized at most once per encoding and shared by every recipient."""
+
+    __slots__ = ("_data", "_json", "_text", "_msgpack")
+
+    def __init__(self, data: Any = None, json_bytes: Optional[bytes] = None):
+        if data is None and json_bytes is None:
+            raise ValueError("Either data or json_bytes is required")
+        self._data = data
+        self._json = json_bytes
+        self._text: Optional[str] = None
+        self._msgpack: Optional[bytes] = None
+
+    @property
+    def data(self):
+        """The decoded payload."""
+        if self._data is None:
+            self._data = orjson.loads(self._json)
+        return self._data
+
+    @property
+    def json_bytes(self):
+        """The payload encoded as JSON bytes."""
+        if self._json is None:
+            self._json = orjson.dumps(self._data)
+        return self._json
+
+    @property
+    def json_text(self):
+        """The payload encoded as JSON text, for WebSocket text frames."""
+        if self._text is None:
+            self._text = self.json_bytes.decode("utf-8")
+        return self._text
+
+    @property
+    def msgpack_bytes(self):
+        """The payload encoded as msgpack bytes, for WebSocket binary frames."""
+        if self._msgpack is None:
+            self._msgpack = msgpack.packb(self.data)
+        return self._msgpack
@@ -0,0 +1,124 @@
+"""
+This module coalesces concurrent loads of the same cache entry.
+
+When a cached entry is missing, every request needing it would otherwise read the source and write the cache
+itself. Within a process, SingleFlight lets the first caller for a key run the load while the others wait for its
+result. Across processes, load_once takes a short Redis lock so that one loader fills the cache while the other
+workers poll it, and fall back to loading themselves if the lock holder fails or takes too long.
+"""
+
+import logging
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import Future
+from typing import Callable, Dict, TypeVar, Union
+
+from redis import Redis
+
+log = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# How long a loader holds the lock, and so the longest the other workers wait for it
+LOAD_LOCK_MILLISECONDS = int(os.getenv("LOAD_LOCK_MILLISECONDS", "3000"))
+LOAD_POLL_SECONDS = 0.05
+
+# Deletes the lock only if it still holds the token of the loader, in one step, so a lock that expired and was taken
+# by another loader is never released
+RELEASE_LOCK_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+class SingleFlight:
+    """Run at most one call per key at a time within the process, sharing its result with concurrent callers."""
+
+    def __init__(self):
+        self._calls: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: str, fn: Callable[[], T]) -> T:
+        """
+        Call fn, unless a call for the same key is in flight, in which case wait for its result.
+
+        Args:
+            key (str): The key identifying the call.
+            fn (callable): The call to make.
+
+        Returns:
+            The result of the call, shared by every concurrent caller.
+
+        Raises:
+            Exception: The exception raised by the call, re-raised to every concurrent caller.
+        """
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = self._calls[key] = Future()
+        if not leader:
+            return future.result()
+
+        try:
+            result = fn()
+        except BaseException as exc:
+            future.set_exception(exc)
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+        future.set_result(result)
+        return result
+
+
+def load_once(
+    rds_client: Redis,
+    cache_key: str,
+    lock_key: str,
+    load: Callable[[], str],
+    ttl: int,
+    lock_milliseconds: int = LOAD_LOCK_MILLISECONDS,
+) -> Union[str, bytes]:
+    """
+    Fill a Redis cache entry with at most one loader across processes.
+
+    Args:
+        rds_client (Redis): The Redis client.
+        cache_key (str): The key of the cache entry.
+        lock_key (str): The key of the lock guarding the load.
+        load (callable): Loads the value to cache.
+        ttl (int): The time to live of the cache entry in seconds.
+        lock_milliseconds (int, optional): How long the lock is held at most. Defaults to LOAD_LOCK_MILLISECONDS.
+
+    Returns:
+        str or bytes: The cached value, as loaded here or as read back from the cache.
+    """
+    token = uuid.uuid4().hex
+    if rds_client.set(lock_key, token, nx=True, px=lock_milliseconds):
+        try:
+            return store(rds_client, cache_key, load(), ttl)
+        finally:
+            rds_client.register_script(RELEASE_LOCK_SCRIPT)(keys=[lock_key], args=[token])
+
+    deadline = time.monotonic() + lock_milliseconds / 1000
+    while time.monotonic() < deadline:
+        time.sleep(LOAD_POLL_SECONDS)
+        value = rds_client.get(cache_key)
+        if value is not None:
+            return value
+        if not rds_client.exists(lock_key):
+            break
+
+    log.warning("Loader of %s failed or timed out, loading it here", cache_key)
+    return store(rds_client, cache_key, load(), ttl)
+
+
+def store(rds_client: Redis, cache_key: str, value: str, ttl: int):
+    """Write a value to a Redis cache entry and return it."""
+    rds_client.set(cache_key, value, ex=ttl)
+    return value
@@ -0,0 +1,80 @@
+"""
+This module initializes the external dependencies of the server in the background.
+
+The application starts serving as soon as it is imported. Each dependency (Redis, Firebase, ...) is then
+initialized concurrently and retried with backoff until it succeeds, while its status is tracked so a readiness
+endpoint can report which dependencies are ready, how long they took and the last error of those that are not.
+"""
+
+import asyncio
+import logging
+import time
+from typing import Callable, Dict
+
+log = logging.getLogger(__name__)
+
+INITIAL_RETRY_SECONDS = 1.0
+MAX_RETRY_SECONDS = 30.0
+
+
+class DependencyStatus:
+    """The initialization status of a dependency."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.ready = False
+        self.attempts = 0
+        self.error = None
+        self.seconds = None
+
+    def to_dict(self):
+        """Get the status as a dictionary."""
+        return {
+            "ready": self.ready,
+            "attempts": self.attempts,
+            "error": self.error,
+            "seconds": self.seconds,
+        }
+
+
+async def initialize_dependency(status: DependencyStatus, init: Callable[[], object]):
+    """
+    Run the blocking initializer of a dependency in a thread until it succeeds.
+
+    Args:
+        status (DependencyStatus): The status to update.
+        init (callable): The blocking initializer of the dependency.
+    """
+    started_at = time.perf_counter()
+    delay = INITIAL_RETRY_SECONDS
+    while True:
+        status.attempts += 1
+        try:
+            await asyncio.to_thread(init)
+        except Exception as exc:  # pylint: disable=broad-except
+            status.error = str(exc)
+            log.error("Error initializing %s: %s", status.name, exc)
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, MAX_RETRY_SECONDS)
+            continue
+
+        status.ready = True
+        status.error = None
+        status.seconds = time.perf_counter() - started_at
+        log.info("%s ready in %.2fs", status.name, status.seconds)
+        return
+
+
+async def initialize_dependencies(
+    statuses: Dict[str, DependencyStatus], initializers: Dict[str, Callable[[], object]]
+):
+    """
+    Initialize every dependency concurrently.
+
+    Args:
+        statuses (dict): The status of each dependency, keyed by name.
+        initializers (dict): The blocking initializer of each dependency, keyed by name.
+    """
+    await asyncio.gather(
+        *(initialize_dependency(statuses[name], init) for name, init in initializers.items())
+    )
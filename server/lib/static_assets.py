@@ -0,0 +1,185 @@
+"""
+This module serves the built frontend from memory.
+
+Every file of the static directory is read once, in the background at startup, together with its gzip and, when
+the brotli package is installed, brotli variants. Each variant has a strong ETag so conditional requests are
+answered with 304 Not Modified. Assets with a content hash in their name (as emitted by Vite) never change and are
+cached by browsers for a year, while the other files (index.html) are revalidated on every load. Until the
+assets are loaded, files are served from disk.
+"""
+
+import gzip
+import hashlib
+import logging
+import mimetypes
+import os
+import re
+import time
+from typing import Dict, Optional
+
+from fastapi import Request, Response
+from fastapi.responses import FileResponse
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - brotli is optional
+    brotli = None
+
+log = logging.getLogger(__name__)
+
+INDEX_FILE = "index.html"
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE_CONTROL = "no-cache"
+
+# Vite names bundled assets like assets/index-D-a3bC_x.js, with an 8 character base64url hash
+HASHED_ASSET = re.compile(r"^assets/.+-[A-Za-z0-9_-]{8}\.[a-z0-9]+$")
+COMPRESSIBLE_TYPES = re.compile(
+    r"^(text/|application/(javascript|json|xml|wasm|manifest\+json)|image/svg\+xml)"
+)
+MIN_COMPRESS_BYTES = 1024
+
+
+class StaticAsset:
+    """A static file held in memory with its compressed variants."""
+
+    __slots__ = ("media_type", "cache_control", "variants", "etags")
+
+    def __init__(self, path: str, content: bytes):
+        self.media_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+        self.cache_control = (
+            IMMUTABLE_CACHE_CONTROL if HASHED_ASSET.match(path) else REVALIDATE_CACHE_CONTROL
+        )
+        digest = hashlib.sha256(content).hexdigest()[:20]
+        # Each encoding is a different representation and needs its own strong ETag
+        self.variants: Dict[str, bytes] = {"identity": content}
+        if COMPRESSIBLE_TYPES.match(self.media_type) and len(content) >= MIN_COMPRESS_BYTES:
+            compressed = {"gzip": gzip.compress(content, 9, mtime=0)}
+            if brotli is not None:
+                compressed["br"] = brotli.compress(content, quality=11)
+            for encoding, data in compressed.items():
+                if len(data) < len(content):
+                    self.variants[encoding] = data
+        self.etags = {
+            encoding: f'"{digest}"' if encoding == "identity" else f'"{digest}-{encoding}"'
+            for encoding in self.variants
+        }
+
+    def negotiate(self, accept_encoding: Optional[str]):
+        """Pick the smallest variant the client accepts."""
+        accepted = parse_accept_encoding(accept_encoding)
+        for encoding in ("br", "gzip"):
+            if encoding in self.variants and accepted.get(encoding, accepted.get("*", 0)) > 0:
+                return encoding
+        return "identity"
+
+    def response(self, request: Request):
+        """Build the response to a request for the asset."""
+        encoding = self.negotiate(request.headers.get("accept-encoding"))
+        headers = {
+            "ETag": self.etags[encoding],
+            "Cache-Control": self.cache_control,
+            "Vary": "Accept-Encoding",
+        }
+        if encoding != "identity":
+            headers["Content-Encoding"] = encoding
+
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match and matches_etag(if_none_match, self.etags.values()):
+            return Response(status_code=304, headers=headers)
+        return Response(self.variants[encoding], media_type=self.media_type, headers=headers)
+
+
+def parse_accept_encoding(header: Optional[str]):
+    """Parse an Accept-Encoding header into the quality of each encoding."""
+    accepted: Dict[str, float] = {}
+    for part in (header or "").split(","):
+        encoding, _, params = part.strip().partition(";")
+        if not encoding:
+            continue
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[encoding.strip().lower()] = quality
+    return accepted
+
+
+def matches_etag(if_none_match: str, etags):
+    """Check if an If-None-Match header matches any ETag of an asset, using weak comparison."""
+    if if_none_match.strip() == "*":
+        return True
+    candidates = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    return any(etag in candidates for etag in etags)
+
+
+class StaticAssets:
+    """The files of a static directory, served from memory once loaded."""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.assets: Dict[str, StaticAsset] = {}
+        self.loaded = False
+
+    def load(self):
+        """
+        Read and compress every file of the directory.
+
+        Returns:
+            int: The number of files loaded.
+        """
+        started_at = time.perf_counter()
+        assets = {}
+        if not os.path.isdir(self.directory):
+            log.warning("Static directory %s does not exist", self.directory)
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                file_path = os.path.join(root, name)
+                relative_path = os.path.relpath(file_path, self.directory).replace(os.sep, "/")
+                with open(file_path, "rb") as file:
+                    assets[relative_path] = StaticAsset(relative_path, file.read())
+
+        self.assets = assets
+        self.loaded = True
+        log.info(
+            "Loaded %d static files in %.2fs%s",
+            len(assets),
+            time.perf_counter() - started_at,
+            "" if brotli is not None else " (brotli not installed)",
+        )
+        return len(assets)
+
+    def response(self, request: Request, path: str):
+        """
+        Build the response to a request for a static path.
+
+        Paths that are not files are routes of the single page app and get index.html, except under assets/
+        where they are missing files.
+
+        Args:
+            request (Request): The request.
+            path (str): The requested path, relative to the static directory.
+
+        Returns:
+            Response: The response.
+        """
+        if not self.loaded:
+            return self._disk_response(path)
+
+        asset = self.assets.get(path) or (
+            None if path.startswith("assets/") else self.assets.get(INDEX_FILE)
+        )
+        if asset is None:
+            return Response(status_code=404)
+        return asset.response(request)
+
+    def _disk_response(self, path: str):
+        file_path = os.path.realpath(os.path.join(self.directory, path))
+        inside = file_path.startswith(os.path.realpath(self.directory) + os.sep)
+        if inside and os.path.isfile(file_path):
+            return FileResponse(file_path)
+        if path.startswith("assets/"):
+            return Response(status_code=404)
+        return FileResponse(os.path.join(self.directory, INDEX_FILE))
@@ -0,0 +1,165 @@
+"""
+This module shapes the token stream of a chat response before it is written to the client.
+
+The model yields one token at a time, and writing each token as its own chunk costs one ASGI send and usually one
+TCP write per token, which proxies and load balancers turn into visible stutter. Tokens are instead pumped into a
+queue and coalesced into batches bounded by a short time window and a maximum size. Clients that accept
+text/event-stream receive each batch as a Server-Sent Event with an id, comment heartbeats while the model is
+thinking and a final done event. Other clients receive the batches as plain text.
+"""
+
+import asyncio
+import os
+from typing import AsyncIterable, AsyncIterator, Optional
+
+from .serialization import dumps
+
+# The longest a token waits for more tokens before its batch is written
+COALESCE_SECONDS = float(os.getenv("STREAM_COALESCE_SECONDS", "0.03"))
+# A batch is written as soon as it holds this many characters
+COALESCE_MAX_CHARS = int(os.getenv("STREAM_COALESCE_MAX_CHARS", "256"))
+# Send a heartbeat when no token arrives for this long (event streams only)
+HEARTBEAT_SECONDS = float(os.getenv("STREAM_HEARTBEAT_SECONDS", "10"))
+
+EVENT_STREAM_MEDIA_TYPE = "text/event-stream"
+TEXT_MEDIA_TYPE = "text/plain; charset=utf-8"
+# Keep caches and reverse proxies (nginx honours X-Accel-Buffering) from buffering the stream
+STREAM_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+_DONE = object()
+
+
+def wants_event_stream(accept: Optional[str]):
+    """Check if the Accept header of a request asks for Server-Sent Events."""
+    return bool(accept) and EVENT_STREAM_MEDIA_TYPE in accept
+
+
+async def coalesce(
+    tokens: AsyncIterable[str],
+    window: float = COALESCE_SECONDS,
+    max_chars: int = COALESCE_MAX_CHARS,
+    heartbeat: Optional[float] = None,
+) -> AsyncIterator[Optional[str]]:
+    """
+    Coalesce a stream of tokens into batches.
+
+    Args:
+        tokens (AsyncIterable[str]): The tokens to coalesce.
+        window (float, optional): The longest a token waits for more tokens. Defaults to COALESCE_SECONDS.
+        max_chars (int, optional): The size at which a batch is written right away. Defaults to COALESCE_MAX_CHARS.
+        heartbeat (float, optional): If set, yield None whenever no token arrives for this many seconds.
+
+    Yields:
+        str: The next batch of tokens, or None as a heartbeat.
+    """
+    queue: asyncio.Queue = asyncio.Queue()
+
+    async def pump():
+        try:
+            async for token in tokens:
+                queue.put_nowait(token)
+        except Exception as exc:  # pylint: disable=broad-except
+            queue.put_nowait(exc)
+        finally:
+            queue.put_nowait(_DONE)
+
+    pump_task = asyncio.create_task(pump())
+    loop = asyncio.get_running_loop()
+    pending = None
+    try:
+        while pending is None:
+            try:
+                item = await asyncio.wait_for(queue.get(), heartbeat)
+            except asyncio.TimeoutError:
+                yield None
+                continue
+            if item is _DONE or isinstance(item, Exception):
+                pending = item
+                break
+
+            batch = [item]
+            size = len(item)
+            deadline = loop.time() + window
+            while size < max_chars:
+                # Only wait on the queue once it has been drained
+                if queue.empty():
+                    remaining = deadline - loop.time()
+                    if remaining <= 0:
+                        break
+                    try:
+                        item = await asyncio.wait_for(queue.get(), remaining)
+                    except asyncio.TimeoutError:
+                        break
+                else:
+                    item = queue.get_nowait()
+                if item is _DONE or isinstance(item, Exception):
+                    pending = item
+                    break
+                batch.append(item)
+                size += len(item)
+            yield "".join(batch)
+
+        if isinstance(pending, Exception):
+            raise pending
+    finally:
+        pump_task.cancel()
+        # Wait for the pump to stop, so the token stream is no longer read once the batches are closed
+        await asyncio.gather(pump_task, return_exceptions=True)
+
+
+def format_event(data: str, event: Optional[str] = None, event_id: Optional[int] = None):
+    """
+    Frame a Server-Sent Event.
+
+    Args:
+        data (str): The data of the event, on a single line.
+        event (str, optional): The type of the event.
+        event_id (int, optional): The id of the event.
+
+    Returns:
+        str: The framed event.
+    """
+    lines = []
+    if event:
+        lines.append(f"event: {event}")
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"data: {data}")
+    return "\n".join(lines) + "\n\n"
+
+
+async def stream_events(tokens: AsyncIterable[str]) -> AsyncIterator[str]:
+    """
+    Stream tokens as Server-Sent Events.
+
+    Each batch is a token event whose data is a JSON object with the text of the batch, and the stream ends with a
+    done event. Heartbeats are SSE comments, which clients ignore.
+
+    Args:
+        tokens (AsyncIterable[str]): The tokens to stream.
+
+    Yields:
+        str: The framed events.
+    """
+    event_id = 0
+    async for batch in coalesce(tokens, heartbeat=HEARTBEAT_SECONDS):
+        if batch is None:
+            yield ": heartbeat\n\n"
+            continue
+        event_id += 1
+        yield format_event(dumps({"text": batch}).decode(), "token", event_id)
+    yield format_event("{}", "done", event_id + 1)
+
+
+async def stream_text(tokens: AsyncIterable[str]) -> AsyncIterator[str]:
+    """
+    Stream tokens as plain text, in coalesced batches.
+
+    Args:
+        tokens (AsyncIterable[str]): The tokens to stream.
+
+    Yields:
+        str: The batches of tokens.
+    """
+    async for batch in coalesce(tokens):
+        yield batch
@@ -0,0 +1,208 @@
+"""
+This module traces where requests spend their time.
+
+Every HTTP request and WebSocket connection gets a trace id, held in a context variable so that it follows the
+request into threads and tasks and is added to each log record. When TRACING_ENABLED is set, the Redis commands, the
+game controller calls and the LLM calls of a request are recorded as spans, and the timeline of every request
+slower than TRACE_SLOW_MILLISECONDS is logged. When tracing is disabled, the decorators return the functions
+undecorated and the plain Redis client is used, so the only cost left is setting the trace id of each request.
+"""
+
+import contextvars
+import functools
+import logging
+import os
+import time
+from typing import Callable, List, Optional, TypeVar
+
+from redis import Redis
+from redis.client import Pipeline
+
+log = logging.getLogger(__name__)
+
+F = TypeVar("F", bound=Callable)
+
+TRACING_ENABLED = os.getenv("TRACING_ENABLED", "false").lower() in ("1", "true", "yes")
+TRACE_SLOW_MILLISECONDS = float(os.getenv("TRACE_SLOW_MILLISECONDS", "500"))
+TRACE_ID_HEADER = "x-trace-id"
+# Spans kept per trace, so that the trace of a long streamed response does not grow without bound
+MAX_SPANS = 200
+
+trace_id_var: contextvars.ContextVar[str] = contextvars.ContextVar("trace_id", default="-")
+current_trace: contextvars.ContextVar[Optional["Trace"]] = contextvars.ContextVar(
+    "current_trace", default=None
+)
+
+
+class Trace:
+    """The spans recorded during a request."""
+
+    __slots__ = ("trace_id", "name", "started_at", "spans", "dropped")
+
+    def __init__(self, trace_id: str, name: str):
+        self.trace_id = trace_id
+        self.name = name
+        self.started_at = time.perf_counter()
+        # Each span is (name, start offset, duration) in milliseconds
+        self.spans: List[tuple] = []
+        self.dropped = 0
+
+    def add(self, name: str, started_at: float, ended_at: float):
+        """Record a span given its start and end perf_counter times."""
+        if len(self.spans) >= MAX_SPANS:
+            self.dropped += 1
+            return
+        self.spans.append(
+            (
+                name,
+                (started_at - self.started_at) * 1000,
+                (ended_at - started_at) * 1000,
+            )
+        )
+
+    def elapsed_milliseconds(self):
+        """Get the time since the trace started, in milliseconds."""
+        return (time.perf_counter() - self.started_at) * 1000
+
+    def format(self):
+        """Format the timeline of the trace for the logs."""
+        lines = [
+            f"{self.name} took {self.elapsed_milliseconds():.1f}ms, trace {self.trace_id}"
+        ]
+        for name, offset, duration in sorted(self.spans, key=lambda span: span[1]):
+            lines.append(f"  +{offset:8.1f}ms {duration:8.1f}ms {name}")
+        if self.dropped:
+            lines.append(f"  ... {self.dropped} more spans")
+        return "\n".join(lines)
+
+
+class span:  # pylint: disable=invalid-name
+    """
+    Record the time spent in a block as a span of the current trace.
+
+    Does nothing when tracing is disabled or the block does not run within a request.
+    """
+
+    __slots__ = ("name", "trace", "started_at")
+
+    def __init__(self, name: str):
+        self.name = name
+        self.trace = None
+        self.started_at = 0.0
+
+    def __enter__(self):
+        if TRACING_ENABLED:
+            self.trace = current_trace.get()
+            self.started_at = time.perf_counter()
+        return self
+
+    def __exit__(self, *_):
+        self.end()
+
+    def end(self):
+        """End the span before the end of its block. Only the first end is recorded."""
+        if self.trace is not None:
+            self.trace.add(self.name, self.started_at, time.perf_counter())
+            self.trace = None
+
+
+def traced(fn: F) -> F:
+    """Record every call of a function as a span, or return it undecorated when tracing is disabled."""
+    if not TRACING_ENABLED:
+        return fn
+    name = f"{fn.__module__.rpartition('.')[2]}.{fn.__name__}"
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        with span(name):
+            return fn(*args, **kwargs)
+
+    return wrapper
+
+
+class TracedPipeline(Pipeline):
+    """A Redis pipeline recording each execution as a span."""
+
+    def execute(self, raise_on_error=True):
+        with span(f"redis.pipeline[{len(self.command_stack)}]"):
+            return super().execute(raise_on_error)
+
+
+class TracedRedis(Redis):
+    """A Redis client recording each command as a span."""
+
+    def execute_command(self, *args, **options):
+        with span(f"redis.{args[0]}"):
+            return super().execute_command(*args, **options)
+
+    def pipeline(self, transaction=True, shard_hint=None):
+        return TracedPipeline(
+            self.connection_pool, self.response_callbacks, transaction, shard_hint
+        )
+
+
+def redis_client_class():
+    """Get the Redis client class to use, traced only when tracing is enabled."""
+    return TracedRedis if TRACING_ENABLED else Redis
+
+
+def new_trace_id():
+    """Generate a trace id."""
+    return os.urandom(8).hex()
+
+
+class TraceIdFilter(logging.Filter):
+    """Add the trace id of the current request to every log record."""
+
+    def filter(self, record: logging.LogRecord):
+        record.trace_id = trace_id_var.get()
+        return True
+
+
+class TracingMiddleware:
+    """
+    ASGI middleware giving each request a trace id and, when tracing is enabled, logging the spans of slow ones.
+
+    A trace id sent by the client in the X-Trace-Id header is kept, and the trace id is returned in the same header.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] not in ("http", "websocket"):
+            await self.app(scope, receive, send)
+            return
+
+        trace_id = None
+        for name, value in scope["headers"]:
+            if name == TRACE_ID_HEADER.encode():
+                trace_id = value.decode("latin-1")[:64]
+                break
+        trace_id = trace_id or new_trace_id()
+        trace_id_token = trace_id_var.set(trace_id)
+        # WebSockets live for the whole game, only their trace id is kept
+        trace = (
+            Trace(trace_id, f"{scope['method']} {scope['path']}")
+            if TRACING_ENABLED and scope["type"] == "http"
+            else None
+        )
+        trace_token = current_trace.set(trace)
+
+        async def send_with_trace_id(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = [
+                    *message.get("headers", []),
+                    (TRACE_ID_HEADER.encode(), trace_id.encode()),
+                ]
+            await send(message)
+
+        try:
+            await self.app(
+                scope, receive, send_with_trace_id if scope["type"] == "http" else send
+            )
+        finally:
+            if trace is not None and trace.elapsed_milliseconds() >= TRACE_SLOW_MILLISECONDS:
+                log.info("Slow request: %s", trace.format())
+            current_trace.reset(trace_token)
+            trace_id_var.reset(trace_id_token)
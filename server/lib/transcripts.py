@@ -0,0 +1,217 @@
+"""
+This module archives chat transcripts to compressed JSONL segments.
+
+Each completed chat is submitted as a record (game, player, level, messages, response, timing) to a bounded
+in-memory queue, without waiting: when the queue is full the record is dropped and counted, so archiving never adds
+latency to a chat. A writer thread takes the records off the queue in batches and appends each batch to the current
+segment as a gzip member, so a segment cut short by a crash still decompresses up to its last batch. Segments are
+rotated by size and age. A finished segment is kept in TRANSCRIPT_DIRECTORY, or uploaded to TRANSCRIPT_S3_BUCKET and
+removed once uploaded when it is set; segments that failed to upload are retried at the next rotation.
+"""
+
+import gzip
+import logging
+import os
+import queue
+import threading
+import time
+from datetime import datetime, UTC
+from typing import List, Optional
+
+from .serialization import dumps
+
+log = logging.getLogger(__name__)
+
+TRANSCRIPTS_ENABLED = os.getenv("TRANSCRIPTS_ENABLED", "true").lower() in ("1", "true", "yes")
+TRANSCRIPT_DIRECTORY = os.getenv("TRANSCRIPT_DIRECTORY", "transcripts")
+TRANSCRIPT_S3_BUCKET = os.getenv("TRANSCRIPT_S3_BUCKET")
+TRANSCRIPT_S3_PREFIX = os.getenv("TRANSCRIPT_S3_PREFIX", "transcripts/")
+TRANSCRIPT_QUEUE_SIZE = int(os.getenv("TRANSCRIPT_QUEUE_SIZE", "10000"))
+TRANSCRIPT_BATCH_SIZE = 500
+TRANSCRIPT_FLUSH_SECONDS = float(os.getenv("TRANSCRIPT_FLUSH_SECONDS", "5"))
+TRANSCRIPT_SEGMENT_BYTES = int(os.getenv("TRANSCRIPT_SEGMENT_BYTES", str(64 * 1024 * 1024)))
+TRANSCRIPT_SEGMENT_SECONDS = float(os.getenv("TRANSCRIPT_SEGMENT_SECONDS", "3600"))
+
+SEGMENT_SUFFIX = ".jsonl.gz"
+# Suffix of the segment being written, renamed once the segment is complete
+OPEN_SEGMENT_SUFFIX = ".jsonl.gz.part"
+
+
+class TranscriptArchive:
+    """The queue and writer thread archiving the transcripts of a worker."""
+
+    def __init__(
+        self,
+        worker_id: str,
+        directory: str = TRANSCRIPT_DIRECTORY,
+        bucket: Optional[str] = TRANSCRIPT_S3_BUCKET,
+        max_queue: int = TRANSCRIPT_QUEUE_SIZE,
+    ):
+        self.worker_id = worker_id.replace(":", "-")
+        self.directory = directory
+        self.bucket = bucket
+        self.submitted = 0
+        self.dropped = 0
+        self.written = 0
+        self.batches = 0
+        self.segments = 0
+        self.write_errors = 0
+        self.upload_errors = 0
+        self._queue: queue.Queue = queue.Queue(max_queue)
+        self._stopping = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._segment_path: Optional[str] = None
+        self._segment_started_at = 0.0
+        self._segment_bytes = 0
+
+    def start(self):
+        """Start the writer thread."""
+        if self._thread is None:
+            self._thread = threading.Thread(
+                target=self._run, name="transcript-writer", daemon=True
+            )
+            self._thread.start()
+
+    def submit(self, record: dict):
+        """
+        Queue a transcript for archival without blocking.
+
+        Args:
+            record (dict): The transcript.
+
+        Returns:
+            bool: False if the queue is full and the transcript was dropped.
+        """
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+            return False
+        self.submitted += 1
+        return True
+
+    def stop(self, timeout: float = 10):
+        """Write the queued transcripts, complete the current segment and stop the writer thread."""
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _run(self):
+        os.makedirs(self.directory, exist_ok=True)
+        self._complete_abandoned_segments()
+        while not (self._stopping.is_set() and self._queue.empty()):
+            try:
+                batch = self._next_batch()
+                if batch:
+                    self._write(batch)
+                if self._segment_path and (
+                    self._segment_bytes >= TRANSCRIPT_SEGMENT_BYTES
+                    or time.monotonic() - self._segment_started_at
+                    >= TRANSCRIPT_SEGMENT_SECONDS
+                ):
+                    self._rotate()
+            except Exception as exc:  # pylint: disable=broad-except
+                log.error("Error archiving transcripts: %s", exc)
+                time.sleep(TRANSCRIPT_FLUSH_SECONDS)
+        self._rotate()
+
+    def _complete_abandoned_segments(self):
+        # Segments left open by a worker that stopped are complete as far as they go. The segments of live workers
+        # are rotated before they get this old.
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if (
+                name.endswith(OPEN_SEGMENT_SUFFIX)
+                and time.time() - os.path.getmtime(path) > TRANSCRIPT_SEGMENT_SECONDS
+            ):
+                os.replace(path, path.removesuffix(OPEN_SEGMENT_SUFFIX) + SEGMENT_SUFFIX)
+
+    def _next_batch(self):
+        batch: List[dict] = []
+        deadline = time.monotonic() + TRANSCRIPT_FLUSH_SECONDS
+        while len(batch) < TRANSCRIPT_BATCH_SIZE:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or (self._stopping.is_set() and self._queue.empty()):
+                break
+            try:
+                batch.append(self._queue.get(timeout=min(remaining, 0.5)))
+            except queue.Empty:
+                continue
+        return batch
+
+    def _write(self, batch: List[dict]):
+        if self._segment_path is None:
+            started = datetime.now(UTC).strftime("%Y%m%dT%H%M%S")
+            self._segment_path = os.path.join(
+                self.directory, f"{started}-{self.worker_id}{OPEN_SEGMENT_SUFFIX}"
+            )
+            self._segment_started_at = time.monotonic()
+            self._segment_bytes = 0
+
+        data = gzip.compress(b"".join(dumps(record) + b"\n" for record in batch))
+        try:
+            with open(self._segment_path, "ab") as segment:
+                segment.write(data)
+        except OSError as exc:
+            self.write_errors += 1
+            log.error("Error writing %d transcripts: %s", len(batch), exc)
+            return
+        self._segment_bytes += len(data)
+        self.written += len(batch)
+        self.batches += 1
+
+    def _rotate(self):
+        if self._segment_path is not None and os.path.exists(self._segment_path):
+            os.replace(
+                self._segment_path,
+                self._segment_path.removesuffix(OPEN_SEGMENT_SUFFIX) + SEGMENT_SUFFIX,
+            )
+            self.segments += 1
+        self._segment_path = None
+        if self.bucket:
+            self._upload_segments()
+
+    def _upload_segments(self):
+        try:
+            # boto3 is slow to import and only needed when uploading
+            import boto3  # pylint: disable=import-outside-toplevel
+
+            s3 = boto3.client("s3")
+        except Exception as exc:  # pylint: disable=broad-except
+            self.upload_errors += 1
+            log.error("Error creating the S3 client: %s", exc)
+            return
+
+        for name in sorted(os.listdir(self.directory)):
+            if not name.endswith(SEGMENT_SUFFIX):
+                continue
+            path = os.path.join(self.directory, name)
+            key = f"{TRANSCRIPT_S3_PREFIX}date={name[:4]}-{name[4:6]}-{name[6:8]}/{name}"
+            try:
+                s3.upload_file(path, self.bucket, key)
+            except FileNotFoundError:
+                # Uploaded meanwhile by another worker sharing the directory
+                continue
+            except Exception as exc:  # pylint: disable=broad-except
+                self.upload_errors += 1
+                log.error("Error uploading %s, retrying at the next rotation: %s", name, exc)
+                return
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def stats(self):
+        """Get the counters of the archive."""
+        return {
+            "enabled": True,
+            "queued": self._queue.qsize(),
+            "submitted": self.submitted,
+            "dropped": self.dropped,
+            "written": self.written,
+            "batches": self.batches,
+            "segments": self.segments,
+            "write_errors": self.write_errors,
+            "upload_errors": self.upload_errors,
+        }
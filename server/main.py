@@ -15,54 +15,175 @@ The application uses CORS middleware to allow requests from the React app runnin
 The application's routes are all included under the '/api' prefix.
 """
 
+import time
+
+IMPORT_STARTED_AT = time.perf_counter()
+
+# pylint: disable=wrong-import-position
 import os
-from typing import AsyncIterable, List, Union, Dict
+from typing import AsyncIterable, Callable, List, Dict
 import hashlib
 from datetime import timedelta, datetime, UTC
 import asyncio
-import json
 import threading
+from contextlib import asynccontextmanager
 from openai import APIError
 import redis
+import redis.asyncio
 
 from pydantic import BaseModel
 
 
 from fastapi import (
+    BackgroundTasks,
     FastAPI,
     Depends,
     APIRouter,
+    Request,
+    Response,
     WebSocket,
     WebSocketDisconnect,
     HTTPException,
+    Query,
 )
-from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse, StreamingResponse
+from fastapi.responses import ORJSONResponse, PlainTextResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi_login import LoginManager
 from fastapi_login.exceptions import InvalidCredentialsException
-from langchain_openai import ChatOpenAI
-from langchain_core.messages import HumanMessage, SystemMessage, AIMessage
-from langchain.callbacks import AsyncIteratorCallbackHandler
-from websockets import ConnectionClosedError
 import init
 from lib.game_controller import (
     PlayerAlreadyExists,
     add_player_through_join_key,
     get_all_games,
+    list_join_keys,
+    FailedToGenerateUniqueJoinKey,
+    get_game,
+    list_games,
+    DEFAULT_PAGE_SIZE,
+    InvalidCursor,
     create_new_game,
+    create_new_games,
     get_player_info,
     get_game_info,
     start_game,
+    start_games,
     delete_game,
+    delete_games,
     deactivate_game,
+    deactivate_games,
     update_player_level,
     get_level_code,
+    warm_level_cache,
     PlayerNotFound,
     GameNotFound,
 )
 
-from lib.level import LEVELS
+from lib.chat import (
+    LLMUnavailable,
+    get_llm_stats,
+    stream_resilient_completion,
+)
+from lib.coalescing import EventCoalescer
+from lib.export import EXPORT_FORMATS, InvalidExportFormat, stream_export
+from lib.firebase_helper import get_db
+from lib.level import (
+    LEVELS_RELOAD_SECONDS,
+    InvalidLevelConfig,
+    Level,
+    LevelNotFound,
+    get_level,
+    get_levels_info,
+    reload_levels,
+)
+from lib.join_keys import (
+    fill_join_key_pool,
+    get_join_key_pool_stats,
+    release_join_key,
+    release_join_keys,
+)
+from lib.lifecycle import (
+    SWEEP_INTERVAL_SECONDS,
+    get_sweeper_report,
+    purge_game_keys,
+    purge_games_keys,
+    sweep,
+)
+from lib.analytics import (
+    get_level_stats,
+    record_attempt,
+    record_completion,
+    record_leak,
+)
+from lib.leak_detector import LEAK_EARLY_STOP, LeakDetector
+from lib.logs import get_log_stats
+from lib.opener_cache import (
+    PREGENERATED_OPENERS,
+    cacheable_opener,
+    get_opener_cache_stats,
+    opener_cache_key,
+    pregenerate_openers,
+    stream_cached_opener,
+)
+from lib.outbound import ConnectionWriter
+from lib.profiler import (
+    DEFAULT_INTERVAL_SECONDS,
+    MAX_PROFILE_SECONDS,
+    ProfilerBusy,
+    format_folded,
+    sample_stacks,
+)
+from lib.static_assets import StaticAssets
+from lib.startup import DependencyStatus, initialize_dependencies
+from lib.transcripts import TRANSCRIPTS_ENABLED, TranscriptArchive
+from lib.tracing import TracingMiddleware, redis_client_class, span
+from lib.streaming import (
+    EVENT_STREAM_MEDIA_TYPE,
+    STREAM_HEADERS,
+    TEXT_MEDIA_TYPE,
+    stream_events,
+    stream_text,
+    wants_event_stream,
+)
+from lib.serialization import (
+    MSGPACK,
+    EncodedPayload,
+    decode_client_message,
+    loads,
+    negotiate_encoding,
+)
+from lib.presence import (
+    PRESENCE_HEARTBEAT_SECONDS,
+    WORKER_CONTROL_CHANNEL,
+    WORKER_ID,
+    clear_worker,
+    get_presence,
+    heartbeat,
+    player_connected,
+    player_disconnected,
+)
+from lib.events import (
+    GAME_EVENTS_CONSUMERS_KEY,
+    GAME_EVENTS_STREAM,
+    get_event_stats,
+    get_game_event_stats,
+    get_game_version,
+    publish_event,
+    publish_events,
+    read_events,
+    read_game_events,
+    record_consumer_stats,
+    stream_lag_milliseconds,
+    tag_event_id,
+)
+from lib.leaderboard import (
+    DEFAULT_TOP_K,
+    MAX_TOP_K,
+    get_player_rank,
+    get_top_players,
+    leaderboard_is_complete,
+    rebuild_leaderboard,
+    record_player,
+)
 
 log = init.get_logger(__name__)
 
@@ -70,10 +191,96 @@ SECRET_KEY = os.getenv("SECRET_KEY")
 ADMIN_KEY = os.getenv("ADMIN_KEY")
 REDIS_URL = os.getenv("REDIS_URL", "localhost")
 REDIS_PORT = os.getenv("REDIS_PORT", "6379")
-DEFAULT_MODEL_NAME = "gpt-3.5-turbo"
-DEFAULT_TEMPERATURE = 0.6
 
-app = FastAPI()
+
+static_assets = StaticAssets("static")
+
+
+async def load_static_assets():
+    """Load and compress the built frontend, served from disk until then."""
+    try:
+        await asyncio.to_thread(static_assets.load)
+    except OSError as exc:
+        log.error("Error loading static files: %s", exc)
+
+
+async def game_sweeper():
+    """Periodically archive finished and idle games."""
+    while True:
+        await asyncio.sleep(SWEEP_INTERVAL_SECONDS)
+        try:
+            await asyncio.to_thread(sweep, rds_client)
+        except Exception as exc:  # pylint: disable=broad-except
+            log.error("Error sweeping games: %s", exc)
+
+
+async def level_watcher():
+    """Reload the levels when their files change."""
+    while True:
+        await asyncio.sleep(LEVELS_RELOAD_SECONDS)
+        try:
+            await asyncio.to_thread(reload_levels)
+        except Exception as exc:  # pylint: disable=broad-except
+            log.error("Keeping the current levels, the level files are invalid: %s", exc)
+
+
+dependencies = {
+    "redis": DependencyStatus("redis"),
+    "firebase": DependencyStatus("firebase"),
+}
+startup_times = {"import_seconds": None, "ready_seconds": None}
+
+
+async def startup():
+    """Initialize the dependencies of this worker in parallel."""
+    await initialize_dependencies(
+        dependencies, {"redis": rds_client.ping, "firebase": get_db}
+    )
+    startup_times["ready_seconds"] = time.perf_counter() - IMPORT_STARTED_AT
+    try:
+        await asyncio.to_thread(fill_join_key_pool, rds_client, list_join_keys)
+    except Exception as exc:  # pylint: disable=broad-except
+        log.error("Error filling the join key pool: %s", exc)
+    try:
+        warmed = await asyncio.to_thread(warm_level_cache, rds_client)
+        if warmed is not None:
+            log.info("Warmed the level cache of %d active games", warmed)
+    except Exception as exc:  # pylint: disable=broad-except
+        log.error("Error warming the level cache: %s", exc)
+    log.info("Worker %s ready in %.2fs", WORKER_ID, startup_times["ready_seconds"])
+
+
+# Archives the transcripts of the chats streamed by this worker
+transcript_archive = TranscriptArchive(WORKER_ID) if TRANSCRIPTS_ENABLED else None
+
+
+@asynccontextmanager
+async def lifespan(_: FastAPI):
+    """Run the background tasks of this worker for the lifetime of the app."""
+    log.info("Starting worker %s", WORKER_ID)
+    if transcript_archive is not None:
+        transcript_archive.start()
+    tasks = [
+        asyncio.create_task(startup()),
+        asyncio.create_task(load_static_assets()),
+        asyncio.create_task(redis_subscribe()),
+        asyncio.create_task(redis_read_events()),
+        asyncio.create_task(presence_heartbeat()),
+        asyncio.create_task(game_sweeper()),
+        asyncio.create_task(level_watcher()),
+    ]
+    yield
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    clear_worker(rds_client)
+    rds_client.hdel(GAME_EVENTS_CONSUMERS_KEY, WORKER_ID)
+    await async_rds_client.aclose()
+    if transcript_archive is not None:
+        await asyncio.to_thread(transcript_archive.stop)
+
+
+app = FastAPI(default_response_class=ORJSONResponse, lifespan=lifespan)
 
 log.info("Starting FastAPI application")
 
@@ -86,22 +293,15 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Trace-Id"],
 )
+app.add_middleware(TracingMiddleware)
 
 log.info("Redis URL %s:%s", REDIS_URL, REDIS_PORT)
 
-# Try connecting to redis if failed then exit out
-
-try:
-    rds_client = redis.Redis.from_url(f"redis://{REDIS_URL}:{REDIS_PORT}")
-    rds_client.ping()
-except redis.RedisError as error:
-    log.error("Error connecting to Redis: %s", error)
-    exit(1)
-
-log.info("Redis client connected")
-
-connected_clients: Dict[str, List[WebSocket]] = {"admin": [], "players": []}
+# Clients connect lazily, the connection is checked by the startup task
+rds_client = redis_client_class().from_url(f"redis://{REDIS_URL}:{REDIS_PORT}")
+async_rds_client = redis.asyncio.Redis.from_url(f"redis://{REDIS_URL}:{REDIS_PORT}")
 
 connected_players: Dict[str, WebSocket] = {}
 connected_admins: List[WebSocket] = []
@@ -110,10 +310,23 @@ connected_players_lock = threading.Lock()
 connected_admins_lock = threading.Lock()
 
 
-def add_player_connection(player_id: str, websocket: WebSocket):
+async def update_presence(update: Callable[..., None], *args):
+    """Record a change of the players connected to this worker in Redis, without blocking the event loop."""
+    try:
+        await asyncio.to_thread(update, rds_client, *args)
+    except redis.RedisError as exc:
+        # The next heartbeat records the players connected here anyway
+        log.error("Error updating presence: %s", exc)
+
+
+async def add_player_connection(player_id: str, game_key: str, websocket: WebSocket):
     """Add a player connection to the connected players."""
     with connected_players_lock:
+        if connected_players.get(player_id) is websocket:
+            return
         connected_players[player_id] = websocket
+    websocket.state.game_key = game_key
+    await update_presence(player_connected, player_id, game_key)
 
 
 def add_admin_connection(websocket: WebSocket):
@@ -122,7 +335,7 @@ def add_admin_connection(websocket: WebSocket):
         connected_admins.append(websocket)
 
 
-def remove_player_connection_by_ws(websocket: WebSocket):
+async def remove_player_connection_by_ws(websocket: WebSocket):
     """Remove a player connection from the connected players."""
     with connected_players_lock:
         player_id = next(
@@ -130,8 +343,9 @@ def remove_player_connection_by_ws(websocket: WebSocket):
         )
         if player_id:
             connected_players.pop(player_id, None)
-            return player_id
-    return None
+    if player_id:
+        await update_presence(player_disconnected, player_id)
+    return player_id
 
 
 def is_player_connected(player_id: str):
@@ -146,44 +360,188 @@ def remove_admin_connection(websocket: WebSocket):
         connected_admins.remove(websocket)
 
 
-async def safe_send_json(client: WebSocket, data: dict):
-    """Safely send JSON data to a WebSocket client."""
-    try:
-        await client.send_json(data)
-    except (WebSocketDisconnect, ConnectionClosedError) as exc:
-        log.error("Error sending message: %s", exc)
+async def send_payload(client: WebSocket, payload: EncodedPayload):
+    """Send a payload to a WebSocket client in the encoding it negotiated."""
+    if client.state.encoding == MSGPACK:
+        await client.send_bytes(payload.msgpack_bytes)
+    else:
+        await client.send_text(payload.json_text)
 
 
-def redis_subscribe():
-    """Subscribe to Redis channels and broadcast messages to connected clients."""
-    pubsub = rds_client.pubsub()
-    pubsub.subscribe("game_updates", "player_scores")
+async def send_json(client: WebSocket, data: dict):
+    """Serialize data and queue it for a WebSocket client, in order with the broadcasts."""
+    client.state.writer.put(EncodedPayload(data))
 
-    loop = asyncio.new_event_loop()
-    asyncio.set_event_loop(loop)
 
-    async def handle_message():
-        for message in pubsub.listen():
-            if message["type"] == "message":
-                data = json.loads(message["data"])
-                log.debug("Received message: %s", data)
-                tasks = []
+async def receive_json(client: WebSocket):
+    """Receive a message from a WebSocket client and deserialize it."""
+    message = await client.receive()
+    if message["type"] == "websocket.disconnect":
+        raise WebSocketDisconnect(message.get("code", 1000))
+    data = message.get("text")
+    if data is None:
+        data = message["bytes"]
+    return decode_client_message(data, client.state.encoding)
 
-                with connected_players_lock:
-                    for client in connected_players.values():
-                        tasks.append(safe_send_json(client, data))
 
-                with connected_admins_lock:
-                    for client in connected_admins:
-                        tasks.append(safe_send_json(client, data))
+async def accept_client(websocket: WebSocket):
+    """Accept a WebSocket client and record the encoding it requested."""
+    websocket.state.encoding = negotiate_encoding(
+        websocket.query_params.get("encoding")
+    )
+    await websocket.accept()
+    websocket.state.writer = ConnectionWriter(websocket, send_payload)
+
 
-                if tasks:
-                    await asyncio.gather(*tasks)
+def broadcast(payload: EncodedPayload):
+    """
+    Queue a payload for every client connected to this worker.
+
+    Each client is written to by its own writer task, so a slow client only
+    delays itself. Admins that asked for batches get the updates of each
+    game coalesced by admin_coalescer instead.
+    """
+    with connected_players_lock:
+        clients = list(connected_players.values())
+    with connected_admins_lock:
+        batching = any(admin.state.batch for admin in connected_admins)
+        clients.extend(admin for admin in connected_admins if not admin.state.batch)
 
-    loop.run_until_complete(handle_message())
+    for client in clients:
+        client.state.writer.put(payload, droppable=True)
 
+    if batching:
+        data = payload.data
+        game_key = data.get("game_key") if isinstance(data, dict) else None
+        if game_key is None:
+            send_to_batching_admins(payload)
+        else:
+            admin_coalescer.add(game_key, payload.json_bytes)
+
+
+def send_to_batching_admins(payload: EncodedPayload):
+    """Queue a payload for the admins that asked for batched updates."""
+    with connected_admins_lock:
+        admins = [admin for admin in connected_admins if admin.state.batch]
+    for admin in admins:
+        admin.state.writer.put(payload, droppable=True)
+
+
+admin_coalescer = EventCoalescer(send_to_batching_admins)
+
+
+def get_connection_stats():
+    """Get the writer metrics of every client connected to this worker."""
+    with connected_players_lock:
+        players = {
+            player_id: websocket.state.writer.stats()
+            for player_id, websocket in connected_players.items()
+        }
+    with connected_admins_lock:
+        admins = [websocket.state.writer.stats() for websocket in connected_admins]
+    return {
+        "worker_id": WORKER_ID,
+        "players": players,
+        "admins": admins,
+        "admin_batches": admin_coalescer.stats(),
+    }
 
-threading.Thread(target=redis_subscribe, daemon=True).start()
+
+async def handle_worker_control(message: dict):
+    """Handle a control message sent by another worker."""
+    if message.get("type") != "takeover" or message.get("worker_id") == WORKER_ID:
+        return
+
+    # The player reconnected to another worker, drop the stale socket held here
+    with connected_players_lock:
+        websocket = connected_players.pop(message["player_id"], None)
+    if websocket is not None:
+        log.info("Player %s moved to %s", message["player_id"], message["worker_id"])
+        await update_presence(player_disconnected, message["player_id"])
+        await websocket.state.writer.close()
+
+
+async def redis_subscribe():
+    """
+    Subscribe to the control messages workers send each other.
+
+    Game updates are not published here, they are read from the event
+    stream by redis_read_events.
+    """
+    while True:
+        pubsub = async_rds_client.pubsub()
+        try:
+            await pubsub.subscribe(WORKER_CONTROL_CHANNEL)
+            async for message in pubsub.listen():
+                if message["type"] != "message":
+                    continue
+                log.debug("Received message: %s", message["data"])
+                await handle_worker_control(loads(message["data"]))
+        except redis.RedisError as exc:
+            log.error("Redis subscriber error: %s", exc)
+            await asyncio.sleep(1)
+        finally:
+            await pubsub.aclose()
+
+
+EVENT_READ_COUNT = 100
+EVENT_READ_BLOCK_MILLISECONDS = 5000
+event_consumer_stats = {"last_id": None, "read": 0, "lag_ms": None}
+
+
+async def redis_read_events():
+    """
+    Read the global stream of game updates and broadcast them to connected clients.
+
+    Every worker reads the whole stream from where it joined it, and keeps
+    its position across Redis errors so that no update is skipped.
+    """
+    last_id = None
+    while True:
+        try:
+            if last_id is None:
+                last = await async_rds_client.xrevrange(GAME_EVENTS_STREAM, count=1)
+                last_id = last[0][0].decode() if last else "0-0"
+            streams = await async_rds_client.xread(
+                {GAME_EVENTS_STREAM: last_id},
+                count=EVENT_READ_COUNT,
+                block=EVENT_READ_BLOCK_MILLISECONDS,
+            )
+        except redis.RedisError as exc:
+            log.error("Redis event reader error: %s", exc)
+            await asyncio.sleep(1)
+            continue
+
+        for _, entries in streams:
+            for entry_id, fields in entries:
+                last_id = entry_id.decode()
+                # Keep the appended bytes as they are, every client shares them
+                broadcast(
+                    EncodedPayload(json_bytes=tag_event_id(fields[b"data"], last_id))
+                )
+                event_consumer_stats["read"] += 1
+            event_consumer_stats["last_id"] = last_id
+            event_consumer_stats["lag_ms"] = stream_lag_milliseconds(last_id)
+
+
+async def presence_heartbeat():
+    """Periodically refresh the presence of this worker in Redis."""
+    while True:
+        with connected_players_lock:
+            players = {
+                player_id: getattr(websocket.state, "game_key", "")
+                for player_id, websocket in connected_players.items()
+            }
+        with connected_admins_lock:
+            admins = len(connected_admins)
+        try:
+            await asyncio.to_thread(heartbeat, rds_client, players, admins)
+            await asyncio.to_thread(
+                record_consumer_stats, rds_client, WORKER_ID, event_consumer_stats
+            )
+        except redis.RedisError as exc:
+            log.error("Error refreshing presence: %s", exc)
+        await asyncio.sleep(PRESENCE_HEARTBEAT_SECONDS)
 
 
 manager = LoginManager(SECRET_KEY, "/api/admin/login")
@@ -192,7 +550,7 @@ manager = LoginManager(SECRET_KEY, "/api/admin/login")
 @manager.user_loader()
 def load_user(user_id: str):
     """Load user from user_id."""
-    log.info("User loaded: %s", user_id)
+    log.debug("User loaded: %s", user_id)
     return user_id if user_id == "admin" else None
 
 
@@ -208,13 +566,12 @@ class Message(BaseModel):
     message: str
     user: bool
 
-    def to_message(self):
-        """Convert the message to a HumanMessage or AIMessage."""
-        return (
-            HumanMessage(content=self.message)
-            if self.user
-            else AIMessage(content=self.message)
-        )
+    def to_openai_message(self):
+        """Convert the message to an OpenAI user or assistant message."""
+        return {
+            "role": "user" if self.user else "assistant",
+            "content": self.message,
+        }
 
 
 class ChatRequest(BaseModel):
@@ -223,6 +580,7 @@ class ChatRequest(BaseModel):
     messages: List[Message]
     level: int
     game_key: str
+    player_id: str | None = None
 
 
 router = APIRouter()
@@ -234,59 +592,162 @@ def read_root():
     return {"Hello": "World"}
 
 
-def get_system_message(level: int, code: str):
+def get_system_message(level: Level, code: str):
     """Get a system message for the chat assistant."""
-
-    level_obj = LEVELS[int(level) - 1]
-    system_message = level_obj["system_message"] % code
-
-    return SystemMessage(content=system_message)
+    return {"role": "system", "content": level.system_message(code)}
 
 
 async def send_message(
-    all_messages: List[Union[AIMessage, HumanMessage]], level: int, game_key: str
+    all_messages: List[Dict[str, str]],
+    level: Level,
+    game_key: str,
+    player_id: str | None = None,
 ) -> AsyncIterable[str]:
     """Send messages to the chat assistant and yield the responses."""
-    callback = AsyncIteratorCallbackHandler()
-    level_obj = LEVELS[int(level) - 1]
-    model = ChatOpenAI(
-        streaming=True,
-        verbose=True,
-        model=level_obj.get("model", DEFAULT_MODEL_NAME),
-        callbacks=[callback],
-        temperature=level_obj.get("temperature", DEFAULT_TEMPERATURE),
-    )
-
-    code = get_level_code(game_key, str(level), rds_client)
+    code = await asyncio.to_thread(get_level_code, game_key, level.level, rds_client)
 
     log.debug("All messages: %s", all_messages)
 
-    task = asyncio.create_task(
-        model.agenerate(messages=[[get_system_message(level, code), *all_messages]])
-    )
+    def generate():
+        return stream_resilient_completion(
+            [get_system_message(level, code), *all_messages],
+            model=level.model,
+            temperature=level.temperature,
+        )
 
+    opener = cacheable_opener(all_messages) if level.cache_openers else None
+    if opener is None:
+        tokens = generate()
+    else:
+        cache_key = opener_cache_key(level.level, level.prompt, level.model, opener)
+        tokens = stream_cached_opener(async_rds_client, cache_key, code, generate)
+
+    started_at = time.time()
+    first_token_seconds = None
+    response = []
+    status = "incomplete"
+    leak_detector = LeakDetector(code)
+    first_token = span("llm.first_token")
+    with span(f"llm.{level.model}"), first_token:
+        try:
+            async for token in tokens:
+                if first_token_seconds is None:
+                    first_token_seconds = time.time() - started_at
+                first_token.end()
+                response.append(token)
+                yield token
+                if leak_detector.feed(token) and LEAK_EARLY_STOP:
+                    # Closing the stream cancels the completion
+                    await tokens.aclose()
+                    break
+            if leak_detector.finish():
+                await asyncio.to_thread(record_leak, rds_client, game_key, level.level)
+            status = "completed"
+        except (APIError, LLMUnavailable) as exc:
+            status = "error"
+            log.error("Error sending message: %s", exc)
+            yield "Error sending message"
+        except Exception as exc:  # pylint: disable=broad-except
+            # e.g. the connection dropped after the first token, which is not retried
+            status = "error"
+            log.exception("Error streaming message: %s", exc)
+            yield "Error sending message"
+        finally:
+            # Also archives the chats the player left before the answer was complete
+            if transcript_archive is not None:
+                transcript_archive.submit(
+                    {
+                        "game_key": game_key,
+                        "player_id": player_id,
+                        "level": level.level,
+                        "model": level.model,
+                        "messages": all_messages,
+                        "response": "".join(response),
+                        "status": status,
+                        "leaked": leak_detector.leaked,
+                        "cached_opener": opener,
+                        "started_at": started_at,
+                        "first_token_seconds": first_token_seconds,
+                        "duration_seconds": time.time() - started_at,
+                        "worker_id": WORKER_ID,
+                    }
+                )
+
+
+async def pregenerate_level_openers(game_key: str, level: str):
+    """Fill the opener cache of a level that has just started, before its players send their first message."""
     try:
-        async for token in callback.aiter():
-            yield token
-    except APIError as exc:
-        log.error("Error sending message: %s", exc)
-        yield "Error sending message"
-    finally:
-        callback.done.set()
-    await task
+        level_obj = get_level(level)
+        if not level_obj.cache_openers:
+            return
+        code = await asyncio.to_thread(get_level_code, game_key, level, rds_client)
+        generated = await pregenerate_openers(
+            async_rds_client,
+            {
+                opener: opener_cache_key(
+                    level, level_obj.prompt, level_obj.model, opener
+                )
+                for opener in PREGENERATED_OPENERS
+            },
+            code,
+            lambda opener: stream_resilient_completion(
+                [
+                    get_system_message(level_obj, code),
+                    {"role": "user", "content": opener},
+                ],
+                model=level_obj.model,
+                temperature=level_obj.temperature,
+            ),
+        )
+        if generated:
+            log.info("Pregenerated %d opener answers of level %s", generated, level)
+    except Exception as exc:  # pylint: disable=broad-except
+        log.error("Error pregenerating the openers of level %s: %s", level, exc)
+
+
+@router.get("/ready")
+def readiness(response: Response):
+    """Report whether every dependency of this worker is ready."""
+    ready = all(status.ready for status in dependencies.values())
+    if not ready:
+        response.status_code = 503
+    return {
+        "ready": ready,
+        "worker_id": WORKER_ID,
+        "dependencies": {
+            name: status.to_dict() for name, status in dependencies.items()
+        },
+        **startup_times,
+    }
 
 
 @router.post("/stream_chat/")
-async def stream_chat(req: ChatRequest):
+async def stream_chat(req: ChatRequest, request: Request):
     """Stream chat messages to the chat assistant and return the responses."""
-    level = req.level
     game_key = req.game_key
     if len(req.messages) > 40:
         raise HTTPException(status_code=400, detail="Too many messages")
-    generator = send_message(
-        [message.to_message() for message in req.messages], level, game_key
+    try:
+        # Resolved once, a stream keeps its level even if the levels are reloaded meanwhile
+        level = get_level(req.level)
+    except LevelNotFound as exc:
+        raise HTTPException(status_code=404, detail="Level not found") from exc
+    # The client sends the empty reply it is about to fill along with the chat
+    messages = [
+        message.to_openai_message()
+        for message in req.messages
+        if message.user or message.message
+    ]
+    generator = send_message(messages, level, game_key, req.player_id)
+    if wants_event_stream(request.headers.get("accept")):
+        return StreamingResponse(
+            stream_events(generator),
+            media_type=EVENT_STREAM_MEDIA_TYPE,
+            headers=STREAM_HEADERS,
+        )
+    return StreamingResponse(
+        stream_text(generator), media_type=TEXT_MEDIA_TYPE, headers=STREAM_HEADERS
     )
-    return StreamingResponse(generator, media_type="text/event-stream")
 
 
 @router.post("/admin/login")
@@ -316,10 +777,189 @@ def fetch_all_games(_=Depends(manager)):
     return all_games
 
 
+@router.get("/admin/export")
+def export_results(
+    export_format: str = Query("csv", alias="format"),
+    game: List[str] | None = Query(None),
+    status: str | None = None,
+    created_after: datetime | None = None,
+    created_before: datetime | None = None,
+    _=Depends(manager),
+):
+    """Stream one row per player of the selected games, as CSV or newline-delimited JSON."""
+    try:
+        content = stream_export(
+            export_format,
+            join_keys=game,
+            status=status,
+            created_after=to_utc_isoformat(created_after),
+            created_before=to_utc_isoformat(created_before),
+        )
+    except InvalidExportFormat as exc:
+        raise HTTPException(status_code=400, detail="Invalid format") from exc
+    return StreamingResponse(
+        content,
+        media_type=EXPORT_FORMATS[export_format],
+        headers={"Content-Disposition": f"attachment; filename=results.{export_format}"},
+    )
+
+
+@router.get("/admin/games/summary")
+def fetch_game_summaries(
+    limit: int = DEFAULT_PAGE_SIZE,
+    cursor: str | None = None,
+    status: str | None = None,
+    created_after: datetime | None = None,
+    created_before: datetime | None = None,
+    _=Depends(manager),
+):
+    """Fetch one page of game summaries, newest first."""
+    try:
+        return list_games(
+            limit=limit,
+            cursor=cursor,
+            status=status,
+            created_after=to_utc_isoformat(created_after),
+            created_before=to_utc_isoformat(created_before),
+        )
+    except InvalidCursor as exc:
+        raise HTTPException(status_code=400, detail="Invalid cursor") from exc
+
+
+@router.get("/admin/games/{game_key}")
+def fetch_game(game_key: str, _=Depends(manager)):
+    """Fetch the full details of a game."""
+    try:
+        return get_game(game_key)
+    except GameNotFound as exc:
+        raise HTTPException(status_code=404, detail="Game not found") from exc
+
+
+@router.get("/admin/games/{game_key}/leaderboard")
+def fetch_game_leaderboard(game_key: str, limit: int = MAX_TOP_K, _=Depends(manager)):
+    """Fetch the top players of a game."""
+    try:
+        return fetch_leaderboard(game_key, None, limit)
+    except GameNotFound as exc:
+        raise HTTPException(status_code=404, detail="Game not found") from exc
+
+
+def to_utc_isoformat(value: datetime | None):
+    """Format a datetime like the created_at of games, assuming UTC if naive."""
+    if value is None:
+        return None
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=UTC)
+    return value.astimezone(UTC).isoformat()
+
+
+@router.get("/admin/sweeper")
+def fetch_sweeper_report(_=Depends(manager)):
+    """Fetch the report of the last game sweep and the totals of all sweeps."""
+    return get_sweeper_report(rds_client)
+
+
+@router.post("/admin/sweeper/run")
+def run_sweeper(_=Depends(manager)):
+    """Archive every finished and idle game now."""
+    return sweep(rds_client, force=True)
+
+
+@router.get("/admin/join-keys")
+def fetch_join_key_pool_stats(_=Depends(manager)):
+    """Fetch the fill level of the pool of free join keys."""
+    return get_join_key_pool_stats(rds_client)
+
+
+@router.get("/admin/events")
+def fetch_event_stats(game_key: str | None = None, _=Depends(manager)):
+    """Fetch the length of the event log and how far behind each worker reading it is."""
+    if game_key:
+        return get_game_event_stats(rds_client, game_key)
+    return get_event_stats(rds_client)
+
+
+@router.get("/admin/analytics/levels")
+def fetch_level_stats(game_key: str | None = None, _=Depends(manager)):
+    """Fetch the attempts, completions and solve time quantiles of each level, of a game or of every game."""
+    return get_level_stats(rds_client, game_key)
+
+
+@router.get("/admin/profile", response_class=PlainTextResponse)
+async def profile(
+    seconds: float = 10,
+    interval: float = DEFAULT_INTERVAL_SECONDS,
+    _=Depends(manager),
+):
+    """
+    Sample the stacks of this worker for a number of seconds.
+
+    Returns the profile in the folded format of flame graph tools.
+    """
+    if not 0 < seconds <= MAX_PROFILE_SECONDS or not 0.001 <= interval <= 1:
+        raise HTTPException(status_code=400, detail="Invalid profile duration")
+    try:
+        stacks = await asyncio.to_thread(sample_stacks, seconds, interval)
+    except ProfilerBusy as exc:
+        raise HTTPException(status_code=409, detail=str(exc)) from exc
+    return PlainTextResponse(format_folded(stacks))
+
+
+@router.get("/admin/levels")
+def fetch_levels(_=Depends(manager)):
+    """Fetch the version of the levels loaded by this worker and the settings of each level."""
+    return get_levels_info()
+
+
+@router.post("/admin/levels/reload")
+def action_reload_levels(_=Depends(manager)):
+    """Reload the level files of this worker."""
+    try:
+        reload_levels(force=True)
+    except (InvalidLevelConfig, OSError, ValueError) as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+    return get_levels_info()
+
+
+@router.get("/admin/llm")
+def fetch_llm_stats(_=Depends(manager)):
+    """Fetch the circuit breaker state, retries and fallbacks of each model, and the opener cache hits of this worker."""
+    return {**get_llm_stats(), "opener_cache": get_opener_cache_stats()}
+
+
+@router.get("/admin/transcripts")
+def fetch_transcript_stats(_=Depends(manager)):
+    """Fetch the number of chat transcripts queued, archived and dropped by this worker."""
+    if transcript_archive is None:
+        return {"enabled": False}
+    return transcript_archive.stats()
+
+
+@router.get("/admin/logs")
+def fetch_log_stats(_=Depends(manager)):
+    """Fetch the number of log records queued and dropped by this worker."""
+    return get_log_stats()
+
+
+@router.get("/admin/connections")
+def fetch_connection_stats(_=Depends(manager)):
+    """Fetch the outgoing queue metrics of every client connected to this worker."""
+    return get_connection_stats()
+
+
+@router.get("/admin/presence")
+def fetch_presence(_=Depends(manager)):
+    """Fetch the players and admins connected to every worker."""
+    return get_presence(rds_client)
+
+
 @router.post("/admin/games")
 def action_create_game(_=Depends(manager)):
     """Create a new game."""
-    join_key = create_new_game(rds_client)
+    try:
+        join_key = create_new_game(rds_client)
+    except FailedToGenerateUniqueJoinKey as exc:
+        raise HTTPException(status_code=503, detail="No join key available") from exc
     return {"join_key": join_key}
 
 
@@ -327,7 +967,7 @@ def action_create_game(_=Depends(manager)):
 def action_delete_game(data: dict, _=Depends(manager)):
     """Delete a game."""
     game_key = data.get("game_key")
-    print("Delete game request: game_key", game_key)
+    log.info("Delete game request: game_key %s", game_key)
     try:
         delete_game(game_key)
 
@@ -337,7 +977,9 @@ def action_delete_game(data: dict, _=Depends(manager)):
             "game_key": game_key,
         }
 
-        rds_client.publish("game_updates", json.dumps(message))
+        publish_event(rds_client, message)
+        purge_game_keys(rds_client, game_key)
+        release_join_key(rds_client, game_key)
 
         return {"message": "Game deleted"}
     except GameNotFound as exc:
@@ -358,7 +1000,7 @@ def action_deactivate_game(data: dict, _=Depends(manager)):
             "game_key": game_key,
         }
 
-        rds_client.publish("game_updates", json.dumps(message))
+        publish_event(rds_client, message)
         return {"message": "Game deactivated"}
     except GameNotFound as exc:
         raise HTTPException(status_code=404, detail="Game not found") from exc
@@ -367,12 +1009,15 @@ def action_deactivate_game(data: dict, _=Depends(manager)):
 
 
 @router.post("/admin/game/start")
-def start_game_level(data: dict, _=Depends(manager)):
+def start_game_level(
+    data: dict, background_tasks: BackgroundTasks, _=Depends(manager)
+):
     """Start a game level."""
     game_key = data.get("game_key")
     level = data.get("level")
     try:
         started_at = start_game(game_key, level)
+        background_tasks.add_task(pregenerate_level_openers, game_key, level)
 
         message = {
             "type": "game_update",
@@ -381,7 +1026,7 @@ def start_game_level(data: dict, _=Depends(manager)):
             "level": level,
             "started_at": started_at,
         }
-        rds_client.publish("game_updates", json.dumps(message))
+        publish_event(rds_client, message)
     except GameNotFound as exc:
         raise HTTPException(status_code=404, detail="Game not found") from exc
     except ValueError as exc:
@@ -390,40 +1035,129 @@ def start_game_level(data: dict, _=Depends(manager)):
         raise HTTPException(status_code=500, detail="Internal server error") from exc
 
 
+def get_bulk_game_keys(data: dict):
+    """Get the join keys of the games targeted by a bulk admin request."""
+    game_keys = data.get("game_keys")
+    if not isinstance(game_keys, list) or not all(
+        isinstance(game_key, str) for game_key in game_keys
+    ):
+        raise HTTPException(status_code=400, detail="game_keys must be a list of join keys")
+    return game_keys
+
+
+@router.post("/admin/games/bulk")
+def action_create_games(data: dict, _=Depends(manager)):
+    """Create several games."""
+    try:
+        join_keys = create_new_games(rds_client, int(data.get("count", 1)))
+    except (TypeError, ValueError) as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+    except FailedToGenerateUniqueJoinKey as exc:
+        raise HTTPException(status_code=503, detail="No join key available") from exc
+    return {"join_keys": join_keys}
+
+
+@router.post("/admin/games/bulk/start")
+def action_start_games(
+    data: dict, background_tasks: BackgroundTasks, _=Depends(manager)
+):
+    """Start the same level in several games."""
+    game_keys = get_bulk_game_keys(data)
+    level = data.get("level")
+    try:
+        result = start_games(game_keys, level)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+
+    # The answers are shared by every game, the code of one of them is enough to check them
+    if result["game_keys"]:
+        background_tasks.add_task(
+            pregenerate_level_openers, result["game_keys"][0], level
+        )
+
+    publish_events(
+        rds_client,
+        [
+            {
+                "type": "game_update",
+                "action": "start",
+                "game_key": game_key,
+                "level": level,
+                "started_at": result["started_at"],
+            }
+            for game_key in result["game_keys"]
+        ],
+    )
+    return result
+
+
+@router.post("/admin/games/bulk/deactivate")
+def action_deactivate_games(data: dict, _=Depends(manager)):
+    """Deactivate several games."""
+    result = deactivate_games(get_bulk_game_keys(data))
+    publish_events(
+        rds_client,
+        [
+            {"type": "game_update", "action": "deactivate", "game_key": game_key}
+            for game_key in result["game_keys"]
+        ],
+    )
+    return result
+
+
+@router.post("/admin/games/bulk/delete")
+def action_delete_games(data: dict, _=Depends(manager)):
+    """Delete several games."""
+    result = delete_games(get_bulk_game_keys(data))
+    publish_events(
+        rds_client,
+        [
+            {"type": "game_update", "action": "delete", "game_key": game_key}
+            for game_key in result["game_keys"]
+        ],
+    )
+    purge_games_keys(rds_client, result["game_keys"])
+    release_join_keys(rds_client, result["game_keys"])
+    return result
+
+
 @router.websocket("/ws/player")
 async def websocket_player_endpoint(websocket: WebSocket):
     """Handle player websocket connections."""
-    await websocket.accept()
+    await accept_client(websocket)
     log.info("Player connected")
     try:
         while True:
-            data = await websocket.receive_json()
+            data = await receive_json(websocket)
             try:
                 if data.get("player_id") is None:
                     raise PlayerNotFound("Player not found")
                 player_id = data["player_id"]
-                add_player_connection(player_id, websocket)
+                await add_player_connection(player_id, data.get("game_id") or "", websocket)
                 response = await handle_player_requests(data)
-                await websocket.send_json(response)
+                await send_json(websocket, response)
             except HTTPException as exc:
-                await websocket.send_json(
+                await send_json(
+                    websocket,
                     {
                         "type": "error",
                         "error": exc.detail,
                         "status_code": exc.status_code,
-                    }
+                    },
                 )
             except (GameNotFound, PlayerNotFound) as exc:
                 log.info("Player not found: %s", exc)
-                await websocket.send_json(
-                    {"type": "error", "error": str(exc), "status_code": 404}
+                await send_json(
+                    websocket, {"type": "error", "error": str(exc), "status_code": 404}
                 )
-                await websocket.close()
-                remove_player_connection_by_ws(websocket)
+                await remove_player_connection_by_ws(websocket)
+                await websocket.state.writer.close(flush=True)
                 return
     except WebSocketDisconnect:
         log.info("Player disconnected")
-        remove_player_connection_by_ws(websocket)
+        await remove_player_connection_by_ws(websocket)
+    finally:
+        websocket.state.writer.stop()
 
 
 async def handle_player_requests(data: dict):
@@ -433,6 +1167,12 @@ async def handle_player_requests(data: dict):
     match request_type:
         case "connect":
             return await handle_player_connect(data)
+        case "sync":
+            return await handle_player_sync(data)
+        case "leaderboard":
+            return await handle_player_leaderboard(data)
+        case "ping":
+            return {"type": "pong"}
         # default case raises an error
         case _:
             raise HTTPException(status_code=400, detail="Invalid request type")
@@ -452,8 +1192,72 @@ async def handle_player_connect(data: dict):
         "player": player_info,
         "game_key": game_id,
     }
-    rds_client.publish("game_updates", json.dumps(message))
-    return {"type": "connect", "player": player_info, "game": get_game_info(game_id)}
+    publish_event(rds_client, message)
+    return {"type": "connect", "player": player_info, **get_game_snapshot(game_id)}
+
+
+async def handle_player_sync(data: dict):
+    """
+    Handle player sync requests.
+
+    Clients send the last version they applied after detecting a gap in the
+    update versions or reconnecting. They get the updates they missed, or a
+    full snapshot if some of them are no longer in the event log.
+    """
+    game_id = data.get("game_id")
+    player_id = data.get("player_id")
+    version = data.get("version")
+    if isinstance(version, int):
+        events = read_game_events(rds_client, game_id, version)
+        if events == []:
+            return {"type": "sync", "game_key": game_id, "version": version}
+        if events is not None:
+            return {
+                "type": "replay",
+                "game_key": game_id,
+                "version": events[-1]["version"],
+                "events": events,
+            }
+
+    player_info = get_player_info(game_id, player_id, active_only=True)
+    if player_info is None:
+        raise PlayerNotFound("Player not found")
+    return {"type": "snapshot", "player": player_info, **get_game_snapshot(game_id)}
+
+
+def get_game_snapshot(game_key: str):
+    """
+    Get a full snapshot of a game together with its state version.
+
+    The version is read before the game so that any update racing with the
+    read carries a higher version and is still applied by the client.
+    """
+    version = get_game_version(rds_client, game_key)
+    return {"game": get_game_info(game_key), "version": version}
+
+
+async def handle_player_leaderboard(data: dict):
+    """Handle player leaderboard requests."""
+    game_id = data.get("game_id")
+    player_id = data.get("player_id")
+    limit = data.get("limit", DEFAULT_TOP_K)
+    if not isinstance(limit, int) or isinstance(limit, bool):
+        raise HTTPException(status_code=400, detail="Invalid limit")
+    leaderboard = await asyncio.to_thread(fetch_leaderboard, game_id, player_id, limit)
+    return {"type": "leaderboard", **leaderboard}
+
+
+def fetch_leaderboard(game_key: str, player_id: str | None, limit: int):
+    """Fetch the top players of a game and the rank of the given player, if any."""
+    if not leaderboard_is_complete(rds_client, game_key):
+        game_info = get_game_info(game_key)
+        rebuild_leaderboard(rds_client, game_key, game_info["players"])
+
+    return {
+        "game_key": game_key,
+        "top": get_top_players(rds_client, game_key, limit),
+        "player": get_player_rank(rds_client, game_key, player_id) if player_id else None,
+    }
 
 
 @router.post("/game/join")
@@ -465,6 +1269,7 @@ def join_game(data: dict):
         game_id, player_id = add_player_through_join_key(
             game_key, player_name, active_only=True
         )
+        record_player(rds_client, game_id, player_id, player_name, 1, 0)
         return {"game_id": game_id, "player_id": player_id}
     except GameNotFound as exc:
         raise HTTPException(status_code=404, detail="Game not found") from exc
@@ -477,26 +1282,68 @@ def join_game(data: dict):
 @router.get("/game")
 def get_game_and_player(game_key: str, player_id: str):
     player_info = get_player_info(game_key, player_id)
-    game_info = get_game_info(game_key)
     if player_info is None:
         raise HTTPException(status_code=404, detail="Player not found")
-    if game_info is None:
-        raise HTTPException(status_code=404, detail="Game not found")
-    return {"player": player_info, "game": game_info}
+    try:
+        return {"player": player_info, **get_game_snapshot(game_key)}
+    except GameNotFound as exc:
+        raise HTTPException(status_code=404, detail="Game not found") from exc
+
+
+@router.get("/game/leaderboard")
+def get_game_leaderboard(game_key: str, player_id: str, limit: int = DEFAULT_TOP_K):
+    """Get the top players of a game and the rank of the given player."""
+    try:
+        return fetch_leaderboard(game_key, player_id, limit)
+    except GameNotFound as exc:
+        raise HTTPException(status_code=404, detail="Game not found") from exc
 
 
 @router.websocket("/ws/admin")
 async def websocket_admin_endpoint(websocket: WebSocket):
     """Handle admin websocket connections."""
-    await websocket.accept()
+    await accept_client(websocket)
+    # Batched admins get the updates of each game coalesced in batch messages
+    websocket.state.batch = (
+        admin_coalescer.enabled and websocket.query_params.get("batch") == "1"
+    )
     log.info("Admin connected")
     add_admin_connection(websocket)
     try:
         while True:
-            await websocket.receive_text()
+            try:
+                data = await receive_json(websocket)
+            except ValueError:
+                continue
+            if not isinstance(data, dict):
+                continue
+            if data.get("type") == "resume":
+                await send_json(websocket, handle_admin_resume(data))
+            elif data.get("type") == "ping":
+                await send_json(websocket, {"type": "pong"})
     except WebSocketDisconnect:
         log.info("Admin disconnected")
         remove_admin_connection(websocket)
+    finally:
+        websocket.state.writer.stop()
+
+
+def handle_admin_resume(data: dict):
+    """
+    Handle admin resume requests.
+
+    Reconnecting admins send the event_id of the last update they applied.
+    They get the updates they missed, or a resync if some of them are no
+    longer in the event log and the games must be fetched again.
+    """
+    after = data.get("after")
+    try:
+        events = read_events(rds_client, after) if isinstance(after, str) else None
+    except ValueError:
+        events = None
+    if events is None:
+        return {"type": "resync"}
+    return {"type": "replay", "events": events}
 
 
 def calculate_score(started_at: str):
@@ -516,38 +1363,53 @@ def gauss_code(data: dict):
 
     player_info = get_player_info(game_key, player_id)
     if player_info is None:
-        print("GUESS_CODE: Player not found")
+        log.warning("Guess for game %s: Player not found", game_key)
         raise HTTPException(status_code=404, detail="Player not found")
 
     guess = data.get("guess")
     level = str(player_info.get("level"))
 
-    game_info = get_game_info(game_key)
-    if game_info is None:
-        print("GUESS_CODE: Game not found")
-        raise HTTPException(status_code=404, detail="Game not found")
+    try:
+        game_info = get_game_info(game_key)
+    except GameNotFound as exc:
+        log.warning("Guess for game %s: Game not found", game_key)
+        raise HTTPException(status_code=404, detail="Game not found") from exc
 
     if level not in game_info["levels"]:
-        print("GUESS_CODE: Invalid level")
+        log.warning("Guess for game %s: Invalid level", game_key)
         raise HTTPException(status_code=400, detail="Invalid level")
 
     level_info = game_info["levels"][level]
     if not level_info["started"]:
-        print("GUESS_CODE: Level not started")
+        log.warning("Guess for game %s: Level not started", game_key)
         raise HTTPException(status_code=400, detail="Level not started")
 
+    record_attempt(rds_client, game_key, int(level))
     if get_level_code(game_key, level, rds_client) == guess:
         score = calculate_score(level_info["started_at"])
         level = int(level) + 1
-        update_player_level(game_key, player_id, level, score)
+        try:
+            if not update_player_level(game_key, player_id, level, score):
+                # The same guess was already accepted, maybe by another worker
+                return {"message": "Correct guess", "correct": True}
+        except (GameNotFound, PlayerNotFound) as exc:
+            # The game was deleted since it was read
+            log.warning("Guess for game %s: %s", game_key, type(exc).__name__)
+            raise HTTPException(status_code=404, detail="Game not found") from exc
+        record_completion(rds_client, game_key, level - 1, score)
+        total_time = sum(player_info.get("score", {}).values()) + score
+        record_player(
+            rds_client, game_key, player_id, player_info["name"], level, total_time
+        )
         message = {
             "type": "player_update",
             "action": "level_complete",
             "player_id": player_id,
             "game_key": game_key,
             "level": level,
+            "score": score,
         }
-        rds_client.publish("game_updates", json.dumps(message))
+        publish_event(rds_client, message)
         return {"message": "Correct guess", "correct": True}
     else:
         return {"message": "Incorrect guess", "correct": False}
@@ -555,11 +1417,12 @@ def gauss_code(data: dict):
 
 app.include_router(router, prefix="/api")
 
-app.mount("/assets", StaticFiles(directory="static/assets", html=True), name="static")
+# add a catch all route
+@app.api_route("/{catch_all:path}", methods=["GET", "HEAD"])
+def catch_all(catch_all: str, request: Request):
+    """Catch all route to serve the built frontend, index.html for the routes of the app."""
+    return static_assets.response(request, catch_all)
 
 
-# add a catch all route
-@app.get("/{catch_all:path}")
-def catch_all(catch_all: str):
-    """Catch all route to serve the index.html file."""
-    return FileResponse("static/index.html")
+startup_times["import_seconds"] = time.perf_counter() - IMPORT_STARTED_AT
+log.info("Imported in %.2fs", startup_times["import_seconds"])
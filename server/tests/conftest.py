@@ -0,0 +1,42 @@
+"""
+Shared setup of the server tests.
+
+Redis is replaced by fakeredis before main is imported, so that the module-level clients of main and every worker
+simulated by a test share one in-memory server. Firestore is never reached: the tests replace the game controller
+functions they need.
+"""
+
+import os
+import sys
+
+import fakeredis
+import pytest
+import redis
+import redis.asyncio
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+os.environ.setdefault("SECRET_KEY", "test-secret")
+os.environ.setdefault("OPENAI_API_KEY", "sk-test")
+os.environ.setdefault("TRANSCRIPTS_ENABLED", "false")
+
+REDIS_SERVER = fakeredis.FakeServer()
+redis.Redis.from_url = classmethod(
+    lambda cls, *args, **kwargs: fakeredis.FakeRedis(server=REDIS_SERVER)
+)
+redis.asyncio.Redis.from_url = classmethod(
+    lambda cls, *args, **kwargs: fakeredis.FakeAsyncRedis(server=REDIS_SERVER)
+)
+
+import main  # pylint: disable=wrong-import-position
+
+
+@pytest.fixture(autouse=True)
+def clean_state():
+    """Start every test with an empty Redis and no connected clients."""
+    main.rds_client.flushall()
+    main.connected_players.clear()
+    main.connected_admins.clear()
+    yield
+    main.connected_players.clear()
+    main.connected_admins.clear()
@@ -0,0 +1,125 @@
+"""Tests of the delivery of game updates to the clients of several workers."""
+
+import asyncio
+import threading
+from types import SimpleNamespace
+
+import redis
+
+import main
+from lib.events import publish_event, read_game_events
+from lib.presence import WORKER_ID, get_presence, heartbeat, player_connected
+from lib.serialization import EncodedPayload, loads
+
+
+class FakeWriter:
+    """Records the payloads queued for a client instead of sending them."""
+
+    def __init__(self):
+        self.payloads = []
+        self.closed = False
+
+    def put(self, payload, droppable=False):
+        self.payloads.append(payload)
+        return True
+
+    async def close(self, code=1000, flush=False):
+        self.closed = True
+
+
+def fake_socket(batch=False):
+    return SimpleNamespace(state=SimpleNamespace(writer=FakeWriter(), batch=batch))
+
+
+def test_broadcast_queues_one_shared_payload_for_every_client():
+    players = {player_id: fake_socket() for player_id in ("a", "b")}
+    admin = fake_socket()
+    main.connected_players.update(players)
+    main.connected_admins.append(admin)
+
+    payload = EncodedPayload({"type": "player_update", "game_key": "1234"})
+    main.broadcast(payload)
+
+    for client in [*players.values(), admin]:
+        assert len(client.state.writer.payloads) == 1
+        assert client.state.writer.payloads[0] is payload
+
+
+def test_batching_admins_get_the_updates_of_each_game_in_order():
+    batching, plain = fake_socket(batch=True), fake_socket()
+    main.connected_admins.extend([batching, plain])
+
+    async def burst():
+        for index in range(6):
+            game_key = "1111" if index % 2 else "2222"
+            main.broadcast(EncodedPayload({"game_key": game_key, "index": index}))
+        await asyncio.sleep(main.admin_coalescer.window_seconds * 2)
+
+    asyncio.run(burst())
+
+    assert len(plain.state.writer.payloads) == 6
+    batches = [loads(payload.json_bytes) for payload in batching.state.writer.payloads]
+    indexes = {batch["game_key"]: [event["index"] for event in batch["events"]] for batch in batches}
+    assert indexes == {"2222": [0, 2, 4], "1111": [1, 3, 5]}
+
+
+def test_concurrent_publishers_produce_consecutive_versions():
+    def publish(worker):
+        for index in range(25):
+            publish_event(main.rds_client, {"game_key": "1234", "worker": worker, "index": index})
+
+    threads = [threading.Thread(target=publish, args=(worker,)) for worker in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    events = read_game_events(main.rds_client, "1234", 0)
+    assert [event["version"] for event in events] == list(range(1, 101))
+
+
+def test_players_are_located_on_their_worker():
+    heartbeat(main.rds_client, {}, 0)
+    player_connected(main.rds_client, "player", "1234")
+
+    assert get_presence(main.rds_client)["games"] == {"1234": {"player": WORKER_ID}}
+
+
+def test_takeover_by_another_worker_closes_the_stale_socket():
+    socket = fake_socket()
+    main.connected_players["player"] = socket
+
+    asyncio.run(
+        main.handle_worker_control(
+            {"type": "takeover", "player_id": "player", "worker_id": "other:1"}
+        )
+    )
+
+    assert "player" not in main.connected_players
+    assert socket.state.writer.closed
+
+
+def test_takeover_announced_by_this_worker_is_ignored():
+    socket = fake_socket()
+    main.connected_players["player"] = socket
+
+    asyncio.run(
+        main.handle_worker_control(
+            {"type": "takeover", "player_id": "player", "worker_id": WORKER_ID}
+        )
+    )
+
+    assert main.connected_players["player"] is socket
+
+
+def test_presence_errors_do_not_drop_the_connection(monkeypatch):
+    def player_connected_failing(rds_client, player_id, join_key):
+        raise redis.RedisError("Connection refused")
+
+    monkeypatch.setattr(main, "player_connected", player_connected_failing)
+    socket = fake_socket()
+
+    asyncio.run(main.add_player_connection("player", "1234", socket))
+
+    assert main.connected_players["player"] is socket
+    assert not socket.state.writer.closed
@@ -0,0 +1,121 @@
+"""Tests of the transitions of the circuit breaker and of how completions report to it."""
+
+import asyncio
+
+import httpx
+import openai
+import pytest
+
+from lib import chat, circuit_breaker
+from lib.circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker
+
+
+class Clock:
+    """A monotonic clock moved by hand."""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(circuit_breaker.time, "monotonic", clock)
+    return clock
+
+
+def open_breaker(clock):
+    breaker = CircuitBreaker("model", failure_threshold=2, open_seconds=30)
+    for _ in range(2):
+        assert breaker.allow()
+        breaker.record_failure()
+    return breaker
+
+
+def test_breaker_opens_after_the_failure_threshold(clock):
+    breaker = open_breaker(clock)
+
+    assert breaker.state == OPEN
+    assert not breaker.allow()
+    assert breaker.stats()["rejected"] == 1
+
+
+def test_half_open_breaker_lets_a_single_trial_through(clock):
+    breaker = open_breaker(clock)
+    clock.now += 30
+
+    assert breaker.state == HALF_OPEN
+    assert breaker.allow()
+    assert not breaker.allow()
+
+
+def test_successful_trial_closes_the_breaker(clock):
+    breaker = open_breaker(clock)
+    clock.now += 30
+    breaker.allow()
+
+    breaker.record_success()
+
+    assert breaker.state == CLOSED
+    assert breaker.consecutive_failures == 0
+
+
+def test_failed_trial_opens_the_breaker_again(clock):
+    breaker = open_breaker(clock)
+    clock.now += 30
+    breaker.allow()
+
+    breaker.record_failure()
+
+    assert breaker.state == OPEN
+    assert breaker.times_opened == 2
+    clock.now += 29
+    assert not breaker.allow()
+
+
+def test_abandoned_trial_is_given_up_on_after_the_open_time(clock):
+    breaker = open_breaker(clock)
+    clock.now += 30
+    breaker.allow()
+
+    clock.now += 30
+
+    assert breaker.allow()
+
+
+def test_released_trial_leaves_the_breaker_half_open(clock):
+    breaker = open_breaker(clock)
+    clock.now += 30
+    breaker.allow()
+
+    breaker.release()
+
+    assert breaker.state == HALF_OPEN
+    assert breaker.consecutive_failures == 2
+    assert breaker.allow()
+
+
+def test_rejected_request_is_not_counted_as_a_success(clock, monkeypatch):
+    breaker = open_breaker(clock)
+    clock.now += 30
+    monkeypatch.setitem(chat.breakers, "model", breaker)
+
+    async def rejected(*args, **kwargs):
+        request = httpx.Request("POST", "https://api.openai.com/v1/chat/completions")
+        raise openai.BadRequestError("Invalid request", response=httpx.Response(400, request=request), body=None)
+        yield  # pylint: disable=unreachable
+
+    monkeypatch.setattr(chat, "stream_completion", rejected)
+
+    async def complete():
+        return [token async for token in chat.stream_resilient_completion([], model="model", fallback_model=None)]
+
+    with pytest.raises(openai.BadRequestError):
+        asyncio.run(complete())
+
+    assert breaker.state == HALF_OPEN
+    assert breaker.consecutive_failures == 2
+    assert breaker.allow()
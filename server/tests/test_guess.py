@@ -0,0 +1,111 @@
+"""Tests of the guess endpoint, with the game controller replaced by an in-memory game."""
+
+from datetime import datetime, UTC
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from lib.analytics import get_level_stats
+from lib.events import read_game_events
+from lib.game_controller import GameNotFound
+from lib.leaderboard import get_player_rank
+
+GAME_KEY = "1234"
+PLAYER_ID = "player"
+CODE = "SPHINX"
+
+
+@pytest.fixture
+def game(monkeypatch):
+    """A game whose first level is started, with one player on it."""
+    state = {"level": 1, "started": True}
+
+    def update_player_level(join_key, player_id, level, score):
+        # Like the Firestore transaction, a level is only completed once
+        if state["level"] >= level:
+            return False
+        state["level"] = level
+        return True
+
+    monkeypatch.setattr(
+        main,
+        "get_player_info",
+        lambda join_key, player_id: {"level": state["level"], "name": "ann", "score": {}},
+    )
+    monkeypatch.setattr(
+        main,
+        "get_game_info",
+        lambda join_key: {
+            "levels": {
+                "1": {
+                    "started": state["started"],
+                    "started_at": datetime.now(UTC).isoformat(),
+                }
+            }
+        },
+    )
+    monkeypatch.setattr(main, "get_level_code", lambda join_key, level, rds_client: CODE)
+    monkeypatch.setattr(main, "update_player_level", update_player_level)
+    return state
+
+
+@pytest.fixture
+def client():
+    return TestClient(main.app)
+
+
+def guess(client, code):
+    return client.post(
+        "/api/game/guess",
+        json={"game_key": GAME_KEY, "player_id": PLAYER_ID, "guess": code},
+    )
+
+
+def test_correct_guess_completes_the_level_and_publishes_it(game, client):
+    response = guess(client, CODE)
+
+    assert response.json()["correct"] is True
+    assert game["level"] == 2
+    events = read_game_events(main.rds_client, GAME_KEY, 0)
+    assert [(event["action"], event["level"]) for event in events] == [("level_complete", 2)]
+    assert get_player_rank(main.rds_client, GAME_KEY, PLAYER_ID)["level"] == 2
+    assert get_level_stats(main.rds_client, GAME_KEY)["1"]["completions"] == 1
+
+
+def test_guess_accepted_twice_publishes_one_update(game, client, monkeypatch):
+    # Both requests read the player before either completes the level, as on two workers
+    monkeypatch.setattr(
+        main,
+        "get_player_info",
+        lambda join_key, player_id: {"level": 1, "name": "ann", "score": {}},
+    )
+
+    assert guess(client, CODE).json()["correct"] is True
+    assert guess(client, CODE).json()["correct"] is True
+
+    assert len(read_game_events(main.rds_client, GAME_KEY, 0)) == 1
+
+
+def test_incorrect_guess_is_counted_but_not_published(game, client):
+    response = guess(client, "WRONG")
+
+    assert response.json()["correct"] is False
+    assert game["level"] == 1
+    assert read_game_events(main.rds_client, GAME_KEY, 0) == []
+    assert get_level_stats(main.rds_client, GAME_KEY)["1"]["attempts"] == 1
+
+
+def test_guess_before_the_level_starts_is_rejected(game, client):
+    game["started"] = False
+
+    assert guess(client, CODE).status_code == 400
+
+
+def test_guess_in_a_missing_game_is_not_found(game, client, monkeypatch):
+    def get_game_info(join_key):
+        raise GameNotFound
+
+    monkeypatch.setattr(main, "get_game_info", get_game_info)
+
+    assert guess(client, CODE).status_code == 404
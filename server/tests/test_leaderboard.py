@@ -0,0 +1,37 @@
+"""Tests of the leaderboard rebuilt from a game read before concurrent updates."""
+
+import main
+from lib.leaderboard import get_player_rank, get_top_players, rebuild_leaderboard, record_player
+
+GAME_KEY = "1234"
+
+
+def test_rebuild_keeps_players_recorded_after_the_game_was_read():
+    players = {
+        "ann": {"name": "ann", "level": 2, "score": {"1": 30}},
+        "bob": {"name": "bob", "level": 1, "score": {}},
+    }
+    # Ann completes level 2 after the game was read for the rebuild
+    record_player(main.rds_client, GAME_KEY, "ann", "ann", 3, 75)
+
+    rebuild_leaderboard(main.rds_client, GAME_KEY, players)
+
+    assert get_player_rank(main.rds_client, GAME_KEY, "ann")["level"] == 3
+    assert [entry["player_id"] for entry in get_top_players(main.rds_client, GAME_KEY)] == ["ann", "bob"]
+
+
+def test_rebuild_raises_players_behind_the_game():
+    record_player(main.rds_client, GAME_KEY, "ann", "ann", 1, 0)
+
+    rebuild_leaderboard(main.rds_client, GAME_KEY, {"ann": {"name": "ann", "level": 2, "score": {"1": 30}}})
+
+    assert get_player_rank(main.rds_client, GAME_KEY, "ann")["total_time"] == 30
+
+
+def test_admin_leaderboard_lists_the_top_players_without_a_player_rank():
+    rebuild_leaderboard(main.rds_client, GAME_KEY, {"ann": {"name": "ann", "level": 2, "score": {"1": 30}}})
+
+    leaderboard = main.fetch_game_leaderboard(GAME_KEY, 10)
+
+    assert [entry["name"] for entry in leaderboard["top"]] == ["ann"]
+    assert leaderboard["player"] is None
@@ -0,0 +1,76 @@
+"""Tests of the detection of a level code in the stream of tokens of an answer."""
+
+from lib.leak_detector import LeakDetector
+
+
+def feed_all(detector, tokens):
+    """Feed the tokens until the code leaks, returning the index of the token it leaked in, or None."""
+    for index, token in enumerate(tokens):
+        if detector.feed(token):
+            return index
+    return None
+
+
+def test_code_split_across_tokens_is_found():
+    detector = LeakDetector("IOYTH")
+
+    assert feed_all(detector, ["The code is i", "oy", "TH", "."]) == 3
+    assert detector.leaked
+
+
+def test_code_at_the_very_end_is_found_on_finish():
+    detector = LeakDetector("IOYTH")
+
+    assert feed_all(detector, ["The code is IO", "YTH"]) is None
+    assert detector.finish()
+
+
+def test_spaced_code_is_found():
+    detector = LeakDetector("IOYTH")
+
+    feed_all(detector, ["It is I O ", "Y T H", " of course"])
+
+    assert detector.leaked
+
+
+def test_hyphenated_and_lower_case_code_is_found():
+    detector = LeakDetector("IOYTH")
+
+    feed_all(detector, ["It is i-o-y-t-h!"])
+
+    assert detector.leaked
+
+
+def test_bracketed_code_is_found():
+    detector = LeakDetector("IOYTH")
+
+    feed_all(detector, ["Here: [", "IOYTH", "]"])
+
+    assert detector.leaked
+
+
+def test_code_inside_a_longer_word_is_not_a_leak():
+    detector = LeakDetector("cat")
+
+    feed_all(detector, ["This is a category and a ", "concatenation, also ", "cats"])
+
+    assert not detector.finish()
+
+
+def test_code_after_a_partial_match_is_found():
+    # "A B A" starts a match that fails on the second B, and the match restarts on the second A
+    detector = LeakDetector("abac")
+
+    feed_all(detector, ["x a b a", " b a c y"])
+
+    assert detector.leaked
+
+
+def test_finish_after_an_early_stop_keeps_the_leak():
+    detector = LeakDetector("IOYTH")
+    tokens = ["IOYTH", " and more", " text"]
+
+    assert feed_all(detector, tokens) == 1
+    # The stream stopped at the leak, the rest of the answer is never fed
+    assert detector.finish()
+    assert detector.feed(" anything")